@@ -34,7 +34,7 @@ Examples
                              in_q=in_q,
                              out_q=out_q,
                              icu_history_df=icu_history_df,
-                             lock=tracker._lock)
+                             lock=Lock())
     consumer.start()
 
     # Create the event reader and get a chunk of data
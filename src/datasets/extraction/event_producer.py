@@ -107,8 +107,7 @@ class EventProducer(object):
         # Counting variables
         self._count = 0  # count read data chunks
         self._lock = Lock()
-        with self._lock:
-            self._total_length = self._tracker.count_total_samples
+        self._total_length = self._tracker.count_total_samples
         event_csv = ["CHARTEVENTS.csv", "LABEVENTS.csv", "OUTPUTEVENTS.csv"]
         self._ts_total_lengths = dict(zip(event_csv, [0] * 3))
 
@@ -143,15 +142,13 @@ class EventProducer(object):
                                                source_path=self._source_path,
                                                in_q=self._out_q,
                                                tracker=self._tracker,
-                                               verbose=self._verbose,
-                                               lock=self._lock)
+                                               verbose=self._verbose)
         progress_publisher.start()
         event_reader = EventReader(dataset_folder=self._source_path,
                                    chunksize=self._chunksize,
                                    subject_ids=self._subject_ids,
                                    tracker=self._tracker,
-                                   verbose=self._verbose,
-                                   lock=self._lock)
+                                   verbose=self._verbose)
         while True:
             # Create more consumers if needed
             if len(consumers) < self._cpus and not self._in_q.empty():
@@ -192,8 +189,7 @@ class EventProducer(object):
 
                     # Record total length
                     self._total_length += sum(ts_lengths.values())
-                    with self._lock:
-                        self._tracker.count_total_samples = self._total_length
+                    self._tracker.count_total_samples = self._total_length
                     self._count += 1
                     debug_io(
                         f"Event producer finished on sample size restriction and produced {self._count} event chunks."
@@ -218,8 +214,7 @@ class EventProducer(object):
             self._count += 1
             self._total_length += sum(ts_lengths.values())
             self._update_total_lengths(ts_lengths)
-            with self._lock:
-                self._tracker.count_total_samples = self._total_length
+            self._tracker.count_total_samples = self._total_length
 
         # Join processes and queues when done reading
         debug_io(f"Joining in queue")
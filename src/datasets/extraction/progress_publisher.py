@@ -51,13 +51,11 @@ Examples
 """
 
 import os
-import multiprocessing as mp
 from utils import count_csv_size
 from utils.IO import *
 from pathlib import Path
 from multiprocess import JoinableQueue, Process
 from ..trackers import ExtractionTracker
-from utils.types import NoopLock
 
 
 class ProgressPublisher(Process):
@@ -90,11 +88,9 @@ class ProgressPublisher(Process):
                  source_path: Path,
                  in_q: JoinableQueue,
                  tracker: ExtractionTracker,
-                 verbose: bool = False,
-                 lock: mp.Lock = NoopLock()):
+                 verbose: bool = False):
         super().__init__()
         self._in_q = in_q
-        self._lock = lock
         self._verbose = verbose
         self._tracker = tracker
         self._n_consumers = n_consumers
@@ -109,8 +105,7 @@ class ProgressPublisher(Process):
         # Print initial state
         msg = [f"Processed event rows: "]
         for csv_name in self._event_file_lengths.keys():
-            with self._lock:
-                csv_event_count = self._tracker.count_subject_events[csv_name]
+            csv_event_count = self._tracker.count_subject_events[csv_name]
             total_event_count = self._event_file_lengths[csv_name]
             print_name = csv_name.strip('.csv') + ": "
             msg.append(
@@ -122,8 +117,7 @@ class ProgressPublisher(Process):
             # Draw tracking information from queue
             frame_lengths, finished = self._in_q.get()
             # TODO! real crash resilience can only be achieved by updating in the event consumer
-            with self._lock:
-                self._tracker.count_subject_events += frame_lengths
+            self._tracker.count_subject_events += frame_lengths
             # Track consumer finishes
             if finished:
                 done_count += 1
@@ -132,8 +126,7 @@ class ProgressPublisher(Process):
             # Print current state
             msg = [f"Processed event rows: "]
             for csv_name in self._event_file_lengths.keys():
-                with self._lock:
-                    csv_event_count = self._tracker.count_subject_events[csv_name]
+                csv_event_count = self._tracker.count_subject_events[csv_name]
                 total_event_count = self._event_file_lengths[csv_name]
                 print_name = csv_name.strip('.csv') + ": "
                 msg.append(
@@ -145,8 +138,7 @@ class ProgressPublisher(Process):
                     verbose=self._verbose)
             # Join publisher
             if done_count == self._n_consumers:
-                with self._lock:
-                    self._tracker.has_subject_events = True
+                self._tracker.has_subject_events = True
                 debug_io("All consumers finished, publisher finishes now.")
                 self._in_q.task_done()
                 break
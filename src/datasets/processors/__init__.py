@@ -32,7 +32,7 @@ import pandas as pd
 import logging
 from copy import deepcopy
 from itertools import chain
-from typing import Dict, List, Tuple, Union
+from typing import Callable, Dict, List, Tuple, Union
 from utils.jsons import dict_subset
 from pathlib import Path
 from abc import ABC, abstractmethod
@@ -121,14 +121,11 @@ class AbstractProcessor(ABC):
             self._n_samples = self._tracker.samples
             self._n_skip = 0
         else:
-            proc_subjects = set(subject_ids) & set(self._tracker.subject_ids)
+            proc_subjects, n_samples = self._tracker.subject_counts(set(subject_ids))
+            _, n_stays = self._tracker.subject_stays(set(subject_ids))
             self._n_subjects = len(proc_subjects)
-            self._n_stays = sum([
-                1 for subject_id in proc_subjects for stay_id in self._tracker.subjects[subject_id]
-                if stay_id != "total"
-            ])
-            self._n_samples = sum(
-                [self._tracker.subjects[subject_id]["total"] for subject_id in proc_subjects])
+            self._n_stays = int(n_stays.sum())
+            self._n_samples = int(n_samples.sum())
             self._n_skip = 0
 
     def save_data(self, subject_ids: list = None) -> None:
@@ -203,7 +200,7 @@ class AbstractProcessor(ABC):
             if tracking_info[subject_id]:
                 self._n_subjects += 1
                 if self._tracker is not None:
-                    with self._lock:
+                    with self._tracker.transaction():
                         if not subject_id in self._tracker.subjects or overwrite:
                             self._tracker.subjects.update({subject_id: tracking_info[subject_id]})
             else:
@@ -412,60 +409,79 @@ class AbstractProcessor(ABC):
         # Start the run
         chunksize = max(len(subject_ids) // (cpu_count() - 1), 1)
         with Pool(cpu_count() - 1, initializer=init, initargs=(self,)) as pool:
-            res = pool.imap_unordered(process_subject, subject_ids, chunksize=chunksize)
-
-            while True:
-                try:
-                    subject_id, tracker_info = next(res)
-                    if not tracker_info:
-                        # Subject could not be transformed
-                        # Add new samples if to meet the num subjects target
-                        if num_subjects is None:
-                            # No subject target was set lets move on
-                            missing_subjects += 1
-                            continue
-                        debug_io(f"Missing subject is: {subject_id}", verbose=orig_verbose)
-                        try:
-
-                            # Try to replace the missing subject to meet target
-                            subj = exclud_subj.pop()
-                            res = chain(res,
-                                        [pool.apply_async(process_subject, args=(subj,)).get()])
-                        except IndexError:
-                            missing_subjects += 1
-                            debug_io(
-                                f"Could not replace missing subject. Excluded subjects is: {exclud_subj}",
-                                verbose=orig_verbose)
-                    elif subject_id in tracker_info:
-                        self._n_subjects += 1
-                        self._n_stays += len(tracker_info[subject_id])
-                        self._n_samples += tracker_info["total"]
-
-                    info_io(
-                        f"{self._operation_name.capitalize()} timeseries data:\n"
-                        f"{self._operation_adjective.capitalize()} subjects: {self._n_subjects}\n"
-                        f"{self._operation_adjective.capitalize()} stays: {self._n_stays}\n"
-                        f"{self._operation_adjective.capitalize()} samples: {self._n_samples}\n"
-                        f"Skipped subjects: {missing_subjects}",
-                        flush_block=(True and not int(os.getenv("DEBUG", 0))),
-                        verbose=orig_verbose)
-                except StopIteration as e:
-                    self._tracker.is_finished = True
-                    info_io(
-                        f"Finalized for task {self._task} in directory:\n{str(self._storage_path)}",
-                        verbose=orig_verbose)
-                    if num_subjects is not None and missing_subjects:
-                        warn_io(
-                            f"The subject target was not reached, missing {missing_subjects} subjects.",
-                            verbose=orig_verbose)
-                    pool.close()
-                    pool.join()
-                    break
+            for subject_id, tracker_info in self._imap_subjects(
+                    pool,
+                    process_subject,
+                    subject_ids,
+                    chunksize=chunksize,
+                    replacements=exclud_subj if num_subjects is not None else None,
+                    verbose=orig_verbose):
+                if not tracker_info:
+                    # Subject could not be transformed
+                    missing_subjects += 1
+                    if num_subjects is None:
+                        # No subject target was set lets move on
+                        continue
+                elif subject_id in tracker_info:
+                    self._n_subjects += 1
+                    self._n_stays += len(tracker_info[subject_id])
+                    self._n_samples += tracker_info["total"]
+
+                info_io(
+                    f"{self._operation_name.capitalize()} timeseries data:\n"
+                    f"{self._operation_adjective.capitalize()} subjects: {self._n_subjects}\n"
+                    f"{self._operation_adjective.capitalize()} stays: {self._n_stays}\n"
+                    f"{self._operation_adjective.capitalize()} samples: {self._n_samples}\n"
+                    f"Skipped subjects: {missing_subjects}",
+                    flush_block=(True and not int(os.getenv("DEBUG", 0))),
+                    verbose=orig_verbose)
+            pool.close()
+            pool.join()
+
+        self._tracker.is_finished = True
+        info_io(f"Finalized for task {self._task} in directory:\n{str(self._storage_path)}",
+                verbose=orig_verbose)
+        if num_subjects is not None and missing_subjects:
+            warn_io(f"The subject target was not reached, missing {missing_subjects} subjects.",
+                    verbose=orig_verbose)
         self._verbose = orig_verbose
         if original_subject_ids is not None:
             original_subject_ids = list(set(original_subject_ids) & set(self._tracker.subject_ids))
         return ProcessedSetReader(self._storage_path, subject_ids=original_subject_ids)
 
+    @staticmethod
+    def _imap_subjects(pool: Pool,
+                       process_subject: Callable,
+                       subject_ids: list,
+                       chunksize: int = 1,
+                       replacements: list = None,
+                       verbose: bool = False):
+        """
+        Process the subjects on the pool and yield the (subject_id, result) pairs of
+        process_subject in order of completion.
+
+        Subjects with an empty result are replaced by subjects popped from replacements, if
+        given, in order to meet a subject target. They are only yielded if they could not be
+        replaced.
+        """
+        res = pool.imap_unordered(process_subject, subject_ids, chunksize=chunksize)
+        while True:
+            try:
+                subject_id, result = next(res)
+            except StopIteration:
+                return
+            if not result and replacements:
+                debug_io(f"Missing subject is: {subject_id}", verbose=verbose)
+                # Try to replace the missing subject to meet target
+                subj = replacements.pop()
+                res = chain(res, [pool.apply_async(process_subject, args=(subj,)).get()])
+                continue
+            if not result and replacements is not None:
+                debug_io(
+                    f"Could not replace missing subject. Excluded subjects is: {replacements}",
+                    verbose=verbose)
+            yield subject_id, result
+
     def _get_subject_ids(self,
                          num_subjects: int,
                          subject_ids: list,
@@ -47,6 +47,14 @@ Usage Examples
 
     # Save the transformed data
     discretizer.save_data()
+
+    # Discretize into several variants in a single pass, stored in sibling directories
+    multi_discretizer = MIMICMultiDiscretizer(task="IHM",
+                                              variants=[(0.5, "previous"), (1.0, "previous"),
+                                                        (1.0, "zero")],
+                                              storage_path=storage_path,
+                                              reader=reader)
+    readers = multi_discretizer.transform_reader()
 """
 
 import pandas as pd
@@ -54,11 +62,12 @@ import numpy as np
 import os
 import json
 import datetime
+from copy import deepcopy
 from multiprocess import Manager
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
+from pathos.multiprocessing import cpu_count, Pool
 from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import OneHotEncoder
 from pandas.api.types import is_datetime64_any_dtype as is_datetime
 from utils.jsons import dict_subset
 
@@ -66,7 +75,7 @@ from settings import *
 from utils.IO import *
 from datasets.readers import ProcessedSetReader
 from datasets.writers import DataSetWriter
-from datasets.mimic_utils import convert_dtype_value
+from datasets.mimic_utils import convert_dtype_value, copy_subject_info
 from datasets.trackers import PreprocessingTracker
 from datasets.processors import AbstractProcessor
 
@@ -175,6 +184,13 @@ class MIMICDiscretizer(AbstractProcessor):
             self._possible_values = config_dictionary['possible_values']
             self._is_categorical = config_dictionary['is_categorical_channel']
             self._impute_values = config_dictionary['normal_values']
+        # Category to one-hot column lookup for the categorical channels
+        self._category_indexers = {
+            column: pd.Index([str(category) for category in categories])
+            for column, categories in self._possible_values.items()
+            if self._is_categorical[column]
+        }
+        self._impute_vectors = dict()
 
         # Tracking variables
         self._init_tracking_variables()
@@ -217,7 +233,8 @@ class MIMICDiscretizer(AbstractProcessor):
 
     def _transform(self,
                    dataset: Tuple[Dict[int, Dict[int, pd.DataFrame]]],
-                   return_tracking: bool = False):
+                   return_tracking: bool = False,
+                   categorized: Dict[int, Dict[int, Tuple[np.ndarray, list]]] = None):
         """
         Transform the entire dataset when passed as dictionary pair.
 
@@ -230,6 +247,8 @@ class MIMICDiscretizer(AbstractProcessor):
             A dictionary containing the input data, with subject IDs as keys.
         y_dict : dict
             A dictionary containing the output data, with subject IDs as keys.
+        categorized : dict, optional
+            Output of `_categorize_data` per subject and stay, when shared between discretizers.
 
         Returns
         -------
@@ -237,6 +256,7 @@ class MIMICDiscretizer(AbstractProcessor):
             A dictionary containing the discretized data, with subject IDs as keys.
         """
         X_dict, y_dict = dataset["X"], dataset["y"]
+        categorized = categorized or dict()
         tracking_info = dict()
         info_io(
             f"Discretizing processed data:\n"
@@ -257,30 +277,22 @@ class MIMICDiscretizer(AbstractProcessor):
             if self._deep_supervision:
                 self._M[subject_id] = dict()
             if not self._process_x:
-                with self._lock:
-                    if subject_id in self._tracker.subject_ids:
-                        # Reason for missing subject can be config
-                        self._X[subject_id], _ = self._discretized_reader.read_sample(subject_id)
-                    else:
-                        set_process_x_to_false = True
-                        self._process_x = True
+                if subject_id in self._tracker.subject_ids:
+                    # Reason for missing subject can be config
+                    self._X[subject_id], _ = self._discretized_reader.read_sample(subject_id)
+                else:
+                    set_process_x_to_false = True
+                    self._process_x = True
 
             for stay_id in X_subject:
                 # Do not reprocess if create for different supervision mode
                 y_df = y_dict[subject_id][stay_id]
                 if self._process_x:
-                    X_df = X_subject[stay_id]
-                    if self._mode == "experimental" and self._impute_strategy \
-                       in ["previous", "next"]:
-                        X_df = self._impute_data(X_df)
-                        X_df = self._categorize_data(X_df)
-                        X_df = self._bin_data(X_df, y_df)
-                    else:
-                        X_df = self._categorize_data(X_df)
-                        X_df = self._bin_data(X_df, y_df)
-                        X_df = self._impute_data(X_df)
                     # Torch friendly dtype
-                    self._X[subject_id][stay_id] = X_df.astype(np.float32)
+                    X_df = self._discretize_stay(
+                        X_subject[stay_id],
+                        categorized.get(subject_id, dict()).get(stay_id))
+                    self._X[subject_id][stay_id] = X_df
                 if self._task == "MULTI":
                     # TODO! other conversions might be necessary
                     # TODO! implement ds for this
@@ -337,82 +349,138 @@ class MIMICDiscretizer(AbstractProcessor):
             return tuple(result_list), tracking_info
         return tuple(result_list)
 
-    def _bin_data(self, X, y):
+    def _discretize_stay(self,
+                         X: pd.DataFrame,
+                         categorized: Tuple[np.ndarray, list] = None) -> pd.DataFrame:
         """
-        Bin the time series data into discrete time steps.
+        Categorize, bin and impute a single stay on a dense float32 array, so that only the final
+        result is wrapped into a data frame.
         """
+        values, columns = (self._categorize_data(X) if categorized is None else categorized)
+        if self._mode == "experimental" and self._impute_strategy in ["previous", "next"]:
+            values = self._impute_data(values, columns)
+            values, index = self._bin_data(values, X.index)
+        else:
+            values, index = self._bin_data(values, X.index)
+            values = self._impute_data(values, columns)
+        return pd.DataFrame(values, index=index, columns=columns)
 
-        if self._time_step_size is not None:
-            # Get data frame parameters
-            start_timestamp = (0 if self._start_at_zero else X.index[0])
-
-            if is_datetime(X.index):
-                ts = list((X.index - start_timestamp) / datetime.timedelta(hours=1))
-            else:
-                ts = list(X.index - start_timestamp)
-
-            # Maps sample_periods to discretization bins
-            tsid_to_bins = list(map(lambda x: int(x / self._time_step_size - self._eps), ts))
+    def _bin_data(self, X: np.ndarray, index: pd.Index) -> Tuple[np.ndarray, pd.Index]:
+        """
+        Bin the time series data into discrete time steps, keeping the last non-missing value of
+        each channel per bin.
 
-            # Tentative solution
-            if self._start_at_zero:
-                N_bins = int(tsid_to_bins[-1]) + 1
-            else:
-                N_bins = int(tsid_to_bins[-1] - tsid_to_bins[0]) + 1
+        Parameters
+        ----------
+        X : np.ndarray
+            The categorized data of shape (T, F).
+        index : pd.Index
+            The timestamps of the rows.
 
-            # Reduce DataFrame to bins, keep original channels
-            X['bins'] = tsid_to_bins
-            X = X.groupby('bins').last()
-            X = X.reindex(range(N_bins))
+        Returns
+        -------
+        Tuple[np.ndarray, pd.Index]
+            The binned data of shape (N_bins, F) and the bin index.
+        """
+        if self._time_step_size is None:
+            return X, index
+        if not len(X):
+            return X, pd.RangeIndex(0, name="bins")
 
-        # return categorized_data
-        return X
+        if is_datetime(index):
+            timestamps = np.asarray((index - index[0]) / datetime.timedelta(hours=1))
+        else:
+            timestamps = np.asarray(index, dtype=np.float64)
+        start_timestamp = (0 if self._start_at_zero else timestamps[0])
+        # Truncation towards zero, as timestamps before the start fall into the first bin
+        bins = np.trunc((timestamps - start_timestamp) / self._time_step_size -
+                        self._eps).astype(np.int64)
 
-    def _impute_data(self, X):
+        if self._start_at_zero:
+            n_bins = max(int(bins[-1]) + 1, 0)
+        else:
+            n_bins = max(int(bins[-1] - bins[0]) + 1, 0)
+
+        if (np.diff(bins) < 0).any():
+            # Stable so that the row order within a bin is kept
+            order = np.argsort(bins, kind="stable")
+            bins, X = bins[order], X[order]
+
+        # Position of the last valid row of every channel within each bin
+        row_indices = np.where(np.isnan(X), -1, np.arange(len(X))[:, None])
+        unique_bins, bin_starts = np.unique(bins, return_index=True)
+        last_rows = np.maximum.reduceat(row_indices, bin_starts, axis=0)
+        in_range = (unique_bins >= 0) & (unique_bins < n_bins)
+        unique_bins, last_rows = unique_bins[in_range], last_rows[in_range]
+
+        binned_data = np.full((n_bins, X.shape[1]), np.nan, dtype=np.float32)
+        binned_data[unique_bins] = np.where(last_rows >= 0,
+                                            X[np.maximum(last_rows, 0),
+                                              np.arange(X.shape[1])], np.nan)
+        return binned_data, pd.RangeIndex(n_bins, name="bins")
+
+    def _impute_data(self, X: np.ndarray, columns: list) -> np.ndarray:
         """
         Impute missing values in the time series data using the specified
         imputation strategy.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            The categorized data of shape (T, F).
+        columns : list
+            The column names of the categorized data.
+
+        Returns
+        -------
+        np.ndarray
+            The imputed data.
         """
-        if self._start_at_zero:
-            tsid_to_bins = list(map(lambda x: int(x / self._time_step_size - self._eps), X.index))
-            start_count = 0
-            while not start_count in tsid_to_bins:
-                start_count += 1
-                X = pd.concat([pd.DataFrame(pd.NA, index=[0], columns=X.columns, dtype="Int32"), X])
-
-        if isinstance(X, np.ndarray):
-            X = pd.DataFrame(X, columns=self._possible_values.keys())
-        if self._impute_strategy == "normal":
-            for column in X:
-                if column in self._impute_values.keys():
-                    X[column] = X[column].replace(
-                        np.nan,
-                        convert_dtype_value(self._impute_values[column], self._dtypes[column]))
-                elif column.split("->")[0] in self._impute_values.keys():
+        missing = np.isnan(X)
+        if not missing.any():
+            return X
+        if self._impute_strategy == "zero":
+            return np.where(missing, 0., X).astype(np.float32)
+
+        if self._impute_strategy in ["previous", "next"]:
+            row_indices = np.arange(len(X))[:, None]
+            if self._impute_strategy == "previous":
+                fill_rows = np.maximum.accumulate(np.where(missing, 0, row_indices), axis=0)
+            else:
+                fill_rows = np.minimum.accumulate(np.where(missing, len(X) - 1, row_indices)[::-1],
+                                                  axis=0)[::-1]
+            X = X[fill_rows, np.arange(X.shape[1])]
+            missing = np.isnan(X)
+
+        impute_values = self._get_impute_values(columns)
+        return np.where(missing, impute_values, X).astype(np.float32)
+
+    def _get_impute_values(self, columns: list) -> np.ndarray:
+        """
+        Normal values per categorized column, cached per column layout.
+        """
+        key = tuple(columns)
+        if key not in self._impute_vectors:
+            impute_values = np.full(len(columns), np.nan, dtype=np.float32)
+            for index, column in enumerate(columns):
+                if column in self._impute_values:
+                    impute_values[index] = convert_dtype_value(self._impute_values[column],
+                                                               self._dtypes[column])
+                elif column.split("->")[0] in self._impute_values:
                     cat_name, cat_value = column.split("->")
-                    X[column] = X[column].replace(
-                        np.nan, (1.0 if cat_value == self._impute_values[cat_name] else 0.0))
-
-        elif self._impute_strategy in ["previous", "next"]:
-            X = (X.ffill() if self._impute_strategy == "previous" else X.bfill())
-            for column in X:
-                if X[column].isnull().values.any():
-                    if column in self._impute_values:
-                        impute_value = convert_dtype_value(self._impute_values[column],
-                                                           self._dtypes[column])
-                    else:
-                        cat_name, cat_value = column.split("->")
-                        impute_value = (1.0 if cat_value == self._impute_values[cat_name] else 0.0)
-                    X[column] = X[column].replace(np.nan, impute_value)
-        elif self._impute_strategy == "zero":
-            X = X.fillna(0)
-        return X
-
-    def _categorize_data(self, X):
+                    impute_values[index] = (1.0 if cat_value == self._impute_values[cat_name] else
+                                            0.0)
+            self._impute_vectors[key] = impute_values
+        return self._impute_vectors[key]
+
+    def _categorize_data(self, X: pd.DataFrame) -> Tuple[np.ndarray, list]:
         """
         This method transforms categorical variables in the data into a format suitable
         for machine learning models by applying one-hot encoding.
 
+        The continuous columns are kept in order, followed by the one-hot blocks of the categorical
+        columns. Missing values yield NaN across the whole block, unknown categories yield zeros.
+
         Parameters
         ----------
         X : pd.DataFrame
@@ -420,50 +488,265 @@ class MIMICDiscretizer(AbstractProcessor):
 
         Returns
         -------
-        pd.DataFrame
-            The data with categorical variables transformed into one-hot encoded format.
+        Tuple[np.ndarray, list]
+            The float32 data with categorical variables transformed into one-hot encoded format and
+            the resulting column names.
         """
-        categorized_data = X
-
-        for column in X:
-            if not self._is_categorical[column]:
-                continue
-
-            categories = [str(cat) for cat in self._possible_values[column]]
-
-            # Finding nan indices
-            nan_indices = categorized_data[column].isna()
-            if not nan_indices.all() and nan_indices.any():
-                # Handling non-NaN values: encode them
-                non_nan_values = categorized_data.pop(column).dropna().astype(
-                    'string').values.reshape(-1, 1)
-                encoder = OneHotEncoder(categories=list(
-                    np.array(categories).reshape(1, len(categories))),
-                                        handle_unknown='ignore')
-                encoded_values = encoder.fit_transform(non_nan_values).toarray()
-
-                # Initialize an array to hold the final encoded values including NaNs
-                encoded_channel = np.full((categorized_data.shape[0], len(categories)), np.nan)
-
-                # Fill in the encoded values at the right indices
-                non_nan_indices = ~nan_indices
-                encoded_channel[non_nan_indices] = encoded_values
-            elif not nan_indices.any():
-                encoder = OneHotEncoder(categories=[np.array(categories).reshape(-1)],
-                                        handle_unknown='ignore')
-                encoded_channel = encoder.fit_transform(
-                    categorized_data.pop(column).astype('string').values.reshape(-1, 1)).toarray()
-            else:
-                categorized_data.pop(column)
-                encoded_channel = np.full((categorized_data.shape[0], len(categories)), np.nan)
-
-            categorized_data = pd.concat([\
-                categorized_data,
-                pd.DataFrame(\
-                    encoded_channel,
-                    columns=[f"{column}->{category}" for category in categories],
-                    index=categorized_data.index)
-                ],
-                axis=1)
-
-        return categorized_data
+        continuous_columns = [column for column in X if not self._is_categorical[column]]
+        categorical_columns = [column for column in X if self._is_categorical[column]]
+        n_encoded = sum(len(self._category_indexers[column]) for column in categorical_columns)
+
+        categorized_data = np.zeros((len(X), len(continuous_columns) + n_encoded), dtype=np.float32)
+        categorized_data[:, :len(continuous_columns)] = X[continuous_columns].values
+        columns = list(continuous_columns)
+
+        offset = len(continuous_columns)
+        for column in categorical_columns:
+            categories = self._category_indexers[column]
+            values = X[column].values
+            nan_indices = pd.isna(values)
+            codes = categories.get_indexer(values.astype(str))
+            is_known = (codes >= 0) & ~nan_indices
+            categorized_data[np.flatnonzero(is_known), offset + codes[is_known]] = 1.
+            categorized_data[nan_indices, offset:offset + len(categories)] = np.nan
+            columns.extend([f"{column}->{category}" for category in categories])
+            offset += len(categories)
+
+        return categorized_data, columns
+
+
+class MIMICMultiDiscretizer(object):
+    """
+    Discretize the processed data into several (time_step_size, impute_strategy) variants in a
+    single pass.
+
+    Each subject is read and categorized once, after which the binning and imputation of every
+    variant is applied to the shared intermediate. Every variant is stored in its own sibling
+    directory below the storage path, with its own tracker, so that it can be read back like the
+    output of a single `MIMICDiscretizer`.
+
+    Parameters
+    ----------
+    task : str
+        The name of the task. Must be one of the predefined `TASK_NAMES`.
+    variants : List[Tuple[float, str]]
+        The (time_step_size, impute_strategy) pairs to discretize into.
+    storage_path : Path
+        The parent directory of the variant directories.
+    reader : ProcessedSetReader, optional
+        The reader object used to read the batch data, by default None.
+    start_at_zero : bool, optional
+        Whether to start the time index at zero, by default True.
+    deep_supervision : bool, optional
+        Whether to create deep supervision masks, by default False.
+    mode : str, optional
+        The mode of discretization. Default is 'legacy'.
+    eps : float, optional
+        A small value to avoid division by zero errors, by default 1e-6.
+    verbose : bool, optional
+        If True, print verbose logs during processing. Default is False.
+    """
+
+    def __init__(self,
+                 task: str,
+                 variants: List[Tuple[float, str]],
+                 storage_path: Path,
+                 reader: ProcessedSetReader = None,
+                 start_at_zero: bool = True,
+                 deep_supervision: bool = False,
+                 mode: str = "legacy",
+                 eps: float = 1e-6,
+                 verbose: bool = False):
+        if not variants:
+            raise ValueError("At least one (time_step_size, impute_strategy) variant is required.")
+        if len(set(variants)) != len(variants):
+            raise ValueError(f"Variants must be unique. Variants are {variants}")
+        self._task = task
+        self._storage_path = Path(storage_path)
+        self._source_reader = reader
+        self._verbose = verbose
+        self._discretizers = {
+            (time_step_size, impute_strategy):
+                MIMICDiscretizer(task=task,
+                                 reader=reader,
+                                 storage_path=self.variant_path(storage_path, time_step_size,
+                                                                impute_strategy),
+                                 time_step_size=time_step_size,
+                                 start_at_zero=start_at_zero,
+                                 impute_strategy=impute_strategy,
+                                 deep_supervision=deep_supervision,
+                                 mode=mode,
+                                 eps=eps,
+                                 verbose=False) for time_step_size, impute_strategy in variants
+        }
+
+    @staticmethod
+    def variant_path(storage_path: Path, time_step_size: float, impute_strategy: str) -> Path:
+        """
+        Storage directory of a single variant, e.g. storage_path/previous_1h.
+        """
+        return Path(storage_path, f"{impute_strategy}_{time_step_size:g}h")
+
+    @property
+    def discretizers(self) -> Dict[Tuple[float, str], MIMICDiscretizer]:
+        """
+        Get the discretizer of each (time_step_size, impute_strategy) variant.
+        """
+        return self._discretizers
+
+    def transform_subject(self, subject_id: int, return_tracking: bool = False):
+        """
+        Transform the data for a specific subject into all variants that have not yet processed it.
+
+        Parameters
+        ----------
+        subject_id : int
+            The ID of the subject to transform data for.
+        return_tracking : bool, optional
+            Whether to return the tracking information per variant, by default False.
+
+        Returns
+        -------
+        dict
+            The discretized data per variant, and the tracking information if requested.
+        """
+        discretizers = {
+            variant: discretizer for variant, discretizer in self._discretizers.items()
+            if discretizer.tracker is None or discretizer.tracker.force_rerun or
+            subject_id not in discretizer.tracker.subject_ids
+        }
+        proc_data, tracking_infos = dict(), dict()
+        if not discretizers:
+            return (proc_data, tracking_infos) if return_tracking else proc_data
+
+        subject_data = self._source_reader.read_samples([subject_id],
+                                                        read_ids=True,
+                                                        data_type=pd.DataFrame)
+        # Categorization does not depend on the variant and is therefore shared
+        categorizer = next(iter(discretizers.values()))
+        categorized = {
+            subject: {
+                stay_id: categorizer._categorize_data(X_df) for stay_id, X_df in stays.items()
+            } for subject, stays in subject_data["X"].items()
+        }
+        for variant, discretizer in discretizers.items():
+            proc_data[variant], tracking_infos[variant] = discretizer._transform(
+                subject_data, return_tracking=True, categorized=categorized)
+        if return_tracking:
+            return proc_data, tracking_infos
+        return proc_data
+
+    def transform_reader(self,
+                         reader: ProcessedSetReader = None,
+                         subject_ids: list = None,
+                         num_subjects: int = None) -> Dict[Tuple[float, str], ProcessedSetReader]:
+        """
+        Discretize the data of the reader into all variants, reading each subject only once.
+
+        Parameters
+        ----------
+        reader : ProcessedSetReader, optional
+            Reader for the processed set. Defaults to the reader passed at initialization.
+        subject_ids : list, optional
+            List of subject IDs to process. Defaults to None.
+        num_subjects : int, optional
+            Number of subjects to process. Defaults to None.
+
+        Returns
+        -------
+        Dict[Tuple[float, str], ProcessedSetReader]
+            Reader for the discretized set of each variant.
+        """
+        if reader is not None:
+            self._source_reader = reader
+        if self._source_reader is None:
+            raise ValueError("No reader provided to transform.")
+        original_subject_ids = deepcopy(subject_ids)
+
+        for discretizer in self._discretizers.values():
+            discretizer._source_reader = self._source_reader
+            discretizer._init_tracking_variables(subject_ids)
+            if subject_ids is not None or num_subjects is not None:
+                discretizer.tracker.set_subject_ids(subject_ids)
+                discretizer.tracker.set_num_subjects(num_subjects)
+
+        pending = [
+            discretizer for discretizer in self._discretizers.values()
+            if not discretizer.tracker.is_finished
+        ]
+        info_io(f"Iterative multi discretizing: {self._task}", level=0, verbose=self._verbose)
+
+        if pending:
+            # Subjects are only skipped once they are done in all variants
+            processed_subjects = set.intersection(*[
+                set() if discretizer.tracker.force_rerun else set(discretizer.tracker.subject_ids)
+                for discretizer in pending
+            ])
+            subject_ids, exclud_subj, unknown_subj = pending[0]._get_subject_ids(
+                num_subjects=num_subjects,
+                subject_ids=subject_ids,
+                all_subjects=self._source_reader.subject_ids,
+                processed_subjects=list(processed_subjects))
+            self._transform_subjects(subject_ids, exclud_subj, len(unknown_subj), num_subjects)
+
+        readers = dict()
+        for variant, discretizer in self._discretizers.items():
+            discretizer.tracker.is_finished = True
+            copy_subject_info(self._source_reader.root_path, discretizer._storage_path)
+            variant_subject_ids = original_subject_ids
+            if variant_subject_ids is not None:
+                variant_subject_ids = list(
+                    set(variant_subject_ids) & set(discretizer.tracker.subject_ids))
+            readers[variant] = ProcessedSetReader(discretizer._storage_path,
+                                                  subject_ids=variant_subject_ids)
+        info_io(f"Finalized {len(readers)} variants for task {self._task} in directory:\n"
+                f"{str(self._storage_path)}",
+                verbose=self._verbose)
+        return readers
+
+    def _transform_subjects(self, subject_ids: list, exclud_subj: list, missing_subjects: int,
+                            num_subjects: int):
+        """
+        Transform and save the subjects in parallel, replacing empty subjects when a subject
+        target is set.
+        """
+
+        def process_subject(subject_id: int):
+            _, tracking_infos = self.transform_subject(subject_id, return_tracking=True)
+            n_samples = 0
+            for variant, tracking_info in tracking_infos.items():
+                if tracking_info:
+                    self._discretizers[variant].save_data([subject_id])
+                    n_samples = max(n_samples, sum(tracking_info[subject_id].values()))
+            return subject_id, n_samples
+
+        n_subjects = n_samples = 0
+        if not subject_ids:
+            return
+        n_workers = max(cpu_count() - 1, 1)
+        chunksize = max(len(subject_ids) // n_workers, 1)
+        with Pool(n_workers) as pool:
+            for _, subject_samples in AbstractProcessor._imap_subjects(
+                    pool,
+                    process_subject,
+                    subject_ids,
+                    chunksize=chunksize,
+                    replacements=exclud_subj if num_subjects is not None else None,
+                    verbose=self._verbose):
+                if subject_samples:
+                    n_subjects += 1
+                    n_samples += subject_samples
+                else:
+                    missing_subjects += 1
+                info_io(
+                    f"Discretizing timeseries data into {len(self._discretizers)} variants:\n"
+                    f"Discretized subjects: {n_subjects}\n"
+                    f"Discretized samples: {n_samples}\n"
+                    f"Skipped subjects: {missing_subjects}",
+                    flush_block=(True and not int(os.getenv("DEBUG", 0))),
+                    verbose=self._verbose)
+            pool.close()
+            pool.join()
+        if num_subjects is not None and missing_subjects:
+            warn_io(f"The subject target was not reached, missing {missing_subjects} subjects.",
+                    verbose=self._verbose)
@@ -47,22 +47,25 @@ Usage Examples
     # Save the transformed data
     feature_engine.save_data()
 
+    # Memory-map the engineered samples for training
+    dataset = reader.read_sample_store()
+    X, y = dataset["X"], dataset["y"]
+
 """
 
 import numpy as np
 import pandas as pd
 import json
-from typing import Dict, List, Tuple
-from scipy.stats import skew
-from numpy import random
+from typing import Dict, Tuple
 from multiprocess import Manager
 from datasets.readers import ProcessedSetReader
-from datasets.writers import DataSetWriter
+from datasets.writers import DataSetWriter, SampleStoreWriter
 from utils.jsons import dict_subset
 from utils.IO import *
 from pathlib import Path
 from datasets.trackers import PreprocessingTracker
 from datasets.processors import AbstractProcessor
+from datasets.processors.feature_kernels import engineer_features
 
 
 class MIMICFeatureEngine(AbstractProcessor):
@@ -101,6 +104,8 @@ class MIMICFeatureEngine(AbstractProcessor):
         self._storage_path = storage_path
         self._save_file_type = "hdf5"
         self._writer = (DataSetWriter(storage_path) if storage_path is not None else None)
+        self._store_writer = (SampleStoreWriter(Path(storage_path, "sample_store"))
+                              if storage_path is not None else None)
         self._source_reader = reader
         if tracker is not None:
             self._tracker = tracker
@@ -108,17 +113,6 @@ class MIMICFeatureEngine(AbstractProcessor):
             self._tracker = (PreprocessingTracker(Path(storage_path, "progress"))
                              if storage_path is not None else None)
         self._task = task
-        self._save_as_samples = (True if task in ["IHM", "PHENO"]\
-                                 else False)
-        self._subsample_switch = {
-            "first_percentage":
-                lambda start_t, end_t, percentage: (start_t, start_t +
-                                                    (end_t - start_t) * percentage / 100.0),
-            "last_percentage":
-                lambda start_t, end_t, percentage: (end_t -
-                                                    (end_t - start_t) * percentage / 100.0, end_t)
-        }
-
         self._lock = Manager().Lock()
         self._verbose = verbose
 
@@ -236,6 +230,8 @@ class MIMICFeatureEngine(AbstractProcessor):
         Engineer features for a single ICU stay.
 
         This method applies feature engineering techniques to the data from a single ICU stay.
+        Each label is paired with the window reaching from the start of the stay to the label
+        timestamp.
 
         Parameters
         ----------
@@ -250,92 +246,63 @@ class MIMICFeatureEngine(AbstractProcessor):
             A tuple containing the engineered features, output data, and timestamps.
         """
         X_df = self._impute_categorical_data(X_df)
-        Xs, ys, ts = self._read_timeseries_windows(X_df, y_df)
-
-        (Xs, ys, ts) = self._shuffle([Xs, ys, ts])
-
-        X_ss = list()
-        ys = list(ys)
-        ts = list(ts)
+        ts = y_df.index.values
+        ys = y_df.values
+        X_ss = self._make_window_features(X_df, ts)
+        self._samples_processed += len(ts)
 
-        for df in Xs:
-            subsamples = [[
-                self._channel_subsampler(df[column], *combination)
-                for combination in self._sampler_combinations
-            ]
-                          for column in self._channel_names]
-            # Iterating by channel name from config allows normalization
-            # and ensures comparability to ground truth data from original dir
+        return X_ss, ys, ts
 
-            engineered_features = [
-                self._make_engineered_features(channel.values)
-                for subsample in subsamples
-                for channel in subsample
-            ]
+    def _make_window_features(self, X_df: pd.DataFrame, timestamps: np.ndarray) -> np.ndarray:
+        """
+        Compute the engineered features for all windows of a stay at once.
 
-            X_ss.append(np.concatenate(engineered_features))
+        The window for timestamp t contains all observations up to t. The features are computed
+        by the batched kernel from datasets.processors.feature_kernels.
 
-            self._samples_processed += 1
+        Parameters
+        ----------
+        X_df : pd.DataFrame
+            The imputed time series of the stay, indexed by timestamp.
+        timestamps : np.ndarray
+            The label timestamps delimiting the windows.
 
-        return X_ss, ys, ts
+        Returns
+        -------
+        np.ndarray
+            Feature matrix of shape (len(timestamps), n_channels * n_combinations * 6).
+        """
+        # Iterating by channel name from config allows normalization
+        # and ensures comparability to ground truth data from original dir
+        return engineer_features(X_df[self._channel_names].values,
+                                 X_df.index.values,
+                                 cut_points=timestamps,
+                                 sampler_combinations=self._sampler_combinations)
 
     def _convert_feature_dtype(self, X, y, t):
         """Does nothing, need because of inheritance.
         """
         return X, y, t
 
-    def _processor_specific_save_data(self):
-
-        def create_df(data, file_name) -> pd.DataFrame:
-            if file_name == "X":
-                dfs = pd.DataFrame([([subject_id, stay_id] +
-                                     np.squeeze(frame).tolist()) if len(np.squeeze(frame)) > 1 else
-                                    ([subject_id, stay_id, float(frame)])
-                                    for subject_id, subject_stays in data.items()
-                                    for stay_id, frame in subject_stays.items()])
-
-            elif file_name == "y":
-                dfs = pd.DataFrame([([subject_id, stay_id] +
-                                     frame.tolist()) if isinstance(frame.tolist(), list) else
-                                    ([subject_id, stay_id, float(frame)])
-                                    for subject_id, subject_stays in data.items()
-                                    for stay_id, frame in subject_stays.items()])
-            dfs = dfs.rename(columns={0: "subject_id", 1: "stay_id"})
-            if not len(dfs):
-                return
-            return dfs
-
-        def append_data(X: dict, y: dict):
-
-            def append(dfs: pd.DataFrame, file_name: str):
-                file = Path(self._storage_path, f"{file_name}.csv")
-                if file.is_file():
-                    dfs.to_csv(file, mode='a', header=False, index=False)
-                else:
-                    dfs.to_csv(file, index=False)
-
-            X_df = create_df(X, "X")
-            y_df = create_df(y, "y")
-            if y_df is None or not len(y_df) or not len(X_df):
-                return
-            append(X_df, "X")
-            append(y_df, "y")
-
-        if self._save_as_samples:
-            with self._lock:
-                append_data(self._X, self._y)
-
-    def _shuffle(self, data: List[tuple]) -> None:
-        """
-        Shuffle the data.
+    def save_data(self, subject_ids: list = None) -> None:
         """
-        assert len(data) >= 2
+        Save the engineered data to the storage path.
 
-        data = list(zip(*data))
-        random.shuffle(data)
-        data = list(zip(*data))
+        Next to the per subject files, the samples are appended as a single block to the columnar
+        sample store, which can be memory-mapped with `ProcessedSetReader.read_sample_store`.
 
-        return data
+        Parameters
+        ----------
+        subject_ids : list, optional
+            A list of subject IDs to save data for. If None, all data is saved. Default is None.
+        """
+        if self._store_writer is not None:
+            self._store_writer.write(X=self._X,
+                                     y=self._y,
+                                     t=self._t,
+                                     subject_ids=subject_ids,
+                                     lock=self._lock)
+        super().save_data(subject_ids)
 
     def _impute_categorical_data(self, X):
         """
@@ -354,111 +321,10 @@ class MIMICFeatureEngine(AbstractProcessor):
         X = X.replace(replace_dict).astype(float)
         return X
 
-    def _make_engineered_features(self, data):
-        """
-        Generate engineered features.
-
-        This method generates engineered features from the input data using statistical functions such as min, max,
-        mean, standard deviation, skewness, and length.
-        """
-        functions = [min, max, np.mean, np.std, skew, len]
-        import warnings
-        warnings.filterwarnings("error")
-
-        if len(data) == 0:
-            engineered_data = np.full((len(functions,)), np.nan)
-        else:
-            # !TODO DEBUGGING
-            engineered_data = [
-                fn(data) if fn is not skew or
-                (len(data) > 1 and not all(i == data[0]
-                                           for i in data) or fn is len) else
-                np.nan  #TODO! This will fail and be 0 in Windows
-                for fn in functions
-            ]
-            engineered_data = np.array(engineered_data, dtype=np.float32)
-
-        return engineered_data
-
-    def _channel_subsampler(self, Sr: pd.Series, sampler_function, percentage):
-        """
-        Subsample a time series channel.
-
-        This method subsamples a time series channel based on specified time window percentage.
-        For example this could mean first 25% or last 50% of the time series.
-        It returns the subsampled series within the calculated time window.
-        """
-        Sr = Sr.dropna()
-
-        if len(Sr) == 0:
-            return pd.DataFrame()
-
-        start_t = Sr.index[0]
-        end_t = Sr.index[-1]
-
-        sampled_start_t, sampled_end_t = self._subsample_switch[sampler_function](start_t, end_t,
-                                                                                  percentage)
-
-        return Sr[(Sr.index < sampled_end_t + 1e-6) & (Sr.index > sampled_start_t - 1e-6)]
-
-    def _timeseries_subsampler(self, X: pd.DataFrame, sampler_function, percentage):
-        """
-        Subsample a time series DataFrame.
-
-        This method subsamples the input DataFrame based on specified time window percentage.
-        For example this could mean first 25% or last 50% of the time series.
-        It returns a list of subsampled columns.
-        """
-        if len(X) == 0:
-            data = np.full((6), np.nan)
-        else:
-            start_t = X.index[0]
-            end_t = X.index[-1]
-
-            sampled_start_t, sampled_end_t = self._subsample_switch[sampler_function](start_t,
-                                                                                      end_t,
-                                                                                      percentage)
-
-            data = X[(X.index < sampled_end_t + 1e-6) & (X.index > sampled_start_t - 1e-6)]
-
-            if len(data) == 0:
-                data = pd.DataFrame(np.full((len(X,)), np.nan))
-
-        return [data[channel] for channel in data]
-
-    def _read_timeseries_windows(self, X_df: pd.DataFrame, y_df: pd.DataFrame) -> 'tuple[list]':
-        """
-        Read time series windows.
-
-        This method reads the time series data to create windows for feature engineering, reaching from the
-        start time-stamp to the current timestamp. The window is paired with the current label. 
-        """
-        Xs = list()
-        ys = list()
-        ts = list()
-
-        for i in range(len(y_df)):
-            index = i
-
-            if index < 0 or index >= len(y_df):
-                raise ValueError(
-                    "Index must be from 0 (inclusive) to number of examples (exclusive).")
-
-            t = y_df.reset_index().iloc[index, 0]
-            y = y_df.reset_index().iloc[index, 1:]
-            X = X_df[X_df.index < t + 1e-6]
-
-            Xs.append(X)
-            ys.append(y)
-            ts.append(t)
-
-        return Xs, ys, ts
-
     def _convert_feature_dtype(self, X, y, t):
         """
         Convert feature data types.
 
         This method converts the data types of the input features, target values, and timestamps to numpy arrays.
         """
-        X = np.stack(X)
-        return np.array(X), np.array(y), np.array(t)
+        return np.asarray(X), np.asarray(y), np.asarray(t)
@@ -0,0 +1,328 @@
+"""
+Batched kernels for the window statistics of the MIMICFeatureEngine.
+
+A stay is passed as a (T, C) float array with NaN for missing observations, together with the
+timestamps of its rows and the cut points at which features are requested. For each cut point,
+channel and sampler combination, the min, max, mean, std, skew and len of the observations
+are computed, yielding the (N, C * n_combinations * 6) feature matrix in a single call.
+
+The statistics are read off prefix power sums and sparse min/max tables, so that the cost is
+linear in the stay length. If numba is installed, the range statistics are computed by a jitted
+loop, else a vectorized NumPy implementation is used.
+
+Usage Examples
+--------------
+.. code-block:: python
+
+    import numpy as np
+    from datasets.processors.feature_kernels import engineer_features
+
+    values = np.array([[1., np.nan], [2., 5.], [4., 6.]])
+    timestamps = np.array([0., 1., 2.])
+    features = engineer_features(values,
+                                 timestamps,
+                                 cut_points=np.array([1., 2.]),
+                                 sampler_combinations=[["first_percentage", 100]])
+    features.shape
+    >>> (2, 12)
+"""
+
+import numpy as np
+from typing import List, Tuple
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+__all__ = ["HAS_NUMBA", "engineer_features", "window_ranges", "range_statistics"]
+
+# Statistics in the order of the engineered features
+STATISTICS = ["min", "max", "mean", "std", "skew", "len"]
+_EPS = np.finfo(np.float64).eps
+# Cancellation in the power sums is tolerated up to float32 precision
+_PRECISION_FACTOR = 1e8
+
+
+def engineer_features(values: np.ndarray,
+                      timestamps: np.ndarray,
+                      cut_points: np.ndarray,
+                      sampler_combinations: List[Tuple[str, float]],
+                      use_numba: bool = None) -> np.ndarray:
+    """
+    Compute the engineered features of a stay for all cut points.
+
+    The window of a cut point t contains the observations up to t. Each sampler combination
+    then selects the first or last percentage of the time span between the first and last
+    observation of a channel within that window.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Array of shape (T, C) with the channel values of the stay, NaN if missing.
+    timestamps : np.ndarray
+        Sorted timestamps of shape (T,) of the rows in values.
+    cut_points : np.ndarray
+        Timestamps of shape (N,) at which the windows end.
+    sampler_combinations : list of tuple
+        Pairs of sampler function ("first_percentage" or "last_percentage") and percentage.
+    use_numba : bool, optional
+        Whether to use the numba kernel. Defaults to True if numba is installed.
+
+    Returns
+    -------
+    np.ndarray
+        Feature matrix of shape (N, C * len(sampler_combinations) * 6) and dtype float32,
+        ordered by channel, sampler combination and statistic.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    cut_points = np.atleast_1d(np.asarray(cut_points, dtype=np.float64))
+    if len(timestamps) != len(values):
+        raise ValueError(f"Number of timestamps {len(timestamps)} does not match "
+                         f"number of rows {len(values)}.")
+
+    n_channels = values.shape[1]
+    n_combinations = len(sampler_combinations)
+    features = np.full((len(cut_points), n_channels, n_combinations, len(STATISTICS)), np.nan)
+
+    for channel_idx in range(n_channels):
+        mask = ~np.isnan(values[:, channel_idx])
+        if not mask.any():
+            continue
+        lower, upper = window_ranges(timestamps[mask], cut_points, sampler_combinations)
+        statistics = range_statistics(values[mask, channel_idx],
+                                      lower.ravel(),
+                                      upper.ravel(),
+                                      use_numba=use_numba)
+        features[:, channel_idx] = statistics.reshape(n_combinations, len(cut_points),
+                                                      len(STATISTICS)).transpose(1, 0, 2)
+
+    return features.reshape(len(cut_points), -1).astype(np.float32)
+
+
+def window_bounds(start_t: np.ndarray, end_t: np.ndarray, sampler_function: str,
+                  percentage: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the time bounds of the first or last percentage of the span [start_t, end_t].
+    """
+    if sampler_function == "first_percentage":
+        return start_t, start_t + (end_t - start_t) * percentage / 100.0
+    if sampler_function == "last_percentage":
+        return end_t - (end_t - start_t) * percentage / 100.0, end_t
+    raise ValueError(f"Sampler function {sampler_function} not supported! "
+                     f"Use 'first_percentage' or 'last_percentage'.")
+
+
+def window_ranges(observation_times: np.ndarray, cut_points: np.ndarray,
+                  sampler_combinations: List[Tuple[str, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Resolve the sub-windows of each cut point to index ranges over the observations of a channel.
+
+    Parameters
+    ----------
+    observation_times : np.ndarray
+        Sorted timestamps of the non-missing observations of the channel.
+    cut_points : np.ndarray
+        Timestamps at which the windows end.
+    sampler_combinations : list of tuple
+        Pairs of sampler function and percentage.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        Lower (inclusive) and upper (exclusive) observation indices of shape
+        (len(sampler_combinations), len(cut_points)). Empty windows have lower == upper.
+    """
+    # Number of observations in each window
+    n_prefix = np.searchsorted(observation_times, cut_points + 1e-6, side="left")
+    has_data = n_prefix > 0
+    start_t = np.full(len(cut_points), observation_times[0])
+    end_t = observation_times[np.maximum(n_prefix - 1, 0)]
+
+    lower = np.empty((len(sampler_combinations), len(cut_points)), dtype=np.int64)
+    upper = np.empty_like(lower)
+    for idx, (sampler_function, percentage) in enumerate(sampler_combinations):
+        sampled_start_t, sampled_end_t = window_bounds(start_t, end_t, sampler_function,
+                                                       percentage)
+        lower[idx] = np.searchsorted(observation_times, sampled_start_t - 1e-6, side="right")
+        upper[idx] = np.minimum(
+            np.searchsorted(observation_times, sampled_end_t + 1e-6, side="left"), n_prefix)
+        upper[idx] = np.where(has_data, np.maximum(upper[idx], lower[idx]), lower[idx])
+    return lower, upper
+
+
+def range_statistics(values: np.ndarray,
+                     lower: np.ndarray,
+                     upper: np.ndarray,
+                     use_numba: bool = None) -> np.ndarray:
+    """
+    Compute min, max, mean, std, skew and len over the ranges values[lower:upper].
+
+    Empty ranges yield NaN for all statistics. The std has zero degrees of freedom and the skew
+    matches scipy.stats.skew with bias, being NaN for single or constant values.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Observations of a channel without missing values.
+    lower : np.ndarray
+        Inclusive range starts.
+    upper : np.ndarray
+        Exclusive range ends.
+    use_numba : bool, optional
+        Whether to use the numba kernel. Defaults to True if numba is installed.
+
+    Returns
+    -------
+    np.ndarray
+        Statistics of shape (len(lower), 6) and dtype float64.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    lower = np.asarray(lower, dtype=np.int64)
+    upper = np.asarray(upper, dtype=np.int64)
+    if use_numba is None:
+        use_numba = HAS_NUMBA
+    if use_numba and not HAS_NUMBA:
+        raise ValueError("Numba kernel requested, but numba is not installed.")
+
+    result = np.full((len(lower), len(STATISTICS)), np.nan)
+    if not len(values):
+        return result
+    power_sums, min_table, max_table = _prefix_statistics(values)
+    if use_numba:
+        _range_statistics_jit(values, power_sums, min_table, max_table, lower, upper, result)
+    else:
+        _range_statistics_numpy(values, power_sums, min_table, max_table, lower, upper, result)
+    return result
+
+
+def _prefix_statistics(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute the cumulative power sums and sparse min/max tables of a channel.
+
+    The values are shifted by their mean before accumulating the power sums, to limit the
+    cancellation when computing the central moments. Level k of the sparse tables holds the
+    min/max of the 2**k values starting at each index.
+    """
+    shifted_values = values - values.mean()
+    power_sums = np.zeros((4, len(values) + 1))
+    np.cumsum(shifted_values, out=power_sums[0, 1:])
+    np.cumsum(shifted_values**2, out=power_sums[1, 1:])
+    np.cumsum(shifted_values**3, out=power_sums[2, 1:])
+    # Used to bound the rounding error of the third power sum
+    np.cumsum(np.abs(shifted_values)**3, out=power_sums[3, 1:])
+
+    n_levels = int(np.log2(len(values))) + 1
+    min_table = np.full((n_levels, len(values)), np.inf)
+    max_table = np.full((n_levels, len(values)), -np.inf)
+    min_table[0] = values
+    max_table[0] = values
+    for level in range(1, n_levels):
+        width = 1 << (level - 1)
+        length = len(values) - (1 << level) + 1
+        min_table[level, :length] = np.minimum(min_table[level - 1, :length],
+                                               min_table[level - 1, width:width + length])
+        max_table[level, :length] = np.maximum(max_table[level - 1, :length],
+                                               max_table[level - 1, width:width + length])
+    return power_sums, min_table, max_table
+
+
+def _range_statistics_numpy(values: np.ndarray, power_sums: np.ndarray, min_table: np.ndarray,
+                            max_table: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+                            result: np.ndarray):
+    """
+    Vectorized range statistics, written into result.
+    """
+    count = upper - lower
+    valid = count > 0
+    if not valid.any():
+        return
+    lower, upper, count = lower[valid], upper[valid], count[valid].astype(np.float64)
+
+    level = np.floor(np.log2(count)).astype(np.int64)
+    upper_start = upper - (1 << level)
+    range_min = np.minimum(min_table[level, lower], min_table[level, upper_start])
+    range_max = np.maximum(max_table[level, lower], max_table[level, upper_start])
+
+    moment_1, moment_2, moment_3 = (power_sums[:3, upper] - power_sums[:3, lower]) / count
+    mean = values.mean() + moment_1
+    is_constant = range_min == range_max
+    central_moment_2 = np.where(is_constant, 0., np.maximum(moment_2 - moment_1**2, 0.))
+    central_moment_3 = moment_3 - 3 * moment_1 * moment_2 + 2 * moment_1**3
+
+    # Recompute ranges where the rounding error could exceed float32 precision
+    rounding_error = _EPS * len(values) / count * _PRECISION_FACTOR
+    is_inexact = ~is_constant & (
+        (central_moment_2 <= rounding_error * (power_sums[1, upper] + power_sums[1, lower])) |
+        (np.abs(central_moment_3) <= rounding_error *
+         (power_sums[3, upper] + power_sums[3, lower])))
+    for idx in np.where(is_inexact)[0]:
+        window = values[lower[idx]:upper[idx]]
+        mean[idx] = np.mean(window)
+        central_moment_2[idx] = np.mean((window - mean[idx])**2)
+        central_moment_3[idx] = np.mean((window - mean[idx])**3)
+
+    with np.errstate(all="ignore"):
+        skewness = central_moment_3 / central_moment_2**1.5
+    has_no_skew = (count <= 1) | is_constant | (central_moment_2 <= (_EPS * mean)**2)
+    skewness[has_no_skew] = np.nan
+
+    result[valid] = np.stack(
+        [range_min, range_max, mean,
+         np.sqrt(central_moment_2), skewness, count], axis=1)
+
+
+def _range_statistics_loop(values: np.ndarray, power_sums: np.ndarray, min_table: np.ndarray,
+                           max_table: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+                           result: np.ndarray):
+    """
+    Loop implementation of the range statistics, compiled by numba if available.
+    """
+    shift = values.mean()
+    for idx in range(len(lower)):
+        start, end = lower[idx], upper[idx]
+        if end <= start:
+            continue
+        count = float(end - start)
+        level = int(np.floor(np.log2(count)))
+        upper_start = end - (1 << level)
+        range_min = min(min_table[level, start], min_table[level, upper_start])
+        range_max = max(max_table[level, start], max_table[level, upper_start])
+
+        moment_1 = (power_sums[0, end] - power_sums[0, start]) / count
+        moment_2 = (power_sums[1, end] - power_sums[1, start]) / count
+        moment_3 = (power_sums[2, end] - power_sums[2, start]) / count
+        mean = shift + moment_1
+        is_constant = range_min == range_max
+        central_moment_2 = 0. if is_constant else max(moment_2 - moment_1**2, 0.)
+        central_moment_3 = moment_3 - 3 * moment_1 * moment_2 + 2 * moment_1**3
+
+        rounding_error = _EPS * len(values) / count * _PRECISION_FACTOR
+        if not is_constant and (
+                central_moment_2 <= rounding_error *
+            (power_sums[1, end] + power_sums[1, start]) or abs(central_moment_3)
+                <= rounding_error * (power_sums[3, end] + power_sums[3, start])):
+            window = values[start:end]
+            mean = np.mean(window)
+            central_moment_2 = np.mean((window - mean)**2)
+            central_moment_3 = np.mean((window - mean)**3)
+
+        result[idx, 0] = range_min
+        result[idx, 1] = range_max
+        result[idx, 2] = mean
+        result[idx, 3] = np.sqrt(central_moment_2)
+        if count <= 1 or is_constant or central_moment_2 <= (_EPS * mean)**2:
+            result[idx, 4] = np.nan
+        else:
+            result[idx, 4] = central_moment_3 / central_moment_2**1.5
+        result[idx, 5] = count
+
+
+if HAS_NUMBA:
+    _range_statistics_jit = njit(cache=True)(_range_statistics_loop)
+else:
+    _range_statistics_jit = _range_statistics_loop
@@ -120,9 +120,8 @@ class MIMICPreprocessor(AbstractProcessor):
         if tracker is not None:
             self._tracker = tracker
         else:
-            with self._lock:
-                self._tracker = (None if storage_path is None else PreprocessingTracker(
-                    Path(storage_path, "progress")))
+            self._tracker = (None if storage_path is None else PreprocessingTracker(
+                Path(storage_path, "progress")))
         self._storage_reader = (None if storage_path is None else ProcessedSetReader(
             root_path=storage_path))
         self._phenotypes_yaml = phenotypes_yaml
@@ -286,9 +285,8 @@ class MIMICPreprocessor(AbstractProcessor):
             episodic_data_df: pd.DataFrame = subject_data['episodic_data']
 
             tracking_info[subject] = dict()
-            with self._lock:
-                is_in_subjects = subject in self._tracker.subjects
-            if (self._tracker is not None) and is_in_subjects and (not subject in self._X):
+            if (self._tracker is not None) and (subject in self._tracker.subjects) and \
+               (not subject in self._X):
                 # Do not reprocess already existing directories
                 self._X[subject], \
                 self._y[subject] = self._storage_reader.read_sample(
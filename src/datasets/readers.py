@@ -25,6 +25,9 @@ The following table describes the input and output for each reader in this modul
 | SplitSetReader       | Dataset split     | Training, validation, and test   |
 |                      | information       | sets                             |
 +----------------------+-------------------+----------------------------------+
+| SampleStoreReader    | Columnar sample   | Memory-mapped feature and target |
+|                      | store             | matrices with sample IDs         |
++----------------------+-------------------+----------------------------------+
 
 References
 ----------
@@ -33,11 +36,11 @@ References
 import random
 import re
 import os
+import json
 import threading
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import multiprocessing as mp
 from collections.abc import Iterable
 from copy import deepcopy
 from metrics import CustomBins, LogBins
@@ -46,12 +49,15 @@ from utils.IO import *
 from settings import *
 from utils.timeseries import read_timeseries, subjects_for_samples
 from utils.arrays import get_iterable_dtype, is_iterable, zeropad_samples
-from utils.types import NoopLock
 from .mimic_utils import upper_case_column_names, convert_dtype_dict, read_varmap_csv
 from .trackers import ExtractionTracker, PreprocessingTracker
+from .writers import SAMPLE_STORE_COLUMNS
 from typing import List, Union, Dict
 
-__all__ = ["ExtractedSetReader", "ProcessedSetReader", "EventReader", "SplitSetReader"]
+__all__ = [
+    "ExtractedSetReader", "ProcessedSetReader", "EventReader", "SplitSetReader",
+    "SampleStoreReader"
+]
 
 
 class AbstractReader(object):
@@ -728,7 +734,14 @@ class ProcessedSetReader(AbstractReader):
     """
 
     def __init__(self, root_path: Path, subject_ids: list = None) -> None:
-        self._reader_switch = {
+        self._reader_switch = self._init_reader_switch()
+        super().__init__(root_path, subject_ids)
+        self._random_ids = deepcopy(self.subject_ids)
+        self._convert_datetime = ["INTIME", "CHARTTIME", "OUTTIME"]
+        self._possibgle_datatypes = [pd.DataFrame, np.ndarray, np.array, None]
+
+    def _init_reader_switch(self):
+        return {
             "csv":
                 defaultdict(lambda: self._read_csv, \
                 {"X": (lambda x: self._read_csv(x, dtypes=DATASET_SETTINGS["timeseries"]["dtype"]))}),
@@ -737,10 +750,16 @@ class ProcessedSetReader(AbstractReader):
             "h5":
                 defaultdict(lambda: pd.read_hdf, {"X": self._read_hdf})
         }
-        super().__init__(root_path, subject_ids)
-        self._random_ids = deepcopy(self.subject_ids)
-        self._convert_datetime = ["INTIME", "CHARTTIME", "OUTTIME"]
-        self._possibgle_datatypes = [pd.DataFrame, np.ndarray, np.array, None]
+
+    def __getstate__(self):
+        # The switch holds lambdas, which the standard pickler of spawned processes can't handle
+        state = self.__dict__.copy()
+        state.pop("_reader_switch", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reader_switch = self._init_reader_switch()
 
     @staticmethod
     def _read_csv(path: Path, dtypes: tuple = None) -> pd.DataFrame:
@@ -1078,14 +1097,16 @@ class ProcessedSetReader(AbstractReader):
         prefices = deepcopy(list(dataset.keys()))
 
         if deep_supervision:
+            # One hot bins replace the label dimension
             if bining == "custom":
                 dataset["yds"] = [
-                    CustomBins.get_bin_custom(x, one_hot=one_hot).reshape(*x.shape)
+                    CustomBins.get_bins_custom(np.asarray(x),
+                                               one_hot=one_hot).reshape(*x.shape[:-1], -1)
                     for x in dataset["yds"]
                 ]
             elif bining == "log":
                 dataset["yds"] = [
-                    LogBins.get_bin_log(x, one_hot=one_hot).reshape(*x.shape)
+                    LogBins.get_bins_log(np.asarray(x), one_hot=one_hot).reshape(*x.shape[:-1], -1)
                     for x in dataset["yds"]
                 ]
         else:
@@ -1149,6 +1170,103 @@ class ProcessedSetReader(AbstractReader):
             return dataset, subject_ids
         return dataset
 
+    def read_sample_store(self, mmap_mode: str = "r") -> Dict[str, np.ndarray]:
+        """
+        Read the columnar sample store written by the feature engine.
+
+        The samples are returned as memory-mapped arrays. If the reader was created for a subset
+        of subjects, only the samples of these subjects are loaded into memory.
+
+        Parameters
+        ----------
+        mmap_mode : str, optional
+            Memory-map mode passed to np.memmap. Default is "r".
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            Dictionary with the feature matrix "X", targets "y", timestamps "t", "subject_ids"
+            and "stay_ids" of the samples.
+        """
+        subject_ids = None if self._update_self else self.subject_ids
+        return SampleStoreReader(Path(self._root_path, "sample_store")).read(subject_ids=subject_ids,
+                                                                            mmap_mode=mmap_mode)
+
+
+class SampleStoreReader():
+    """
+    A reader for the columnar sample store written by the `SampleStoreWriter`.
+
+    The feature and target matrices, timestamps and IDs are stored as raw binary columns, which
+    are read as memory-maps without parsing.
+
+    Examples
+    --------
+    >>> reader = SampleStoreReader(Path("/path/to/engineered/data", "sample_store"))
+    >>> dataset = reader.read()
+    >>> dataset["X"].shape
+        (23456, 714)
+    >>> model.fit(dataset["X"], dataset["y"].ravel())
+
+    Parameters
+    ----------
+    root_path : Path
+        The directory of the sample store.
+    """
+
+    COLUMNS = SAMPLE_STORE_COLUMNS
+
+    def __init__(self, root_path: Path) -> None:
+        self._root_path = Path(root_path)
+        header_path = Path(self._root_path, "header.json")
+        if not header_path.is_file():
+            raise ValueError(f"No sample store found in {self._root_path}!")
+        with open(header_path) as file:
+            self._header = json.load(file)
+        self._shapes = {"X": (self._header["n_features"],), "y": (self._header["n_targets"],)}
+
+    @property
+    def n_samples(self) -> int:
+        """
+        Number of committed samples in the store.
+        """
+        # Rows of an interrupted append are ignored
+        return self._header["n_samples"]
+
+    def read(self, subject_ids: List[int] = None, mmap_mode: str = "r") -> Dict[str, np.ndarray]:
+        """
+        Read the store as memory-mapped arrays.
+
+        Parameters
+        ----------
+        subject_ids : List[int], optional
+            Subjects to read. If specified, the selected samples are loaded into memory.
+            Default is None.
+        mmap_mode : str, optional
+            Memory-map mode passed to np.memmap. Default is "r".
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            Dictionary with the feature matrix "X", targets "y", timestamps "t", "subject_ids"
+            and "stay_ids" of the samples.
+        """
+        n_samples = self.n_samples
+        dataset = dict()
+        for column, dtype in self.COLUMNS.items():
+            shape = (n_samples,) + self._shapes.get(column, ())
+            if not n_samples:
+                dataset[column] = np.empty(shape, dtype=dtype)
+                continue
+            dataset[column] = np.memmap(Path(self._root_path, f"{column}.bin"),
+                                        dtype=dtype,
+                                        mode=mmap_mode,
+                                        shape=shape)
+        if subject_ids is not None:
+            mask = np.isin(dataset["subject_ids"], np.asarray(subject_ids, dtype=np.int64))
+            dataset = {column: np.asarray(array[mask]) for column, array in dataset.items()}
+        return dataset
+
 
 class EventReader():
     """
@@ -1195,12 +1313,10 @@ class EventReader():
                  subject_ids: list = None,
                  chunksize: int = None,
                  tracker: ExtractionTracker = None,
-                 verbose: bool = True,
-                 lock: mp.Lock = NoopLock()) -> None:
+                 verbose: bool = True) -> None:
 
         self.dataset_folder = dataset_folder
         self._done = False
-        self._lock = lock
         self._verbose = verbose
 
         # Logic to early terminate if none of the subjects are in the remaining dataset
@@ -1299,13 +1415,12 @@ class EventReader():
         msg = list()
         for csv in self._event_csv_kwargs:
             try:
-                with self._lock:
-                    n_chunks = self._tracker.count_subject_events[csv] // self._chunksize
-                    skip_rows = self._tracker.count_subject_events[csv] % self._chunksize
+                count_subject_events = self._tracker.count_subject_events[csv]
+                n_chunks = count_subject_events // self._chunksize
+                skip_rows = count_subject_events % self._chunksize
                 [len(self._csv_reader[csv].get_chunk()) for _ in range(n_chunks)]  # skipping chunks
                 self.event_csv_skip_rows[csv] = skip_rows  # rows to skip in first chunk
-                with self._lock:
-                    msg.append(f"{csv}: {self._tracker.count_subject_events[csv]}")
+                msg.append(f"{csv}: {count_subject_events}")
             except:
                 self._csv_handle[csv].close()
         info_io(header + " - ".join(msg), verbose=self._verbose)
@@ -0,0 +1,206 @@
+"""
+This module provides an indexed view of the subject_info.csv file of a dataset, which is queried
+by the demographic filters and splits of the splitters.
+
+The file is parsed once per dataset root and cached until it changes on disk. Each column is kept
+as a NumPy array, categorical columns are encoded as integer codes. Queries evaluate predicates on
+the rows, i.e. ICU stays, and return boolean subject bitmaps aligned with the subject_ids attribute
+of the table.
+
+Examples
+--------
+>>> table = SubjectInfoTable.from_root(reader.root_path)
+>>> rows = table.rows_in_range("AGE", geq=18, less=65) & table.rows_in_choice("INSURANCE", ["Medicare"])
+>>> table.to_ids(table.subjects_for(rows))
+[10006, 10011, 10019]
+"""
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+__all__ = ["SubjectInfoTable"]
+
+# Dataset root -> (file stamp, table)
+_TABLE_CACHE: Dict[str, Tuple[tuple, "SubjectInfoTable"]] = dict()
+
+
+class SubjectInfoTable():
+    """
+    Columnar table of the subject infos with row predicates and subject bitmaps.
+
+    Parameters
+    ----------
+    subject_info_df : pd.DataFrame
+        The subject infos, one row per ICU stay, including the SUBJECT_ID column.
+    """
+
+    def __init__(self, subject_info_df: pd.DataFrame):
+        if "SUBJECT_ID" not in subject_info_df.columns:
+            raise ValueError("Subject info is missing the SUBJECT_ID column.")
+        # Subjects in order of first appearance
+        self._row_subjects, subject_ids = pd.factorize(subject_info_df["SUBJECT_ID"])
+        self._subject_ids = np.asarray(subject_ids)
+        self._subject_positions = pd.Index(self._subject_ids)
+        self._columns = list(subject_info_df.columns)
+        self._numeric = dict()
+        self._codes = dict()
+        self._categories = dict()
+        for column in self._columns:
+            data = subject_info_df[column]
+            if pd.api.types.is_numeric_dtype(data) and not pd.api.types.is_bool_dtype(data):
+                self._numeric[column] = data.to_numpy(dtype=np.float64, na_value=np.nan)
+            codes, categories = pd.factorize(data)
+            self._codes[column] = codes.astype(np.int32)
+            self._categories[column] = pd.Index(categories)
+
+    @classmethod
+    def from_root(cls, root_path: Path) -> "SubjectInfoTable":
+        """
+        Load the subject_info.csv of a dataset root, reusing the cached table if the file is
+        unchanged.
+
+        Parameters
+        ----------
+        root_path : Path
+            The dataset directory containing the subject_info.csv file.
+
+        Returns
+        -------
+        SubjectInfoTable
+            The table of the dataset.
+        """
+        csv_path = Path(root_path, "subject_info.csv")
+        stat = os.stat(csv_path)
+        stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        key = str(csv_path.resolve())
+        if key in _TABLE_CACHE and _TABLE_CACHE[key][0] == stamp:
+            return _TABLE_CACHE[key][1]
+        table = cls(pd.read_csv(csv_path))
+        _TABLE_CACHE[key] = (stamp, table)
+        return table
+
+    @property
+    def columns(self) -> List[str]:
+        """
+        The columns of the subject infos.
+        """
+        return list(self._columns)
+
+    @property
+    def subject_ids(self) -> np.ndarray:
+        """
+        The subject IDs in order of first appearance, aligned with the subject bitmaps.
+        """
+        return self._subject_ids.copy()
+
+    def _check_column(self, column: str):
+        if column not in self._codes:
+            raise ValueError(f"Invalid demographic. Choose from {*self._columns,}\n"
+                             f"Demographic is: {column}")
+
+    def rows_in_range(self,
+                      column: str,
+                      geq: float = None,
+                      greater: float = None,
+                      leq: float = None,
+                      less: float = None) -> np.ndarray:
+        """
+        Rows whose value lies in the range. Missing values never do.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean row mask.
+        """
+        self._check_column(column)
+        if column not in self._numeric:
+            raise ValueError(f"Range predicates require a numeric column, but {column} is not.")
+        values = self._numeric[column]
+        mask = ~np.isnan(values)
+        with np.errstate(invalid="ignore"):
+            if geq is not None:
+                mask &= values >= geq
+            if greater is not None:
+                mask &= values > greater
+            if leq is not None:
+                mask &= values <= leq
+            if less is not None:
+                mask &= values < less
+        return mask
+
+    def rows_in_choice(self, column: str, choices: list) -> np.ndarray:
+        """
+        Rows whose value is one of the choices. A missing choice matches missing values.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean row mask.
+        """
+        self._check_column(column)
+        choices = list(choices)
+        choice_codes = self._categories[column].get_indexer(
+            [choice for choice in choices if not pd.isna(choice)])
+        # Unknown choices are dropped, missing values are encoded as -1
+        choice_codes = choice_codes[choice_codes != -1]
+        if any(pd.isna(choice) for choice in choices):
+            choice_codes = np.append(choice_codes, -1)
+        return np.isin(self._codes[column], choice_codes)
+
+    def rows_for_subjects(self, subject_ids: list) -> np.ndarray:
+        """
+        Rows belonging to the subjects.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean row mask.
+        """
+        return self.subject_bitmap(subject_ids)[self._row_subjects]
+
+    def subjects_for(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Subjects with at least one of the rows.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean subject bitmap.
+        """
+        bitmap = np.zeros(len(self._subject_ids), dtype=bool)
+        bitmap[self._row_subjects[rows]] = True
+        return bitmap
+
+    def subject_bitmap(self, subject_ids: list) -> np.ndarray:
+        """
+        Bitmap of the subjects, ignoring subjects not in the table.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean subject bitmap.
+        """
+        positions = self._subject_positions.get_indexer(list(subject_ids))
+        bitmap = np.zeros(len(self._subject_ids), dtype=bool)
+        bitmap[positions[positions != -1]] = True
+        return bitmap
+
+    def to_ids(self, bitmap: np.ndarray) -> list:
+        """
+        Subject IDs of a bitmap, in order of first appearance.
+        """
+        return self._subject_ids[bitmap].tolist()
+
+    def unique_values(self, column: str, rows: np.ndarray = None) -> np.ndarray:
+        """
+        Distinct values of the column in the rows, including missing values.
+        """
+        self._check_column(column)
+        codes = self._codes[column] if rows is None else self._codes[column][rows]
+        codes = pd.unique(codes)
+        values = self._categories[column].take(codes[codes != -1]).to_numpy()
+        if (codes == -1).any():
+            values = np.append(values.astype(object), np.nan)
+        return values
@@ -14,7 +14,7 @@ from utils.IO import *
 from datasets.readers import ProcessedSetReader, SplitSetReader
 from pathlib import Path
 from datasets.trackers import DataSplitTracker, PreprocessingTracker
-from pathos.multiprocessing import Pool, cpu_count
+from datasets.split.demographics import SubjectInfoTable
 from utils.jsons import dict_subset
 from collections import OrderedDict
 from itertools import chain
@@ -28,14 +28,17 @@ class AbstractSplitter(ABC):
     Parameters
     ----------
     max_iter : int, optional
-        Maximum number of iterations for ratio-based splitting. Default is 100.
+        Maximum number of random subject orders tried for ratio-based splitting. Default is 100.
     tolerance : float, optional
         Tolerance level for ratio deviations. Default is 0.005.
+    seed : int, optional
+        Seed of the random subject orders. Default is 42.
     """
 
-    def __init__(self, max_iter: int = 100, tolerance: float = 0.005) -> None:
+    def __init__(self, max_iter: int = 100, tolerance: float = 0.005, seed: int = 42) -> None:
         self._max_iter = max_iter
         self._tolerance = tolerance
+        self._seed = seed
 
     @staticmethod
     def _print_ratio(prefix: str, ratio: dict):
@@ -108,8 +111,9 @@ class AbstractSplitter(ABC):
         if test_size and "train" in subjects:
             target_ratios["train"] = 1 - test_size - val_size
 
-        ratio_df = self._create_ratio_df(list(chain.from_iterable(subjects.values())),
-                                         sample_counts)
+        subject_ids = list(chain.from_iterable(subjects.values()))
+        ratio_df = self._create_ratio_df(subject_ids, sample_counts,
+                                         self._get_strata(subject_ids))
 
         processed_split_names = list()
         input_ratios = {
@@ -203,9 +207,10 @@ class AbstractSplitter(ABC):
 
         return return_subjects, return_ratios
 
-    def _create_ratio_df(self, subject_ids: List[int], sample_counts: dict):
+    def _create_ratio_df(self, subject_ids: List[int], sample_counts: dict, strata: dict = None):
         """
         Creates a DataFrame with the ratio of subject samples to total samples for each subject.
+        If strata are provided, the stratum of each subject is added as a column.
         """
         subject_ratios = [
             (subject_id, sample_counts[subject_id]["total"]) for subject_id in subject_ids
@@ -213,9 +218,18 @@ class AbstractSplitter(ABC):
         ratio_df = pd.DataFrame(subject_ratios, columns=['participant', 'ratio'])
         total_len = ratio_df["ratio"].sum()
         ratio_df["ratio"] = ratio_df["ratio"] / total_len
+        if strata is not None:
+            ratio_df["stratum"] = ratio_df["participant"].map(strata)
         ratio_df = ratio_df.sort_values('ratio')
         return ratio_df
 
+    def _get_strata(self, subject_ids: List[int]) -> dict:
+        """
+        Stratification hook. Returns a mapping of subject ID to stratum, so that each split
+        receives the same share of every stratum, or None for unstratified splits.
+        """
+        return None
+
     def _split_by_ratio(self,
                         subject_ids: List[int],
                         sample_counts: dict,
@@ -230,7 +244,8 @@ class AbstractSplitter(ABC):
             raise ValueError("Invalid val size")
         return_ratios = dict()
         return_subjects = dict()
-        ratio_df = self._create_ratio_df(subject_ids, sample_counts)
+        ratio_df = self._create_ratio_df(subject_ids, sample_counts,
+                                         self._get_strata(subject_ids))
 
         train_subjects = set(subject_ids)
 
@@ -275,16 +290,17 @@ class AbstractSplitter(ABC):
         if source_path is None or settings is None:
             return subject_ids
         self._check_settings(settings)
-        subject_info_df = pd.read_csv(Path(source_path, "subject_info.csv"))
-        subject_info_df = subject_info_df[subject_info_df["SUBJECT_ID"].isin(subject_ids)]
+        # Parsed once per dataset root
+        subject_info = SubjectInfoTable.from_root(source_path)
+        subject_rows = subject_info.rows_for_subjects(subject_ids)
 
         if prefix is not None and prefix:
             message = [prefix + ":"]
         else:
             message = []
 
-        def get_subjects(condition: pd.Series):
-            return subject_info_df[condition]["SUBJECT_ID"].unique()
+        def get_subjects(condition: np.ndarray):
+            return subject_info.subjects_for(condition & subject_rows)
 
         def get_categorical_message(choice):
             choice = list(choice)
@@ -295,8 +311,8 @@ class AbstractSplitter(ABC):
                 return f"is {choice[0]}"
 
         def check_setting(setting, attribute):
-            if not attribute in subject_info_df.columns:
-                raise ValueError(f"Invalid demographic. Choose from {*subject_info_df.columns,}\n"
+            if not attribute in subject_info.columns:
+                raise ValueError(f"Invalid demographic. Choose from {*subject_info.columns,}\n"
                                  f"Demographic is: {attribute}")
             if "geq" in setting:
                 check_range(setting["geq"], setting)
@@ -319,34 +335,36 @@ class AbstractSplitter(ABC):
                         raise ValueError(
                             f"Invalid range: greater={greater_value} > leq={setting[key]}")
 
+        # Subject bitmaps
         if invert:
-            exclude_subjects = set(subject_ids)
+            exclude_subjects = subject_info.subject_bitmap(subject_ids)
         else:
-            exclude_subjects = set()
+            exclude_subjects = np.zeros(len(subject_info.subject_ids), dtype=bool)
 
         for attribute, setting in settings.items():
             attribute_message = " "
             check_setting(setting, attribute)
-            attribute_data = subject_info_df[attribute]
 
             if "geq" in setting:
                 # We use this reversed logic to avoid including any subjects where on stay
                 # may fail the specification
                 if invert:
-                    exclude_subjects.intersection_update(
-                        get_subjects(attribute_data >= setting["geq"]))
+                    exclude_subjects &= get_subjects(
+                        subject_info.rows_in_range(attribute, geq=setting["geq"]))
                     attribute_message += f"{setting['geq']:0.3f} > "
                 else:
-                    exclude_subjects.update(get_subjects(attribute_data < setting["geq"]))
+                    exclude_subjects |= get_subjects(
+                        subject_info.rows_in_range(attribute, less=setting["geq"]))
                     attribute_message += f"{setting['geq']:0.3f} =< "
 
             if "greater" in setting:
                 if invert:
-                    exclude_subjects.intersection_update(
-                        get_subjects(attribute_data > setting["greater"]))
+                    exclude_subjects &= get_subjects(
+                        subject_info.rows_in_range(attribute, greater=setting["greater"]))
                     attribute_message += f"{setting['greater']:0.3f} >= "
                 else:
-                    exclude_subjects.update(get_subjects(attribute_data <= setting["greater"]))
+                    exclude_subjects |= get_subjects(
+                        subject_info.rows_in_range(attribute, leq=setting["greater"]))
                     attribute_message += f"{setting['greater']:0.3f} < "
 
             if invert and ("geq" in setting or "greater" in setting) and\
@@ -360,102 +378,102 @@ class AbstractSplitter(ABC):
 
             if "leq" in setting:
                 if invert:
-                    exclude_subjects.intersection_update(
-                        get_subjects(attribute_data < setting["leq"]))
+                    exclude_subjects &= get_subjects(
+                        subject_info.rows_in_range(attribute, less=setting["leq"]))
                     attribute_message += f"{setting['leq']:0.3f} < {attribute}"
                 else:
-                    exclude_subjects.update(get_subjects(attribute_data >= setting["leq"]))
+                    exclude_subjects |= get_subjects(
+                        subject_info.rows_in_range(attribute, geq=setting["leq"]))
                     attribute_message += f"<= {setting['leq']:0.3f}"
 
             if "less" in setting:
                 if invert:
-                    exclude_subjects.intersection_update(
-                        get_subjects(attribute_data < setting["less"]))
+                    exclude_subjects &= get_subjects(
+                        subject_info.rows_in_range(attribute, less=setting["less"]))
                     attribute_message += f"{setting['less']:0.3f} <= {attribute}"
                 else:
-                    exclude_subjects.update(get_subjects(attribute_data >= setting["less"]))
+                    exclude_subjects |= get_subjects(
+                        subject_info.rows_in_range(attribute, geq=setting["less"]))
                     attribute_message += f"< {setting['less']:0.3f}"
 
             if "choice" in setting:
-                categories = attribute_data.unique()
+                categories = subject_info.unique_values(attribute, subject_rows)
                 not_choices = set(categories) - set(setting["choice"])
                 if invert:
-                    exclude_subjects.intersection_update(
-                        get_subjects(attribute_data.isin(setting["choice"])))
+                    exclude_subjects &= get_subjects(
+                        subject_info.rows_in_choice(attribute, setting["choice"]))
                     attribute_message += get_categorical_message(not_choices)
                 else:
-                    exclude_subjects.update(get_subjects(attribute_data.isin(not_choices)))
+                    exclude_subjects |= get_subjects(
+                        subject_info.rows_in_choice(attribute, not_choices))
                     attribute_message += get_categorical_message(setting["choice"])
 
             message.append(attribute_message)
 
         if prefix is not None:
             info_io("\n".join(message))
-        subject_info_df = subject_info_df[~subject_info_df["SUBJECT_ID"].isin(exclude_subjects)]
-        return subject_info_df["SUBJECT_ID"].unique().tolist()
+        return subject_info.to_ids(subject_info.subjects_for(subject_rows) & ~exclude_subjects)
 
     def _subjects_for_ratio(self, ratio_df: pd.DataFrame, target_size: float):
         """
         Selects subjects to match the target ratio.
+
+        If the ratio frame has a stratum column, each stratum contributes to the target in
+        proportion to its share of the frame.
         """
         assert "participant" in ratio_df.columns
         assert "ratio" in ratio_df.columns
-        best_diff = 1e18
-        iter = 0
-
-        def compute_ratios(random_state):
-            current_size = 0
-            remaining_pairs_df = ratio_df_pr
-            subjects = list()
-            sample_size = int(min(1, np.floor(target_size_pr / remaining_pairs_df.ratio.max())))
-
-            while current_size < target_size_pr:
-                current_to_rarget_diff = target_size_pr - current_size
-                remaining_pairs_df = remaining_pairs_df[remaining_pairs_df['ratio'] <
-                                                        current_to_rarget_diff]
-
-                if remaining_pairs_df.empty:
-                    break
-
-                next_subject = remaining_pairs_df.sample(sample_size, random_state=random_state)
-
-                current_size += sum(next_subject.ratio.tolist())
-                subject_names = next_subject.participant.tolist()
-                remaining_pairs_df = remaining_pairs_df[~remaining_pairs_df.participant.
-                                                        isin(subject_names)]
-
-                subjects.extend(subject_names)
-                if remaining_pairs_df.empty:
-                    break
-
-                large_sample_bound = int(np.floor(
-                                        abs(target_size_pr - current_size)\
-                                        / remaining_pairs_df.ratio.max()))
-                sample_size = min(large_sample_bound, len(remaining_pairs_df))
-
-            diff = abs(target_size_pr - current_size)
-            return diff, current_size, subjects
-
-        def init(ratio_df, target_size):
-            global ratio_df_pr, target_size_pr
-            ratio_df_pr = ratio_df
-            target_size_pr = target_size
-
-        pool = Pool()  # Create a process pool
-        n_cpus = cpu_count() - 1
-        with Pool(n_cpus, initializer=init, initargs=(ratio_df, target_size)) as pool:
-            res = pool.imap_unordered(compute_ratios,
-                                      list(range(self._max_iter)),
-                                      chunksize=int(np.ceil(self._max_iter / n_cpus)))
-            while best_diff > self._tolerance and iter < self._max_iter:
-                diff, current_size, subjects = next(res)
-                iter += 1
-                if diff < best_diff:
-                    best_subjects, best_size, best_diff = subjects, current_size, diff
-            pool.close()
-            pool.join()
-
-        return best_subjects, best_size
+        if "stratum" not in ratio_df.columns:
+            return self._subjects_for_target(ratio_df["participant"].to_numpy(),
+                                             ratio_df["ratio"].to_numpy(), target_size)
+
+        total_ratio = ratio_df["ratio"].sum()
+        subjects, size = list(), 0.
+        for _, stratum_df in ratio_df.groupby("stratum", dropna=False, sort=True):
+            stratum_target = target_size * stratum_df["ratio"].sum() / total_ratio
+            stratum_subjects, stratum_size = self._subjects_for_target(
+                stratum_df["participant"].to_numpy(), stratum_df["ratio"].to_numpy(),
+                stratum_target)
+            subjects.extend(stratum_subjects)
+            size += stratum_size
+        return subjects, size
+
+    def _subjects_for_target(self, participants: np.ndarray, ratios: np.ndarray,
+                             target_size: float):
+        """
+        Selects participants whose ratios sum up to the target within tolerance.
+
+        Each try cuts a seeded random order of the participants at the target using prefix sums
+        and then tops up the remainder with the smallest unselected participants.
+        """
+        if not len(participants) or target_size <= 0:
+            return list(), 0.
+        generator = np.random.default_rng(self._seed)
+        best_diff, best_selection, best_size = np.inf, None, 0.
+
+        for _ in range(max(self._max_iter, 1)):
+            order = generator.permutation(len(ratios))
+            cumulative_ratios = np.cumsum(ratios[order])
+            n_prefix = int(np.searchsorted(cumulative_ratios, target_size, side="right"))
+            size = cumulative_ratios[n_prefix - 1] if n_prefix else 0.
+
+            # Top up with the smallest remaining participants that still fit
+            remainder = order[n_prefix:]
+            remainder = remainder[np.argsort(ratios[remainder], kind="stable")]
+            cumulative_remainder = np.cumsum(ratios[remainder])
+            n_top_up = int(
+                np.searchsorted(cumulative_remainder, target_size - size + 1e-12, side="right"))
+            selection = np.concatenate([order[:n_prefix], remainder[:n_top_up]])
+            if n_top_up:
+                size += cumulative_remainder[n_top_up - 1]
+
+            diff = abs(target_size - size)
+            if diff < best_diff:
+                best_diff, best_selection, best_size = diff, selection, size
+            if best_diff <= self._tolerance:
+                break
+
+        return participants[best_selection].tolist(), float(best_size)
 
     def _split_val_from_train(self, val_size: float, split_dictionary: dict, ratios: dict,
                               split_tracker: DataSplitTracker):
@@ -583,7 +601,8 @@ class ReaderSplitter(AbstractSplitter):
                 if train_size > len(subject_ids):
                     warn_io(f"Train size {train_size} is larger than the number of subjects")
                 else:
-                    split_dictionary["train"] = random.sample(split_dictionary["train"], train_size)
+                    split_dictionary["train"] = random.Random(self._seed).sample(
+                        split_dictionary["train"], train_size)
 
                 split_dictionary, ratios = self._reduce_by_ratio(
                     subjects=split_dictionary,
@@ -31,7 +31,9 @@ The following table describes the input and tracking details for each tracker in
 +------------------------+-------------------+----------------------------------+
 """
 
-from typing import List
+import os
+import numpy as np
+from typing import Any, List, Tuple
 from utils.IO import *
 from storable import storable
 from utils.jsons import write_json
@@ -80,9 +82,6 @@ class ExtractionTracker():
                  subject_ids: list = None,
                  *args,
                  **kwargs) -> None:
-        # TODO: proof storables against concurrent access. Currently this has to be handles
-        # externally.
-        self._lock = None
         # If num samples has increase more samples need to be raised, if decreased value error
         if self.num_samples is not None and num_samples is None:
             # If changed to None extraction is carried out for all samples
@@ -143,6 +142,7 @@ class ExtractionTracker():
         assert isinstance(value, bool)
         self.finished = value
         if value:
+            self.close()
             write_json(Path(str(self._path) + ".json"), self._read())
 
 
@@ -181,7 +181,6 @@ class PreprocessingTracker():
 
     def __init__(self, **kwargs):
         # Do nothing on init since subject_ids and num_subjects are not yet available
-        self._lock = None
         self.deep_supervision = kwargs.get("deep_supervision", None)
 
         # The impute startegies of the discretizer might change
@@ -248,6 +247,7 @@ class PreprocessingTracker():
                 if "no_deep_supervision" not in self.supervision_modes:
                     self.supervision_modes.append("no_deep_supervision")
             self.force_rerun = False
+            self.close()
             write_json(Path(str(self._path) + ".json"), self._read())
 
     @property
@@ -261,9 +261,7 @@ class PreprocessingTracker():
             A list of subject IDs.
         """
         if hasattr(self, "_progress"):
-            return [
-                subject_id for subject_id in self._read("subjects").keys() if subject_id != "total"
-            ]
+            return self._get_index()["subject_ids"].tolist()
         return list()
 
     @property
@@ -277,10 +275,7 @@ class PreprocessingTracker():
             A list of stay IDs.
         """
         if hasattr(self, "_progress"):
-            return [
-                stay_id for subject_id, subject_data in self._read("subjects").items()
-                if subject_id != "total" for stay_id in subject_data.keys() if stay_id != "total"
-            ]
+            return self._get_index()["stay_ids"].tolist()
         return list()
 
     @property
@@ -294,13 +289,114 @@ class PreprocessingTracker():
             The total number of samples processed.
         """
         if hasattr(self, "_progress"):
-            return sum([
-                subject_data["total"]
-                for subject_id, subject_data in self._read("subjects").items()
-                if subject_id != "total"
-            ])
+            return int(self._get_index()["stay_samples"].sum())
         return 0
 
+    @property
+    def sample_index(self) -> dict:
+        """
+        Get the sample index of the processed stays.
+
+        The index is maintained incrementally as subjects are recorded and persisted next to the
+        tracker storage, so that counting samples does not require walking the subjects dictionary.
+
+        Returns
+        -------
+        dict
+            Arrays aligned by stay: stay_subject_ids, stay_ids and stay_samples. Arrays aligned by
+            subject: subject_ids, subject_samples and subject_stays.
+        """
+        return {key: value.copy() for key, value in self._get_index().items()}
+
+    def subject_counts(self, subject_ids: list = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the sample counts of the processed subjects.
+
+        Parameters
+        ----------
+        subject_ids : list, optional
+            Restricts the counts to these subjects. Unprocessed subjects are omitted.
+
+        Returns
+        -------
+        tuple of np.ndarray
+            The subject IDs and their sample counts, in order of processing.
+        """
+        return self._subject_column("subject_samples", subject_ids)
+
+    def subject_stays(self, subject_ids: list = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the stay counts of the processed subjects.
+
+        Parameters
+        ----------
+        subject_ids : list, optional
+            Restricts the counts to these subjects. Unprocessed subjects are omitted.
+
+        Returns
+        -------
+        tuple of np.ndarray
+            The subject IDs and their stay counts, in order of processing.
+        """
+        return self._subject_column("subject_stays", subject_ids)
+
+    def _subject_column(self, key: str, subject_ids: list = None):
+        index = self._get_index()
+        if subject_ids is None:
+            return index["subject_ids"].copy(), index[key].copy()
+        mask = np.isin(index["subject_ids"], np.asarray(list(subject_ids)))
+        return index["subject_ids"][mask], index[key][mask]
+
+    def _index_path(self) -> Path:
+        return Path(self._path.parent, f"{self._path.name}.index.npz")
+
+    def _snapshot_stamp(self) -> np.ndarray:
+        stamp = list()
+        for suffix in [".dat", ".dir"]:
+            stat = os.stat(Path(self._path.parent, f"{self._path.name}{suffix}"))
+            stamp.extend([stat.st_size, stat.st_mtime_ns])
+        return np.array(stamp, dtype=np.int64)
+
+    def _on_reload(self):
+        # Restore the persisted index if it was written with the current snapshot
+        self._sample_index = None
+        index_path = self._index_path()
+        if not index_path.is_file():
+            return
+        try:
+            with np.load(index_path, allow_pickle=True) as persisted:
+                if not np.array_equal(persisted["stamp"], self._snapshot_stamp()):
+                    return
+                index = {key: persisted[key] for key in persisted.files if key != "stamp"}
+        except (OSError, ValueError, KeyError):
+            return
+        self._sample_index = _SampleIndex(index)
+
+    def _on_record(self, name: str, operation: str, payload: Any):
+        if name != "subjects" or self.__dict__.get("_sample_index") is None:
+            return
+        if operation == "set":
+            # The progress already contains the record
+            self._sample_index = _SampleIndex.from_subjects(self._progress.get("subjects") or dict())
+        elif operation == "update":
+            self._sample_index.update(payload)
+        elif operation == "delete":
+            self._sample_index.delete(payload)
+
+    def _on_compact(self):
+        index = self._get_index()
+        temporary_path = Path(self._path.parent, f"{self._path.name}.index.{os.getpid()}.npz")
+        np.savez(temporary_path, stamp=self._snapshot_stamp(), **index)
+        os.replace(temporary_path, self._index_path())
+
+    def _get_index(self) -> dict:
+        with self._file_lock():
+            self._sync()
+            if self.__dict__.get("_sample_index") is None:
+                self._sample_index = _SampleIndex.from_subjects(
+                    self._progress.get("subjects") or dict())
+            return self._sample_index.arrays()
+
     def reset(self):
         """
         Resets the tracker state.
@@ -310,6 +406,132 @@ class PreprocessingTracker():
         self.num_subjects = None
 
 
+class _SampleIndex:
+    """
+    Sample index of the processed stays. The arrays grow by doubling, so that recording a subject
+    costs the size of its record. Replacing the stays of a subject by a different number of stays
+    or deleting it reorganizes the arrays.
+    """
+    _SUBJECT_KEYS = ["subject_ids", "subject_samples", "subject_stays"]
+    _STAY_KEYS = ["stay_subject_ids", "stay_ids", "stay_samples"]
+
+    def __init__(self, index: dict = None):
+        if index is None:
+            index = {
+                key: np.array([], dtype=np.int64)
+                for key in self._SUBJECT_KEYS + self._STAY_KEYS
+            }
+        self._buffers = {key: np.asarray(index[key]) for key in self._SUBJECT_KEYS + self._STAY_KEYS}
+        self._n_subjects = len(self._buffers["subject_ids"])
+        self._n_stays = len(self._buffers["stay_ids"])
+        subject_stays = self._buffers["subject_stays"]
+        stay_starts = np.cumsum(subject_stays) - subject_stays
+        # Row of each subject and the row of its first stay
+        self._positions = dict(
+            zip(self._buffers["subject_ids"].tolist(), zip(range(self._n_subjects),
+                                                          stay_starts.tolist())))
+
+    @classmethod
+    def from_subjects(cls, subjects: dict) -> "_SampleIndex":
+        index = cls()
+        index.update(subjects)
+        return index
+
+    def arrays(self) -> dict:
+        """
+        Views of the index arrays, invalidated by the next modification.
+        """
+        views = {key: self._buffers[key][:self._n_subjects] for key in self._SUBJECT_KEYS}
+        views.update({key: self._buffers[key][:self._n_stays] for key in self._STAY_KEYS})
+        return views
+
+    def update(self, subjects: dict):
+        appended = dict()
+        for subject_id, (stay_ids, stay_samples) in _subject_rows(subjects).items():
+            if subject_id in self._positions:
+                self._replace(subject_id, stay_ids, stay_samples)
+            else:
+                appended[subject_id] = (stay_ids, stay_samples)
+        if appended:
+            self._append(appended)
+
+    def delete(self, subject_id):
+        if subject_id not in self._positions:
+            return
+        row, start = self._positions[subject_id]
+        stop = start + self._buffers["subject_stays"][row]
+        index = self.arrays()
+        for key in self._SUBJECT_KEYS:
+            index[key] = np.delete(index[key], row)
+        for key in self._STAY_KEYS:
+            index[key] = np.delete(index[key], np.arange(start, stop))
+        self.__init__(index)
+
+    def _replace(self, subject_id, stay_ids: np.ndarray, stay_samples: np.ndarray):
+        row, start = self._positions[subject_id]
+        n_stays = self._buffers["subject_stays"][row]
+        self._buffers["subject_samples"][row] = stay_samples.sum()
+        if n_stays == len(stay_ids):
+            self._write("stay_ids", stay_ids, start)
+            self._buffers["stay_samples"][start:start + n_stays] = stay_samples
+            return
+        self._buffers["subject_stays"][row] = len(stay_ids)
+        index = {key: value.copy() for key, value in self.arrays().items()}
+        for key, value in [("stay_subject_ids", np.repeat(index["subject_ids"][row:row + 1],
+                                                          len(stay_ids))),
+                           ("stay_ids", stay_ids), ("stay_samples", stay_samples)]:
+            index[key] = np.concatenate(
+                [index[key][:start], value, index[key][start + n_stays:]])
+        self.__init__(index)
+
+    def _append(self, rows: dict):
+        subject_ids = np.array(list(rows.keys()))
+        stay_ids = [stays for stays, _ in rows.values()]
+        stay_samples = [samples for _, samples in rows.values()]
+        subject_stays = np.array([len(stays) for stays in stay_ids], dtype=np.int64)
+        stay_starts = self._n_stays + np.cumsum(subject_stays) - subject_stays
+        self._positions.update(
+            zip(subject_ids.tolist(), zip(range(self._n_subjects, self._n_subjects + len(rows)),
+                                          stay_starts.tolist())))
+
+        for key, value in [("subject_ids", subject_ids),
+                           ("subject_samples",
+                            np.array([samples.sum() for samples in stay_samples], dtype=np.int64)),
+                           ("subject_stays", subject_stays)]:
+            self._write(key, value, self._n_subjects)
+        for key, value in [("stay_subject_ids", np.repeat(subject_ids, subject_stays)),
+                           ("stay_ids", np.concatenate(stay_ids)),
+                           ("stay_samples", np.concatenate(stay_samples))]:
+            self._write(key, value, self._n_stays)
+        self._n_subjects += len(rows)
+        self._n_stays += int(subject_stays.sum())
+
+    def _write(self, key: str, value: np.ndarray, start: int):
+        buffer = self._buffers[key]
+        stop = start + len(value)
+        size = self._n_subjects if key in self._SUBJECT_KEYS else self._n_stays
+        dtype = np.promote_types(buffer.dtype, value.dtype) if size else value.dtype
+        if stop > len(buffer) or dtype != buffer.dtype:
+            grown = np.empty(max(stop, 2 * len(buffer)), dtype=dtype)
+            grown[:size] = buffer[:size]
+            self._buffers[key] = buffer = grown
+        buffer[start:stop] = value
+
+
+def _subject_rows(subjects: dict) -> dict:
+    rows = dict()
+    for subject_id, subject_data in subjects.items():
+        if subject_id == "total" or not isinstance(subject_data, dict):
+            continue
+        stays = [(stay_id, n_samples)
+                 for stay_id, n_samples in subject_data.items()
+                 if stay_id != "total"]
+        rows[subject_id] = (np.array([stay_id for stay_id, _ in stays],
+                                     dtype=None if stays else np.int64),
+                            np.array([n_samples for _, n_samples in stays], dtype=np.int64))
+    return rows
+
+
 @storable
 class DataSplitTracker():
     """
@@ -5,7 +5,8 @@ Dataset Writers
 This module provides classes and methods for writing dataset files, and creating the subject 
 directories named with the respecitve subject ID. The main class `DataSetWriter`
 is used to write the subject data either as .npy, .csv, or .hdf5 files. 
-and ICU history.
+and ICU history. The `SampleStoreWriter` appends flat samples, such as the engineered features,
+to a columnar store that can be memory-mapped by the `SampleStoreReader`.
 
 
 
@@ -13,8 +14,10 @@ References
 ----------
 - YerevaNN/mimic3-benchmarks: https://github.com/YerevaNN/mimic3-benchmarks
 """
+import os
 import warnings
 import shutil
+import json
 import pandas as pd
 import numpy as np
 from pathos.helpers import mp
@@ -24,7 +27,7 @@ from utils.types import NoopLock
 from utils.IO import *
 from functools import reduce
 
-__all__ = ["DataSetWriter"]
+__all__ = ["DataSetWriter", "SampleStoreWriter", "SAMPLE_STORE_COLUMNS"]
 
 
 class DataSetWriter():
@@ -246,3 +249,176 @@ class DataSetWriter():
             write_csv(subject_data, subject_event_path, lock)
 
         return
+
+
+# Column file name, dtype
+SAMPLE_STORE_COLUMNS = {
+    "X": np.float32,
+    "y": np.float32,
+    "t": np.float64,
+    "subject_ids": np.int64,
+    "stay_ids": np.int64
+}
+
+
+class SampleStoreWriter():
+    """
+    A writer for the columnar sample store, appending flat samples in large blocks.
+
+    The store consists of one raw binary file per column: the float32 feature matrix X, the
+    float32 target matrix y, the float64 timestamps and the int64 subject and stay IDs. Each call
+    to `write` appends all passed samples as a single block per file. The number of committed
+    rows is recorded in the header once all columns are written, so that the rows of an
+    interrupted append are ignored by readers and overwritten by the next append. Subjects
+    already in the store are not written again.
+
+    Parameters
+    ----------
+    root_path : Path
+        The directory of the sample store.
+
+    Examples
+    --------
+    >>> writer = SampleStoreWriter(Path("/path/to/engineered/data", "sample_store"))
+    >>> writer.write(X={10006: {244351: X_stay}}, y={10006: {244351: y_stay}},
+    ...              t={10006: {244351: t_stay}}, lock=lock)
+    """
+
+    COLUMNS = SAMPLE_STORE_COLUMNS
+
+    def __init__(self, root_path: Path) -> None:
+        self.root_path = Path(root_path)
+        # Subjects of the committed rows read so far
+        self._stored_subjects = set()
+        self._read_rows = 0
+
+    def write(self,
+              X: dict,
+              y: dict,
+              t: dict,
+              subject_ids: list = None,
+              lock: mp.Lock = NoopLock()) -> int:
+        """
+        Append the samples of the specified subjects to the store.
+
+        Parameters
+        ----------
+        X : dict
+            Features by subject and stay ID, each of shape (n_samples, n_features).
+        y : dict
+            Targets by subject and stay ID, each with n_samples rows.
+        t : dict
+            Timestamps by subject and stay ID, each of length n_samples.
+        subject_ids : list, optional
+            Subjects to write. If None, all subjects in X are written. Default is None.
+        lock : mp.Lock, optional
+            A lock object to synchronize writing between processes. Default is NoopLock.
+
+        Returns
+        -------
+        int
+            The number of samples written.
+        """
+        if subject_ids is None:
+            subject_ids = list(X.keys())
+
+        subject_blocks = dict()
+        for subject_id in subject_ids:
+            if subject_id not in X:
+                continue
+            blocks = {column: list() for column in self.COLUMNS}
+            for stay_id, X_stay in X[subject_id].items():
+                X_stay = np.asarray(X_stay, dtype=np.float32)
+                X_stay = X_stay.reshape(len(X_stay), -1)
+                n_samples = len(X_stay)
+                if not n_samples:
+                    continue
+                blocks["X"].append(X_stay)
+                blocks["y"].append(np.asarray(y[subject_id][stay_id]).reshape(n_samples, -1))
+                blocks["t"].append(np.asarray(t[subject_id][stay_id]).reshape(n_samples))
+                blocks["subject_ids"].append(np.full(n_samples, subject_id))
+                blocks["stay_ids"].append(np.full(n_samples, stay_id))
+            if blocks["X"]:
+                subject_blocks[subject_id] = blocks
+
+        if not subject_blocks:
+            return 0
+
+        with lock:
+            header = self._read_header()
+            # Rows after the committed ones are left over from an interrupted append
+            n_committed = header["n_samples"] if header else 0
+            self._update_stored_subjects(n_committed)
+            blocks = {column: list() for column in self.COLUMNS}
+            for subject_id, subject_block in subject_blocks.items():
+                # Rerunning after an interruption must not duplicate subjects
+                if subject_id in self._stored_subjects:
+                    continue
+                for column in self.COLUMNS:
+                    blocks[column].extend(subject_block[column])
+            if not blocks["X"]:
+                return 0
+            blocks = {
+                column: np.ascontiguousarray(np.concatenate(arrays), dtype=self.COLUMNS[column])
+                for column, arrays in blocks.items()
+            }
+            header = self._check_header(header,
+                                        n_features=blocks["X"].shape[1],
+                                        n_targets=blocks["y"].shape[1])
+            self.root_path.mkdir(parents=True, exist_ok=True)
+            for column in self.COLUMNS:
+                path = Path(self.root_path, f"{column}.bin")
+                with open(path, "ab") as file:
+                    # Drop the rows of an interrupted append
+                    file.truncate(n_committed * blocks[column][:1].nbytes)
+                    file.write(blocks[column].tobytes())
+            header["n_samples"] = n_committed + len(blocks["X"])
+            self._write_header(header)
+            self._update_stored_subjects(header["n_samples"])
+        return len(blocks["X"])
+
+    def _read_header(self) -> dict:
+        header_path = Path(self.root_path, "header.json")
+        if not header_path.is_file():
+            return dict()
+        with open(header_path) as file:
+            return json.load(file)
+
+    def _write_header(self, header: dict):
+        # Replaced atomically, so that the committed row count is never torn
+        header_path = Path(self.root_path, "header.json")
+        temp_path = header_path.with_suffix(".tmp")
+        with open(temp_path, "w") as file:
+            json.dump(header, file)
+        os.replace(temp_path, header_path)
+
+    def _update_stored_subjects(self, n_committed: int):
+        """
+        Reads the subject IDs of the rows committed since the last call.
+        """
+        if n_committed < self._read_rows:
+            # The store was recreated
+            self._stored_subjects.clear()
+            self._read_rows = 0
+        if n_committed == self._read_rows:
+            return
+        itemsize = np.dtype(self.COLUMNS["subject_ids"]).itemsize
+        subject_ids = np.fromfile(Path(self.root_path, "subject_ids.bin"),
+                                  dtype=self.COLUMNS["subject_ids"],
+                                  count=n_committed - self._read_rows,
+                                  offset=self._read_rows * itemsize)
+        self._stored_subjects.update(np.unique(subject_ids).tolist())
+        self._read_rows = n_committed
+
+    def _check_header(self, header: dict, n_features: int, n_targets: int) -> dict:
+        """
+        Create the store header or check that the block shapes match it.
+        """
+        shapes = {"n_features": n_features, "n_targets": n_targets}
+        if header:
+            stored_shapes = {key: header[key] for key in shapes}
+            if stored_shapes != shapes:
+                raise ValueError(f"Sample block with {n_features} features and {n_targets} targets "
+                                 f"does not match store header {stored_shapes}.")
+            return header
+        return dict(shapes, n_samples=0)
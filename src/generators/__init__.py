@@ -2,12 +2,16 @@ import numpy as np
 import pandas as pd
 import random
 import ray
+import atexit
+import queue
 import logging
+import threading
+import weakref
 
 from copy import deepcopy
 from pathlib import Path
 from utils.IO import *
-from typing import List, Tuple, Union
+from typing import Callable, List, Tuple, Union
 from utils.timeseries import read_timeseries, subjects_for_samples
 from metrics import CustomBins, LogBins
 from preprocessing.scalers import AbstractScaler
@@ -29,7 +33,9 @@ class AbstractGenerator:
                  bining: str = "none",
                  one_hot: bool = False,
                  deep_supervision: bool = False,
-                 target_replication: bool = False):
+                 target_replication: bool = False,
+                 prefetch: int = 0,
+                 bucket_boundaries: List[int] = None):
         self._batch_size = batch_size
         self._shuffle = shuffle
         self._target_replication = target_replication
@@ -37,6 +43,7 @@ class AbstractGenerator:
         self._columns = None
         self._one_hot = one_hot
         self._deep_supervision = deep_supervision
+        self._bucket_boundaries = sorted(bucket_boundaries) if bucket_boundaries else None
         self._tracker = PreprocessingTracker(storage_path=Path(reader.root_path, "progress"))
         self._subject_ids = reader.subject_ids
         self._scaler = scaler
@@ -78,20 +85,36 @@ class AbstractGenerator:
         self._remainder_X = np.array([])
         self._remainder_y = np.array([])
         self._remainder_M = np.array([])
+        self._remainder_lengths = np.array([], dtype=np.int64)
         self._generator = self.__generator()
+        # Whether batches are returned with the sequence lengths of their samples
+        self._return_lengths = False
+
+        # Ray workers already run ahead of the consumer
+        self._prefetch = 0 if self._cpu_count else prefetch
+        self._prefetcher = None
 
     def __getitem__(self, index=None):
+        if self._prefetch:
+            if self._prefetcher is None:
+                self._prefetcher = _BatchPrefetcher(self._next_batch, self._prefetch)
+            return self._prefetcher.get()
+        return self._next_batch()
+
+    def _next_batch(self):
         if not self._ray_workers and self._cpu_count:
             self._create_workers()
             self._start_epoch()
 
         # Start with any remainder from the previous batch
-        X, y, M = next(self._generator)  # if not deepsupervsion m is timestamps else mask
+        X, y, M, lengths = next(self._generator)  # if not deepsupervsion m is timestamps else mask
         # Fetch new data until we have at least the required batch size
         while X.shape[0] < self._batch_size:
             X_res = self._remainder_X
             y_res = self._remainder_y
+            lengths_res = self._remainder_lengths
             X = self._stack_batches((X, X_res)) if X_res.size else X
+            lengths = np.concatenate((lengths, lengths_res)) if lengths_res.size else lengths
             if self._deep_supervision or self._target_replication:
                 if self._deep_supervision:
                     m_res = self._remainder_M
@@ -102,14 +125,17 @@ class AbstractGenerator:
             if X.shape[0] < self._batch_size:
                 self._remainder_X, \
                 self._remainder_y, \
-                self._remainder_M = next(self._generator)
+                self._remainder_M, \
+                self._remainder_lengths = next(self._generator)
 
             # If the accumulated batch is larger than required, split it
             if X.shape[0] > self._batch_size:
                 self._remainder_X = X[self._batch_size:, :, :]
                 self._remainder_y = y[self._batch_size:]
+                self._remainder_lengths = lengths[self._batch_size:]
                 X = X[:self._batch_size]
                 y = y[:self._batch_size]
+                lengths = lengths[:self._batch_size]
                 if self._deep_supervision:
                     self._remainder_M = M[self._batch_size:]
                     M = M[:self._batch_size]
@@ -124,7 +150,10 @@ class AbstractGenerator:
             self._remainder_X = np.array([])
             self._remainder_y = np.array([])
             self._remainder_M = np.array([])
+            self._remainder_lengths = np.array([], dtype=np.int64)
 
+        if self._return_lengths:
+            return (X, y, M, lengths) if self._deep_supervision else (X, y, lengths)
         if self._deep_supervision:
             return X, y, M
         return X, y
@@ -132,26 +161,41 @@ class AbstractGenerator:
     def _count_batches(self, subject_ids):
         if subject_ids is None:
             subject_ids = self._reader.subject_ids
-        # Call this only
         if self._deep_supervision:
-            return max(sum([len(self._tracker.subjects[subject_id]) - 1 \
-                       for subject_id in subject_ids \
-                       if subject_id in self._tracker.subjects]) \
-                       // self._batch_size, 1)
-        return sum([
-            self._tracker.subjects[subject_id]["total"]
-            for subject_id in subject_ids
-            if subject_id in self._tracker.subjects
-        ]) // self._batch_size
+            # Each stay is a single sample with deep supervision
+            _, counts = self._tracker.subject_stays(subject_ids)
+            return max(int(counts.sum()) // self._batch_size, 1)
+        _, counts = self._tracker.subject_counts(subject_ids)
+        return int(counts.sum()) // self._batch_size
 
     def __len__(self):
         'Denotes the number of batches per epoch'
         return self._steps
 
-    def __del__(self):
-        if hasattr(self, '_cpu_count') and self._cpu_count:
+    def close(self):
+        """
+        Stops the prefetching thread and the ray workers of the generator, if any.
+        """
+        if getattr(self, '_prefetcher', None) is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+        if getattr(self, '_cpu_count', 0) and self._ray_workers:
             self._close()
 
+    def __del__(self):
+        self.close()
+
+    def __getstate__(self):
+        # Live generators and threads can't be pickled, e.g. for spawned DataLoader workers
+        state = self.__dict__.copy()
+        state.pop("_generator", None)
+        state["_prefetcher"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._generator = self.__generator()
+
     def _create_workers(self):
         '''
         try:
@@ -171,8 +215,14 @@ class AbstractGenerator:
             print(e)
         '''
         self._ray_workers: List[RayWorker] = [
-            RayWorker.remote(self._reader, self._scaler, self._row_only, self._bining,
-                             self._columns, self._one_hot, self._target_replication)
+            RayWorker.remote(self._reader,
+                             self._scaler,
+                             self._row_only,
+                             self._bining,
+                             self._columns,
+                             self._one_hot,
+                             self._target_replication,
+                             bucket_boundaries=self._bucket_boundaries)
             for _ in range(self._cpu_count)
         ]
 
@@ -198,31 +248,34 @@ class AbstractGenerator:
                 ready_ids, _ = ray.wait(self.__results, num_returns=1)
                 dynamci_result = ray.get(ready_ids[0])
                 for object_result in dynamci_result:
-                    X, y, t = ray.get(object_result)
-                    yield X, y, t
+                    X, y, t, lengths = ray.get(object_result)
+                    yield X, y, t, lengths
             else:
                 random.shuffle(self._random_ids)
                 if self._deep_supervision:
-                    for X, y, M in process_subject_deep_supervision(args=(self._random_ids,
-                                                                          self._batch_size),
-                                                                    reader=self._reader,
-                                                                    scaler=self._scaler,
-                                                                    bining=self._bining,
-                                                                    one_hot=self._one_hot):
-                        yield X, y, M
+                    for X, y, M, lengths in process_subject_deep_supervision(
+                            args=(self._random_ids, self._batch_size),
+                            reader=self._reader,
+                            scaler=self._scaler,
+                            bining=self._bining,
+                            one_hot=self._one_hot):
+                        yield X, y, M, lengths
                     # TODO! added because remainders seem to destabilize training
                     self._remainder_M = np.array([])
                     self._remainder_X = np.array([])
                     self._remainder_y = np.array([])
+                    self._remainder_lengths = np.array([], dtype=np.int64)
                 else:
-                    for X, y, t in process_subject(args=(self._random_ids, self._batch_size),
-                                                   reader=self._reader,
-                                                   scaler=self._scaler,
-                                                   row_only=self._row_only,
-                                                   bining=self._bining,
-                                                   one_hot=self._one_hot,
-                                                   target_replication=self._target_replication):
-                        yield X, y, t
+                    for X, y, t, lengths in process_subject(
+                            args=(self._random_ids, self._batch_size),
+                            reader=self._reader,
+                            scaler=self._scaler,
+                            row_only=self._row_only,
+                            bining=self._bining,
+                            one_hot=self._one_hot,
+                            target_replication=self._target_replication,
+                            bucket_boundaries=self._bucket_boundaries):
+                        yield X, y, t, lengths
 
     @staticmethod
     def split_ids(input_list, cpu_count):
@@ -251,15 +304,87 @@ class AbstractGenerator:
 
     @staticmethod
     def _stack_batches(data):
+        # Write the batches into a single zero padded array instead of padding each first
         max_len = max([x.shape[1] for x in data])
         dtype = get_iterable_dtype(data)
-        data = [
-            np.concatenate(
-                [x, np.zeros([x.shape[0], max_len - x.shape[1], x.shape[2]]).astype(dtype)],
-                axis=1,
-                dtype=dtype) if max_len - x.shape[1] else x for x in data
-        ]
-        return np.concatenate(data, axis=0, dtype=dtype)
+        stacked = np.zeros((sum([x.shape[0] for x in data]), max_len) + data[0].shape[2:],
+                           dtype=dtype)
+        start = 0
+        for x in data:
+            stacked[start:start + x.shape[0], :x.shape[1]] = x
+            start += x.shape[0]
+        return stacked
+
+
+class _BatchPrefetcher:
+    """
+    Assembles batches in a background thread and keeps up to size of them ready in a queue.
+
+    Parameters
+    ----------
+    next_batch : Callable
+        Bound method returning the next batch. Only weakly referenced, so that the generator
+        can still be garbage collected.
+    size : int
+        Number of batches kept ready.
+    """
+
+    def __init__(self, next_batch: Callable, size: int):
+        self._queue = queue.Queue(maxsize=max(size, 1))
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._produce,
+                                        args=(weakref.WeakMethod(next_batch),),
+                                        daemon=True)
+        self._thread.start()
+        _PREFETCHERS.add(self)
+
+    def _produce(self, next_batch: weakref.WeakMethod):
+        while not self._stop.is_set():
+            method = next_batch()
+            if method is None:
+                return
+            try:
+                item = (method(), None)
+            except Exception as error:
+                item = (None, error)
+            del method
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if item[1] is not None:
+                return
+
+    def get(self):
+        """
+        Returns the next ready batch, raising the exception of the producer if it failed.
+        """
+        # The producer stops on failure, so the error is raised on every later call
+        if self._error is not None:
+            raise self._error
+        batch, error = self._queue.get()
+        if error is not None:
+            self._error = error
+            raise error
+        return batch
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+
+# Producers still reading at interpreter shutdown crash the HDF5 library
+_PREFETCHERS = weakref.WeakSet()
+
+
+@atexit.register
+def _close_prefetchers():
+    for prefetcher in list(_PREFETCHERS):
+        prefetcher.close()
 
 
 # TODO! these worker functions must go somewhere else
@@ -276,7 +401,8 @@ class RayWorker:
                  columns: list,
                  one_hot: bool,
                  target_replication: bool = False,
-                 buffer: int = 2):
+                 buffer: int = 2,
+                 bucket_boundaries: List[int] = None):
         self._reader = reader
         self._scaler = scaler
         self._row_only = row_only
@@ -285,6 +411,7 @@ class RayWorker:
         self._one_hot = one_hot
         self._target_replication = target_replication
         self._buffer = buffer
+        self._bucket_boundaries = bucket_boundaries
 
     def process_subject_deep_supervision(self, args):
         return process_subject_deep_supervision(args,
@@ -301,7 +428,8 @@ class RayWorker:
                                bining=self._bining,
                                one_hot=self._one_hot,
                                target_replication=self._target_replication,
-                               buffer_size=self._buffer)
+                               buffer_size=self._buffer,
+                               bucket_boundaries=self._bucket_boundaries)
 
     def exit(self):
         ray.actor.exit_actor()
@@ -319,51 +447,59 @@ def process_subject_deep_supervision(args, reader: ProcessedSetReader, scaler: A
     # try:
     X_batch, y_batch, m_batch, t_batch = list(), list(), list(), list()
     for subject_id in subject_ids:
-        X_subject, y_subject, M_subject = reader.read_sample(subject_id,
-                                                             read_masks=True,
-                                                             read_ids=True).values()
-        for stay_id in X_subject.keys():
-            X_stay = X_subject[stay_id]
-            X_stay[X_stay.columns] = scaler.transform(X_stay)
+        for X_stay, y_stay, m_stay in subject_buffer_deep_supervision(subject_id=subject_id,
+                                                                      reader=reader,
+                                                                      scaler=scaler,
+                                                                      bining=bining,
+                                                                      one_hot=one_hot):
             X_batch.append(X_stay)
-            y_stay = y_subject[stay_id]
-            if bining == 'log':
-                y_stay = LogBins.get_bin_log(y_stay, one_hot=one_hot)
-            elif bining == 'custom':
-                y_stay = CustomBins.get_bin_custom(y_stay, one_hot=one_hot)
             y_batch.append(y_stay)
-            m_batch.append(M_subject[stay_id])
+            m_batch.append(m_stay)
             if len(X_batch) == batch_size:
                 # Shuffle the inside of the batch again
-                X_batch, y_batch, m_batch = shuffled_data(X_batch, y_batch, m_batch)
-                X = zeropad_samples(X_batch)
-                y = zeropad_samples(y_batch)
-                m = zeropad_samples(m_batch)
-                y = np.array(y)
-                m = np.array(m)
+                order = shuffled_order(len(X_batch))
+                X = zeropad_samples(X_batch, order=order)
+                y = zeropad_samples(y_batch, order=order)
+                m = zeropad_samples(m_batch, order=order)
+                lengths = sample_lengths(X_batch, order)
                 X_batch.clear()
                 y_batch.clear()
                 m_batch.clear()
-                yield X, y, m
+                yield X, y, m, lengths
     if X_batch:
         # Shuffle the inside of the batch again
-        X_batch, y_batch, m_batch = shuffled_data(X_batch, y_batch, m_batch)
-        X = zeropad_samples(X_batch)
-        y = zeropad_samples(y_batch)
-        m = zeropad_samples(m_batch)
-        y = np.array(y)
-        m = np.array(m)
+        order = shuffled_order(len(X_batch))
+        X = zeropad_samples(X_batch, order=order)
+        y = zeropad_samples(y_batch, order=order)
+        m = zeropad_samples(m_batch, order=order)
+        lengths = sample_lengths(X_batch, order)
         X_batch.clear()
         y_batch.clear()
         m_batch.clear()
         t_batch.clear()
-        yield X, y, m
+        yield X, y, m, lengths
     # finally:
     # Restore the previous logging level
     logging.getLogger().setLevel(previous_logging_level)
     return
 
 
+def subject_buffer_deep_supervision(subject_id: int, reader: ProcessedSetReader,
+                                    scaler: AbstractScaler, bining: str, one_hot: bool):
+    X_subject, y_subject, M_subject = reader.read_sample(subject_id, read_masks=True,
+                                                         read_ids=True).values()
+    for stay_id in X_subject.keys():
+        X_stay = X_subject[stay_id]
+        X_stay[X_stay.columns] = scaler.transform(X_stay)
+        y_stay = y_subject[stay_id]
+        if bining == 'log':
+            y_stay = LogBins.get_bins_log(y_stay.values.squeeze(), one_hot=one_hot)
+        elif bining == 'custom':
+            y_stay = CustomBins.get_bins_custom(y_stay.values.squeeze(), one_hot=one_hot)
+        yield X_stay, y_stay, M_subject[stay_id]
+    return
+
+
 def subject_buffer(subject_id: int, reader: ProcessedSetReader, scaler: AbstractScaler,
                    row_only: bool, bining: str):
     X_subject, y_subject = reader.read_sample(subject_id, read_ids=True).values()
@@ -385,7 +521,8 @@ def process_subject(args: Tuple[List[int], int],
                     bining: str,
                     target_replication: bool,
                     one_hot: bool,
-                    buffer_size: int = 8):
+                    buffer_size: int = 8,
+                    bucket_boundaries: List[int] = None):
     subject_ids, batch_size = args
     subject_ids = deepcopy(subject_ids)
     # Store the current logging level
@@ -394,7 +531,9 @@ def process_subject(args: Tuple[List[int], int],
     # Set logging level to CRITICAL to suppress logging
     logging.getLogger().setLevel(logging.CRITICAL)
     # try:
-    X_batch, y_batch, t_batch = list(), list(), list()
+    # Samples are batched with samples of similar length, one bucket per length interval
+    buckets = [(list(), list(), list())
+               for _ in range(len(bucket_boundaries) + 1 if bucket_boundaries else 1)]
     subject_generators = list()
 
     def sample_generator_index(n_samples):
@@ -405,7 +544,7 @@ def process_subject(args: Tuple[List[int], int],
         return np.random.choice(avail_gen_indices, n_samples, replace=True).tolist()
 
     while subject_ids or subject_generators:
-        indices = sample_generator_index(batch_size - len(X_batch))
+        indices = sample_generator_index(batch_size - max([len(bucket[0]) for bucket in buckets]))
         while indices:
             idx = indices.pop()
             try:
@@ -443,47 +582,56 @@ def process_subject(args: Tuple[List[int], int],
                 # .astype(np.int64 if isinstance(y_sample, int) else np.float32)
             else:
                 y_sample = np.atleast_2d(y_sample)
+            X_batch, y_batch, t_batch = buckets[np.searchsorted(
+                bucket_boundaries, X_sample.shape[0], side="right") if bucket_boundaries else 0]
             X_batch.append(X_sample)
             y_batch.append(y_sample)
             t_batch.append(t_sample)
 
-        if len(X_batch) == batch_size:
-            # Shuffle the inside of the batch again
-            X_batch, y_batch, t_batch = shuffled_data(X_batch, y_batch, t_batch)
-            X = zeropad_samples(X_batch)
-            if target_replication:
-                y = zeropad_samples(y_batch)
-            else:
-                y = np.array(y_batch)
-            t = np.array(t_batch)
-            X_batch.clear()
-            y_batch.clear()
-            t_batch.clear()
-            yield X, y, t
-
-    if X_batch:
-        # Shuffle the inside of the batch again
-        X_batch, y_batch, t_batch = shuffled_data(X_batch, y_batch, t_batch)
-        X = zeropad_samples(X_batch)
-        if target_replication:
-            y = zeropad_samples(y_batch)
-        else:
-            y = np.array(y_batch)
-        t = np.array(t_batch)
-        X_batch.clear()
-        y_batch.clear()
-        t_batch.clear()
-        yield X, y, t
+        for X_batch, y_batch, t_batch in buckets:
+            if len(X_batch) == batch_size:
+                yield _collate_samples(X_batch, y_batch, t_batch, target_replication)
+
+    # Leftovers of the buckets are batched together, sorted by length
+    X_batch, y_batch, t_batch = [sum(samples, []) for samples in zip(*buckets)]
+    if bucket_boundaries:
+        order = np.argsort([X.shape[0] for X in X_batch], kind="stable")
+        X_batch, y_batch, t_batch = [[samples[index] for index in order]
+                                     for samples in (X_batch, y_batch, t_batch)]
+    for start in range(0, len(X_batch), batch_size):
+        yield _collate_samples(X_batch[start:start + batch_size], y_batch[start:start + batch_size],
+                               t_batch[start:start + batch_size], target_replication)
     #finally:
     # Restore the previous logging level
     logging.getLogger().setLevel(previous_logging_level)
     return
 
 
-def shuffled_data(Xs, ys, ts):
-    indices = list(range(len(Xs)))
+def _collate_samples(X_batch: list, y_batch: list, t_batch: list, target_replication: bool):
+    # Shuffle the inside of the batch again
+    order = shuffled_order(len(X_batch))
+    X = zeropad_samples(X_batch, order=order)
+    if target_replication:
+        y = zeropad_samples(y_batch, order=order)
+    else:
+        y = np.array([y_batch[index] for index in order])
+    t = np.array([t_batch[index] for index in order])
+    lengths = sample_lengths(X_batch, order)
+    X_batch.clear()
+    y_batch.clear()
+    t_batch.clear()
+    return X, y, t, lengths
+
+
+def shuffled_order(length: int):
+    indices = list(range(length))
     random.shuffle(indices)
-    Xs = [Xs[i] for i in indices]
-    ys = [ys[i] for i in indices]
-    ts = [ts[i] for i in indices]
-    return Xs, ys, ts
+    return indices
+
+
+def sample_lengths(X_batch: list, order: list) -> np.ndarray:
+    """
+    Returns the number of time steps of each sample before zero padding, in the order of the
+    padded batch, so that a real all zero time step is not mistaken for padding.
+    """
+    return np.array([X_batch[index].shape[0] for index in order], dtype=np.int64)
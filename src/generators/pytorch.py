@@ -3,8 +3,9 @@ from numpy import atleast_3d
 from torch.utils.data.dataloader import _BaseDataLoaderIter
 from preprocessing.scalers import AbstractScaler
 from datasets.readers import ProcessedSetReader
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
 from utils.IO import *
+from typing import List
 from torch.utils.data import DataLoader
 from . import AbstractGenerator
 
@@ -14,6 +15,7 @@ class TorchGenerator(DataLoader):
     def __init__(self,
                  reader: ProcessedSetReader,
                  scaler: AbstractScaler = None,
+                 batch_size: int = 1,
                  shuffle: bool = True,
                  n_samples: int = None,
                  num_cpus: int = 0,
@@ -21,42 +23,87 @@ class TorchGenerator(DataLoader):
                  deep_supervision: bool = False,
                  drop_last: bool = False,
                  one_hot: bool = False,
-                 bining: str = "none"):
-        self._dataset = TorchDataset(reader=reader,
-                                     scaler=scaler,
-                                     num_cpus=num_cpus,
-                                     n_samples=n_samples,
-                                     batch_size=1,
-                                     deep_supervision=deep_supervision,
-                                     target_replication=target_replication,
-                                     shuffle=shuffle,
-                                     one_hot=one_hot,
-                                     bining=bining)
+                 bining: str = "none",
+                 prefetch: int = 0,
+                 bucket_boundaries: List[int] = None,
+                 pin_memory: bool = False,
+                 num_workers: int = 0,
+                 persistent_workers: bool = False,
+                 multiprocessing_context: str = None):
+        if num_workers and num_cpus:
+            raise ValueError("Loading with DataLoader workers and ray workers is exclusive. "
+                             f"num_workers is: {num_workers}, num_cpus is: {num_cpus}")
+        dataset_kwargs = dict(reader=reader,
+                              scaler=scaler,
+                              n_samples=n_samples,
+                              batch_size=batch_size,
+                              deep_supervision=deep_supervision,
+                              target_replication=target_replication,
+                              shuffle=shuffle,
+                              one_hot=one_hot,
+                              bining=bining,
+                              bucket_boundaries=bucket_boundaries)
+        if num_workers:
+            # Each worker assembles the batches of its own shard of the subjects
+            self._dataset = TorchIterableDataset(**dataset_kwargs)
+            if num_workers > self._dataset.num_subjects:
+                raise ValueError(f"Cannot shard {self._dataset.num_subjects} subjects across "
+                                 f"{num_workers} workers.")
+            self._dataset.split_shards(num_workers)
+            loader_kwargs = dict(worker_init_fn=shard_worker,
+                                 persistent_workers=persistent_workers,
+                                 multiprocessing_context=multiprocessing_context)
+            if prefetch:
+                loader_kwargs["prefetch_factor"] = prefetch
+        else:
+            self._dataset = TorchDataset(num_cpus=num_cpus, prefetch=prefetch, **dataset_kwargs)
+            loader_kwargs = dict(persistent_workers=persistent_workers)
         super().__init__(dataset=self._dataset,
                          batch_size=1,
-                         shuffle=shuffle,
+                         shuffle=shuffle and not num_workers,
                          drop_last=drop_last,
-                         num_workers=0,
-                         collate_fn=self.collate_fn)
+                         num_workers=num_workers,
+                         collate_fn=self.collate_fn,
+                         pin_memory=pin_memory,
+                         **loader_kwargs)
         self._deep_supervision = deep_supervision
+        self._yields_lengths = batch_size > 1
+
+    @property
+    def yields_lengths(self) -> bool:
+        """
+        Whether the generator yields zero padded batches of several samples together with their
+        sequence lengths, as ([X, lengths], y) or ([X, M, lengths], y) with deep supervision,
+        instead of single samples.
+        """
+        return self._yields_lengths
 
     def collate_fn(self, batch):
         if self._deep_supervision:
-            samples, labels, masks = zip(*batch)
+            samples, labels, masks, lengths = zip(*batch)
             masks = masks[0]
             if masks.dim() == 1:
                 masks = masks.unsqueeze(1)
         else:
-            samples, labels = zip(*batch)
-        samples, labels = samples[0], labels[0]
+            samples, labels, lengths = zip(*batch)
+        samples, labels, lengths = samples[0], labels[0], lengths[0]
         if labels.dim() == 1:
             labels = labels.unsqueeze(1)
+        if self._deep_supervision and self._yields_lengths:
+            return [samples, masks, lengths], labels
         if self._deep_supervision:
             return [samples, masks], labels
+        if self._yields_lengths:
+            return [samples, lengths], labels
         return samples, labels
 
     def close(self):
-        self._dataset.__del__()
+        # Persistent workers are otherwise only stopped once the loader is garbage collected
+        if getattr(self, "_iterator", None) is not None and hasattr(self._iterator,
+                                                                    "_shutdown_workers"):
+            self._iterator._shutdown_workers()
+            self._iterator = None
+        self._dataset.close()
 
 
 class TorchDataset(AbstractGenerator, Dataset):
@@ -71,7 +118,9 @@ class TorchDataset(AbstractGenerator, Dataset):
                  target_replication: bool = False,
                  shuffle: bool = True,
                  one_hot: bool = False,
-                 bining: str = "none"):
+                 bining: str = "none",
+                 prefetch: int = 0,
+                 bucket_boundaries: List[int] = None):
         AbstractGenerator.__init__(self,
                                    reader=reader,
                                    scaler=scaler,
@@ -82,15 +131,19 @@ class TorchDataset(AbstractGenerator, Dataset):
                                    target_replication=target_replication,
                                    shuffle=shuffle,
                                    one_hot=one_hot,
-                                   bining=bining)
+                                   bining=bining,
+                                   prefetch=prefetch,
+                                   bucket_boundaries=bucket_boundaries)
+        # Sequence lengths of the samples before zero padding, for packing
+        self._return_lengths = True
 
     def __getitem__(self, index=None):
         if self._deep_supervision:
-            X, y, m = super().__getitem__(index)
+            X, y, m, lengths = super().__getitem__(index)
             if not m.flags.writeable:
                 m = m.copy()
         else:
-            X, y = super().__getitem__(index)
+            X, y, lengths = super().__getitem__(index)
         if not X.flags.writeable:
             X = X.copy()
         if not y.flags.writeable:
@@ -99,8 +152,76 @@ class TorchDataset(AbstractGenerator, Dataset):
         if self._deep_supervision:
             return torch.from_numpy(X).to(torch.float32), \
                    torch.from_numpy(y), \
-                   torch.from_numpy(m)
-        return torch.from_numpy(X).to(torch.float32), torch.from_numpy(y)
+                   torch.from_numpy(m), \
+                   torch.from_numpy(lengths)
+        return torch.from_numpy(X).to(torch.float32), torch.from_numpy(y), torch.from_numpy(lengths)
+
+
+class TorchIterableDataset(TorchDataset, IterableDataset):
+    """
+    Iterable view of a TorchDataset for multi-process DataLoaders. Each worker is assigned a shard
+    of the subjects by shard_worker and yields the batches of its shard in an epoch, so that all
+    workers together yield len(dataset) batches once the dataset is split with split_shards. With
+    persistent workers, the remainders of a shard carry over to the next epoch like for a
+    TorchDataset.
+    """
+
+    def __init__(self, *args, **kwargs):
+        TorchDataset.__init__(self, *args, num_cpus=0, prefetch=0, **kwargs)
+        self._shard_steps = self._steps
+
+    @property
+    def num_subjects(self) -> int:
+        """
+        Number of subjects to be sharded across the workers.
+        """
+        return len(self._random_ids)
+
+    def _shard_ids(self, worker_id: int, num_workers: int) -> list:
+        return self.split_ids(sorted(self._random_ids), num_workers)[worker_id]
+
+    def split_shards(self, num_workers: int):
+        """
+        Sets the length of the dataset to the total number of batches of its shards, which is
+        smaller than the unsharded count when the samples of a shard don't fill its last batch.
+
+        Parameters
+        ----------
+        num_workers : int
+            The total number of workers.
+        """
+        self._steps = sum([
+            self._count_batches(self._shard_ids(worker_id, num_workers))
+            for worker_id in range(num_workers)
+        ])
+        self._shard_steps = self._steps
+
+    def shard(self, worker_id: int, num_workers: int):
+        """
+        Restricts the dataset to the subjects and batches of a worker.
+
+        Parameters
+        ----------
+        worker_id : int
+            The id of the worker, between 0 and num_workers - 1.
+        num_workers : int
+            The total number of workers.
+        """
+        self._random_ids = self._shard_ids(worker_id, num_workers)
+        # Counted from the samples of the shard, since they need not be evenly split
+        self._shard_steps = self._count_batches(self._random_ids)
+        # Counts towards the end of epoch reset of the remainders
+        self._steps = self._shard_steps
+
+    def __iter__(self):
+        for _ in range(self._shard_steps):
+            yield self[None]
+
+
+def shard_worker(worker_id: int):
+    """
+    DataLoader worker_init_fn assigning each worker its shard of a TorchIterableDataset.
+    """
+    worker_info = get_worker_info()
+    worker_info.dataset.shard(worker_id, worker_info.num_workers)
 
-    def close(self):
-        AbstractGenerator.__del__(self)
@@ -1,7 +1,8 @@
 import torch
 import pandas as pd
 import numpy as np
-from typing import List
+from pathlib import Path
+from typing import List, Tuple, Union
 from preprocessing.scalers import AbstractScaler
 from datasets.readers import ProcessedSetReader
 from torch.utils.data import Dataset
@@ -19,20 +20,68 @@ class RiverGenerator(AbstractGenerator, Dataset):
                  n_samples: int = None,
                  num_cpus: int = 0,
                  one_hot: bool = False,
-                 bining: str = "none"):
+                 bining: str = "none",
+                 prefetch: int = 0,
+                 batch_size: int = 1):
         AbstractGenerator.__init__(self,
                                    reader=reader,
                                    scaler=scaler,
-                                   batch_size=1,
+                                   batch_size=batch_size,
                                    n_samples=n_samples,
                                    num_cpus=num_cpus,
                                    shuffle=shuffle,
                                    one_hot=one_hot,
-                                   bining=bining)
-        self._names: List[str] = None
-        self._labels: List[str] = None
+                                   bining=bining,
+                                   prefetch=prefetch)
+        # Keys are created once and shared by all samples
+        self._names: Tuple[str] = None
+        self._labels: Tuple[str] = None
+        self._name_index: pd.Index = None
         self._index = 0
         self._row_only = True
+        self._yields_frames = batch_size > 1
+        self._options = dict(scaler=scaler,
+                             shuffle=shuffle,
+                             one_hot=one_hot,
+                             bining=bining,
+                             batch_size=batch_size)
+
+    @property
+    def yields_frames(self) -> bool:
+        """
+        Whether the generator yields batches of several samples as (pd.DataFrame, pd.Series), or
+        (pd.DataFrame, pd.DataFrame) for multilabel targets, for the learn_many API of river
+        models, instead of single (dict, float) or (dict, dict) samples.
+        """
+        return self._yields_frames
+
+    def shard(self, num_shards: int) -> List[dict]:
+        """
+        Splits the subjects of the generator into disjoint shards, which can be sent to other
+        processes and turned into generators with the same options using from_shard.
+
+        Parameters
+        ----------
+        num_shards : int
+            Maximum number of shards. Shards are never empty.
+
+        Returns
+        -------
+        List[dict]
+            Keyword arguments of from_shard for each shard.
+        """
+        subject_ids = list(self._random_ids)
+        return [
+            dict(root_path=self._reader.root_path, subject_ids=shard_ids, **self._options)
+            for shard_ids in self.split_ids(subject_ids, min(num_shards, len(subject_ids)))
+        ]
+
+    @classmethod
+    def from_shard(cls, root_path: Path, subject_ids: List[int], **options) -> "RiverGenerator":
+        """
+        Creates a generator over the subjects of a shard created by shard.
+        """
+        return cls(reader=ProcessedSetReader(root_path, subject_ids=subject_ids), **options)
 
     def __iter__(self):
         self._index = 0
@@ -42,16 +91,33 @@ class RiverGenerator(AbstractGenerator, Dataset):
         if self._index >= len(self):
             raise StopIteration
         X, y = super().__getitem__()
-        X = np.squeeze(X)
+        self._index += 1
+        if self._yields_frames:
+            return self._to_frames(X, y)
+        X = X.reshape(-1)
         if self._names is None:
-            self._names = [str(i) for i in range(714)]
-        X = dict(zip(self._names, X))
+            self._names = tuple(str(i) for i in range(len(X)))
+        X = dict(zip(self._names, X.tolist()))
         y = np.squeeze(y)
         if y.shape:
             if self._labels is None:
-                self._labels = [str(i) for i in range(len(y))]
-            y = dict(zip(self._labels, y))
+                self._labels = tuple(str(i) for i in range(len(y)))
+            y = dict(zip(self._labels, y.tolist()))
         else:
             y = float(y)
-        self._index += 1
         return X, y
+
+    def _to_frames(self, X: np.ndarray,
+                   y: np.ndarray) -> Tuple[pd.DataFrame, Union[pd.Series, pd.DataFrame]]:
+        # Row only samples are (B, 1, F), targets (B, 1, N)
+        X = X.reshape(X.shape[0], -1)
+        y = y.reshape(y.shape[0], -1)
+        if self._name_index is None:
+            self._names = tuple(str(i) for i in range(X.shape[1]))
+            self._name_index = pd.Index(self._names)
+        X = pd.DataFrame(X, columns=self._name_index, copy=False)
+        if y.shape[1] == 1:
+            return X, pd.Series(y[:, 0])
+        if self._labels is None:
+            self._labels = tuple(str(i) for i in range(y.shape[1]))
+        return X, pd.DataFrame(y, columns=list(self._labels), copy=False)
@@ -1,8 +1,16 @@
+import random
+import numpy as np
+import multiprocessing as mp
+import tensorflow as tf
+from pathlib import Path
 from preprocessing.scalers import AbstractScaler
 from datasets.readers import ProcessedSetReader
+from datasets.trackers import PreprocessingTracker
 from tensorflow.keras.utils import Sequence
 from utils.IO import *
-from . import AbstractGenerator
+from utils.timeseries import subjects_for_samples
+from typing import List, Union
+from . import AbstractGenerator, subject_buffer, subject_buffer_deep_supervision
 
 
 class TFGenerator(AbstractGenerator, Sequence):
@@ -17,7 +25,9 @@ class TFGenerator(AbstractGenerator, Sequence):
                  target_replication: bool = False,
                  shuffle: bool = True,
                  one_hot: bool = False,
-                 bining: str = "none"):
+                 bining: str = "none",
+                 prefetch: int = 0,
+                 bucket_boundaries: List[int] = None):
         AbstractGenerator.__init__(self,
                                    reader=reader,
                                    scaler=scaler,
@@ -28,7 +38,9 @@ class TFGenerator(AbstractGenerator, Sequence):
                                    deep_supervision=deep_supervision,
                                    shuffle=shuffle,
                                    one_hot=one_hot,
-                                   bining=bining)
+                                   bining=bining,
+                                   prefetch=prefetch,
+                                   bucket_boundaries=bucket_boundaries)
         self._deep_supervision = deep_supervision
 
     def __getitem__(self, index=None):
@@ -43,3 +55,142 @@ class TFGenerator(AbstractGenerator, Sequence):
         if self._deep_supervision:
             return (X, m), y
         return X, y
+
+
+def make_dataset(reader: ProcessedSetReader,
+                 scaler: AbstractScaler,
+                 batch_size: int = 8,
+                 n_samples: int = None,
+                 deep_supervision: bool = False,
+                 target_replication: bool = False,
+                 shuffle: bool = True,
+                 one_hot: bool = False,
+                 bining: str = "none",
+                 num_shards: int = None,
+                 bucket_boundaries: List[int] = None,
+                 shuffle_buffer: int = None,
+                 cache: Union[str, Path] = None) -> tf.data.Dataset:
+    """
+    Builds a tf.data input pipeline yielding the same batches as a TFGenerator, which can be
+    passed to the fit method of a model in place of the generator.
+
+    The subjects are split into shards, which are read concurrently and interleaved. The samples
+    are then batched with zero padding and prefetched, so that batches are assembled while the
+    model trains on the previous one.
+
+    Parameters
+    ----------
+    reader : ProcessedSetReader
+        Reader of the processed dataset.
+    scaler : AbstractScaler
+        Scaler applied to the samples.
+    batch_size : int, optional
+        Number of samples per batch, by default 8.
+    n_samples : int, optional
+        Number of samples to draw subjects for, by default all subjects are used.
+    deep_supervision : bool, optional
+        Whether to yield ((X, M), y) batches for deep supervision, by default False.
+    target_replication : bool, optional
+        Whether to replicate the target over the time steps, by default False.
+    shuffle : bool, optional
+        Whether to shuffle the subjects and samples, by default True.
+    one_hot : bool, optional
+        Whether to one hot encode the binned targets, by default False.
+    bining : str, optional
+        Bining of the targets, one of 'none', 'log' or 'custom', by default 'none'.
+    num_shards : int, optional
+        Number of subject shards read in parallel, by default the number of CPUs.
+    bucket_boundaries : List[int], optional
+        Sequence length boundaries by which samples are bucketed before batching, so that
+        batches contain samples of similar length. By default, samples are batched in order.
+    shuffle_buffer : int, optional
+        Number of samples shuffled together, by default 16 batches.
+    cache : str or Path, optional
+        File to cache the samples in after the first epoch. The samples are read from the
+        reader on every epoch if not provided.
+
+    Returns
+    -------
+    tf.data.Dataset
+        The batched dataset.
+    """
+    if bining not in ["none", "log", "custom"]:
+        raise ValueError("Bining must be one of ['none', 'log', 'custom']")
+    if n_samples is not None:
+        tracker = PreprocessingTracker(storage_path=Path(reader.root_path, "progress"))
+        subject_ids, _ = subjects_for_samples(tracker=tracker,
+                                              target_size=n_samples,
+                                              deep_supervision=deep_supervision)
+    else:
+        subject_ids = list(reader.subject_ids)
+    if not subject_ids:
+        raise ValueError(f"No subjects found in reader at {reader.root_path}")
+    shards = AbstractGenerator.split_ids(subject_ids,
+                                         min(num_shards or mp.cpu_count(), len(subject_ids)))
+
+    def read_shard(index):
+        shard_ids = list(shards[index])
+        if shuffle:
+            random.shuffle(shard_ids)
+        yield from _shard_samples(shard_ids,
+                                  reader=reader,
+                                  scaler=scaler,
+                                  bining=bining,
+                                  one_hot=one_hot,
+                                  deep_supervision=deep_supervision,
+                                  target_replication=target_replication)
+
+    # Specs are inferred from a sample, time steps are variable
+    X, y = next(read_shard(0))
+    time_dependent = deep_supervision or target_replication
+    y_spec = tf.TensorSpec(shape=(None,) + y.shape[1:] if time_dependent else y.shape,
+                           dtype=y.dtype)
+    if deep_supervision:
+        X, M = X
+        X_spec = (tf.TensorSpec(shape=(None,) + X.shape[1:], dtype=X.dtype),
+                  tf.TensorSpec(shape=(None,) + M.shape[1:], dtype=M.dtype))
+    else:
+        X_spec = tf.TensorSpec(shape=(None,) + X.shape[1:], dtype=X.dtype)
+
+    dataset = tf.data.Dataset.range(len(shards)).interleave(
+        lambda index: tf.data.Dataset.from_generator(
+            read_shard, args=(index,), output_signature=(X_spec, y_spec)),
+        cycle_length=len(shards),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle)
+    if cache is not None:
+        dataset = dataset.cache(str(cache))
+    if shuffle:
+        dataset = dataset.shuffle(shuffle_buffer or 16 * batch_size, reshuffle_each_iteration=True)
+    if bucket_boundaries:
+        dataset = dataset.bucket_by_sequence_length(
+            element_length_func=lambda X, y: tf.shape(X[0] if deep_supervision else X)[0],
+            bucket_boundaries=sorted(bucket_boundaries),
+            bucket_batch_sizes=[batch_size] * (len(bucket_boundaries) + 1))
+    else:
+        dataset = dataset.padded_batch(batch_size)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def _shard_samples(subject_ids: List[int], reader: ProcessedSetReader, scaler: AbstractScaler,
+                   bining: str, one_hot: bool, deep_supervision: bool, target_replication: bool):
+    # Yields the unpadded samples of the subjects in the layout of the TFGenerator batches
+    for subject_id in subject_ids:
+        if deep_supervision:
+            for X, y, M in subject_buffer_deep_supervision(subject_id=subject_id,
+                                                           reader=reader,
+                                                           scaler=scaler,
+                                                           bining=bining,
+                                                           one_hot=one_hot):
+                X = np.asarray(X, dtype=np.float32)
+                yield (X, np.asarray(M)), np.asarray(y)
+        else:
+            for X, y, _ in subject_buffer(subject_id=subject_id,
+                                          reader=reader,
+                                          scaler=scaler,
+                                          row_only=False,
+                                          bining=bining):
+                y = np.atleast_2d(y)
+                if target_replication:
+                    y = y.repeat(X.shape[0], axis=0)
+                yield X, y
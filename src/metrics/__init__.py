@@ -21,6 +21,37 @@ def is_iterable(obj):
     return hasattr(obj, '__iter__')
 
 
+def one_hot_bins(index: np.ndarray, nbins: int, out: np.ndarray = None) -> np.ndarray:
+    """
+    One hot encode an array of bin indices.
+
+    Parameters
+    ----------
+    index : np.ndarray
+        The bin indices, of any shape.
+    nbins : int
+        The number of bins.
+    out : np.ndarray, optional
+        Buffer of shape index.shape + (nbins,) the encoding is written into. Allocated as int64 if
+        not provided.
+
+    Returns
+    -------
+    np.ndarray
+        The one hot encoding of shape index.shape + (nbins,).
+    """
+    index = np.asarray(index)
+    if out is None:
+        out = np.zeros(index.shape + (nbins,), dtype=np.int64)
+    elif out.shape != index.shape + (nbins,):
+        raise ValueError(f"One hot buffer must be of shape {index.shape + (nbins,)}, "
+                         f"but is of shape {out.shape}.")
+    else:
+        out.fill(0)
+    np.put_along_axis(out, index[..., None], 1, axis=-1)
+    return out
+
+
 class CustomBins:
     inf = 1e18
     bins = [(-np.inf, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 6), (6, 7), (7, 8), (8, 14),
@@ -33,23 +64,42 @@ class CustomBins:
     # Precompute scaled bin boundaries
     scaled_bins = [(a * 24.0, b * 24.0) for a, b in bins]
     lower_bounds = [a * 24.0 for a, b in bins]
+    # Upper bounds of all but the last bin, looked up by np.searchsorted
+    _boundaries = np.array(lower_bounds[1:])
+
+    @staticmethod
+    def get_bins_custom(x: np.ndarray, one_hot: bool = False, out: np.ndarray = None) -> np.ndarray:
+        """
+        Bin an array of remaining lengths of stay in hours at once.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            The lengths of stay, of any shape.
+        one_hot : bool, optional
+            Whether to one hot encode the bins, by default False.
+        out : np.ndarray, optional
+            Buffer of shape x.shape + (nbins,) the one hot encoding is written into.
+
+        Returns
+        -------
+        np.ndarray
+            The int64 bin indices of shape x.shape, or their one hot encoding.
+        """
+        index = np.searchsorted(CustomBins._boundaries, x, side="right")
+        if one_hot:
+            return one_hot_bins(index, CustomBins.nbins, out=out)
+        return index.astype(np.int64, copy=False)
 
     @staticmethod
     def get_bin_custom(x: Union[np.ndarray, pd.DataFrame, pd.Series, int, float],
                        one_hot: bool = False) -> Union[np.ndarray, int, float]:
         if isinstance(x, (pd.Series, pd.DataFrame)):
             x = x.values.squeeze()
-
-        index = np.digitize(x, CustomBins.lower_bounds) - 1
+        ret = CustomBins.get_bins_custom(np.asarray(x), one_hot=one_hot)
         if one_hot:
-            if is_iterable(index):
-                ret = np.zeros((x.size, CustomBins.nbins), dtype=np.int8)
-                ret[np.arange(x.size), index] = 1
-            else:
-                ret = np.zeros((CustomBins.nbins,), dtype=np.int8)
-                ret[index] = 1
-            return np.int64(ret.squeeze())
-        return np.int64(index)
+            return ret.squeeze()
+        return np.int64(ret)
 
 
 class LogBins:
@@ -59,22 +109,43 @@ class LogBins:
         810.964040, 1715.702848
     ]
 
+    @staticmethod
+    def get_bins_log(x: np.ndarray,
+                     nbins: int = 10,
+                     one_hot: bool = False,
+                     out: np.ndarray = None) -> np.ndarray:
+        """
+        Bin an array of remaining lengths of stay in hours logarithmically at once.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            The lengths of stay, of any shape.
+        nbins : int, optional
+            The number of bins, by default 10.
+        one_hot : bool, optional
+            Whether to one hot encode the bins, by default False.
+        out : np.ndarray, optional
+            Buffer of shape x.shape + (CustomBins.nbins,) the one hot encoding is written into.
+
+        Returns
+        -------
+        np.ndarray
+            The int64 bin indices of shape x.shape, or their one hot encoding.
+        """
+        index = np.round(np.log(np.asarray(x) + 1) / 8.0 * nbins).astype(np.int64)
+        index = np.clip(index, 0, nbins - 1)
+        if one_hot:
+            return one_hot_bins(index, CustomBins.nbins, out=out)
+        return index
+
     def get_bin_log(x: Union[np.ndarray, pd.DataFrame, pd.Series, int, float],
                     nbins: int = 10,
                     one_hot: bool = False) -> Union[np.ndarray, int, float]:
 
         if isinstance(x, (pd.Series, pd.DataFrame)):
             x = x.values.squeeze()
-
-        binid = np.round(np.log(x + 1) / 8.0 * nbins).astype(int)
-        binid = np.clip(binid, 0, nbins - 1)
-
+        ret = LogBins.get_bins_log(x, nbins=nbins, one_hot=one_hot)
         if one_hot:
-            if is_iterable(binid):
-                ret = np.zeros((x.size, CustomBins.nbins), dtype=np.int8)
-                ret[np.arange(x.size), binid] = 1
-            else:
-                ret = np.zeros((CustomBins.nbins,), dtype=np.int8)
-                ret[binid] = 1
-            return np.int64(ret.squeeze())
-        return np.int64(binid)
+            return ret.squeeze()
+        return np.int64(ret)
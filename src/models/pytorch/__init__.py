@@ -33,6 +33,8 @@ class AbstractTorchNetwork(nn.Module):
         super(AbstractTorchNetwork, self).__init__()
         self._model_path = model_path
         self._target_repl_coef = target_repl_coef
+        # (length, dim) -> target replication weights
+        self._replication_cache = dict()
         if final_activation is None:
             if output_dim == 1:
                 self._final_activation = nn.Sigmoid()
@@ -643,7 +645,7 @@ class AbstractTorchNetwork(nn.Module):
                     mask = None
 
                 # Create predictions
-                val_outputs = self.forward(val_inputs, masks=mask)
+                val_outputs = self.forward(val_inputs, masks=self._forward_mask(val_inputs, mask))
 
                 # Apply masking
                 if masking_flag:
@@ -699,14 +701,15 @@ class AbstractTorchNetwork(nn.Module):
         elif (epoch) % val_frequency != 0:
             return
 
-        # Handle masking
-        masking_flag = None
+        # Generators yielding padded batches are evaluated once per yielded batch
+        if getattr(generator, "yields_lengths", False):
+            batch_size = 1
 
         # Init counter epoch variables
         generator_size = len(generator)
         self._on_epoch_start(prefix,
                              generator_size=generator_size,
-                             batch_size=batch_size if batch_size is not None else len(y))
+                             batch_size=batch_size if batch_size is not None else generator_size)
 
         # Batch iter variables
         aggr_outputs = []
@@ -719,25 +722,28 @@ class AbstractTorchNetwork(nn.Module):
             iter_len = len(generator) - 1
             for sample_idx, (val_inputs, val_labels) in enumerate(generator):
 
-                if masking_flag == None:
-                    # Most efficient way to set this I could think of
-                    masking_flag = isinstance(val_input, (list, tuple))
-
-                if masking_flag:
-                    val_input, mask = val_input
-                    val_input = val_input[:, mask.squeeze()]
-                    val_input = val_input.to(self._device)
-                    # Set labels to zero when masking since forward does the same
-                    mask = mask.to(self._device).bool()
-                else:
-                    input = input.to(self._device)
-                    mask = None
+                val_inputs, mask, lengths = self._unpack_input(val_inputs)
+                masking_flag = mask is not None
 
                 # On device label
                 val_labels = val_labels.to(self._device)
 
+                if lengths is not None:
+                    # Padded batches are evaluated in a single vectorized step
+                    replicated = bool(self._target_repl_coef) and not masking_flag
+                    if replicated:
+                        mask = self._length_mask(lengths, val_inputs.shape[1]).to(self._device)
+                    val_outputs = self.forward(val_inputs, masks=mask, lengths=lengths)
+                    self._evaluate_step(*self._batch_outputs(val_outputs, val_labels, mask, lengths,
+                                                             replicated),
+                                        is_test=is_test,
+                                        finalize=iter_len == sample_idx)
+                    if sample_idx == iter_len:
+                        break
+                    continue
+
                 # Create predictions
-                val_outputs = self.forward(val_inputs, masks=mask)
+                val_outputs = self.forward(val_inputs, masks=self._forward_mask(val_inputs, mask))
 
                 # Apply masking
                 if masking_flag:
@@ -779,62 +785,36 @@ class AbstractTorchNetwork(nn.Module):
         self._sample_count += 1
 
         if self._sample_count >= self._batch_size:
-            # Concatenate accumulated outputs and labels
-            if self._target_repl_coef:
-                #
-                replication_weights = [
-                    torch.cat([
-                        torch.ones(output.shape[1] - 1, output.shape[2]) * self._target_repl_coef,
-                        torch.ones(1, output.shape[2])
-                    ]) for output in outputs
-                ]
-
-                replication_weights = torch.cat(replication_weights,
-                                                axis=0).to(self._device).squeeze()
-                # Replicate along T
-                labels = [
-                    label.expand(-1, output.shape[1], -1) for label, output in zip(labels, outputs)
-                ]
-
-                # Cat along T
-                labels = torch.cat(labels, axis=1).squeeze()
-                outputs = torch.cat(outputs, axis=1).squeeze()
-            else:
-                # Cat along T
-                outputs = torch.cat(outputs, axis=1).squeeze()
-
-            # If multilabel, labels are one-hot, else they are sparse
-            if not self._target_repl_coef:
-                if self._task == "multilabel":
-                    # T, N
-                    labels = torch.stack(labels).squeeze()
-                else:
-                    # Cat along T then squeeze
-                    labels = torch.cat(labels, axis=1).squeeze()
-
-            # Compute loss
-            if self._target_repl_coef:
-                # Apply target replication loss here
-                loss = self._loss(outputs, labels)
-                loss = (loss * replication_weights).mean()
-            else:
-                loss = self._loss(outputs, labels)
-
-            # Reset count
-            self._update_metrics(loss,
-                                 outputs,
-                                 labels,
-                                 prefix="test" if is_test else "val",
-                                 update_progbar=finalize and not is_test,
-                                 finalize=finalize)
-            self._sample_count = 0
-            self._batch_count += 1
+            self._evaluate_step(*self._concat_outputs(outputs, labels),
+                                is_test=is_test,
+                                finalize=finalize)
 
             # Reset aggregator vars
             outputs = []
             labels = []
         return outputs, labels
 
+    def _evaluate_step(self,
+                       outputs: torch.Tensor,
+                       labels: torch.Tensor,
+                       replication_weights: torch.Tensor = None,
+                       last_steps: torch.Tensor = None,
+                       is_test: bool = False,
+                       finalize: bool = False):
+        """Computes the loss of the flattened outputs and labels of one batch and updates the
+           metric state.
+        """
+        loss = self._compute_loss(outputs, labels, replication_weights)
+
+        # Reset count
+        self._update_metrics(loss,
+                             *self._select_steps(outputs, labels, last_steps),
+                             prefix="test" if is_test else "val",
+                             update_progbar=finalize and not is_test,
+                             finalize=finalize)
+        self._sample_count = 0
+        self._batch_count += 1
+
     def _get_metrics(self, metrics: Dict[str, Metric]) -> List[Tuple[str, float]]:
         """Fetches metrics from the metric state object, moves them to CPU and converts them
            to str(name), float(quant) value tuples.
@@ -1021,70 +1001,154 @@ class AbstractTorchNetwork(nn.Module):
         self._sample_count += 1
 
         if self._sample_count >= self._batch_size:
-            # Concatenate accumulated outputs and labels
-            if self._target_repl_coef:
-                # Replication weight tensor
-                replication_weights = [
-                    torch.cat([
-                        torch.ones(output.shape[1] - 1, output.shape[2]) * self._target_repl_coef,
-                        torch.ones(1, output.shape[2])
-                    ]) for output in outputs
-                ]
-
-                replication_weights = torch.cat(replication_weights,
-                                                axis=0).to(self._device).squeeze()
-                # Replicate targets along T
-                labels = [
-                    label.expand(-1, output.shape[1], -1) for label, output in zip(labels, outputs)
-                ]
-                # Cat along T
-                labels = torch.cat(labels, axis=1).squeeze()
-                outputs = torch.cat(outputs, axis=1).squeeze()
-            else:
-                # Cat along T
-                outputs = torch.cat(outputs, axis=1).squeeze()
-
-            # If multilabel, labels are one-hot, else they are sparse
-            if not self._target_repl_coef:
-                if self._task == "multilabel":
-                    # T, N
-                    labels = torch.stack(labels).squeeze()
-                else:
-                    # Cat along T then squeeze
-                    labels = torch.cat(labels, axis=1).squeeze()
-
-            # Compute loss
-            if self._target_repl_coef:
-                # Apply target replication loss here
-
-                loss = self._loss(outputs, labels)
-                loss = (loss * replication_weights).mean()
-            else:
-                loss = self._loss(outputs, labels)
-
-            # Backward pass and optimization
-
-            self._optimizer.zero_grad()
-            loss.backward()
-            self._optimizer.step()
-            if self._clip_value is not None:
-                torch.nn.utils.clip_grad_norm_(self.parameters(), max_norm=self._clip_value)
-
-            # Reset count
-            self._update_metrics(loss,
-                                 outputs,
-                                 labels,
-                                 prefix="train",
-                                 update_progbar=True,
-                                 finalize=finalize)
-            self._sample_count = 0
-            self._batch_count += 1
+            self._optimize_step(*self._concat_outputs(outputs, labels), finalize=finalize)
 
             # Reset aggregator vars
             outputs = []
             labels = []
         return outputs, labels
 
+    def _optimize_step(self,
+                       outputs: torch.Tensor,
+                       labels: torch.Tensor,
+                       replication_weights: torch.Tensor = None,
+                       last_steps: torch.Tensor = None,
+                       finalize: bool = False):
+        """Computes the loss of the flattened outputs and labels of one batch, applies the 
+           optimizer and updates the metric state.
+        """
+        loss = self._compute_loss(outputs, labels, replication_weights)
+
+        # Backward pass and optimization
+        self._optimizer.zero_grad()
+        loss.backward()
+        if self._clip_value is not None:
+            torch.nn.utils.clip_grad_norm_(self.parameters(), max_norm=self._clip_value)
+        self._optimizer.step()
+
+        # Reset count
+        self._update_metrics(loss,
+                             *self._select_steps(outputs, labels, last_steps),
+                             prefix="train",
+                             update_progbar=True,
+                             finalize=finalize)
+        self._sample_count = 0
+        self._batch_count += 1
+
+    def _compute_loss(self,
+                      outputs: torch.Tensor,
+                      labels: torch.Tensor,
+                      replication_weights: torch.Tensor = None) -> torch.Tensor:
+        """Computes the loss in one call, weighting the time steps with target replication.
+        """
+        if self._target_repl_coef and replication_weights is not None:
+            # Apply target replication loss here
+            loss = self._loss(outputs, labels)
+            return (loss * replication_weights).mean()
+        return self._loss(outputs, labels)
+
+    def _concat_outputs(self, outputs: list, labels: list):
+        """Concatenates the accumulated per sample outputs and labels along T and returns them
+           together with the target replication weights and the positions of the last time step
+           of each sample, if any.
+        """
+        replication_weights, last_steps = None, None
+        if self._target_repl_coef:
+            # Replication weight tensor
+            replication_weights = torch.cat(
+                [self._replication_weights(output.shape[1], output.shape[2]) for output in outputs],
+                axis=0).squeeze()
+            last_steps = torch.tensor([output.shape[1] for output in outputs],
+                                      device=self._device).cumsum(0) - 1
+            # Replicate targets along T, padded replicated targets are cut to the sample
+            labels = [
+                self._replicate_label(label, output.shape[1])
+                for label, output in zip(labels, outputs)
+            ]
+            # Cat along T
+            labels = torch.cat(labels, axis=1).squeeze()
+            outputs = torch.cat(outputs, axis=1).squeeze()
+        else:
+            # Cat along T
+            outputs = torch.cat(outputs, axis=1).squeeze()
+
+            # If multilabel, labels are one-hot, else they are sparse
+            if self._task == "multilabel":
+                # T, N
+                labels = torch.stack(labels).squeeze()
+            else:
+                # Cat along T then squeeze
+                labels = torch.cat(labels, axis=1).squeeze()
+        return outputs, labels, replication_weights, last_steps
+
+    def _batch_outputs(self,
+                       output: torch.Tensor,
+                       label: torch.Tensor,
+                       mask: torch.Tensor = None,
+                       lengths: torch.Tensor = None,
+                       replicated: bool = False):
+        """Flattens the output and label of a padded (B, T, N) batch to the same layout as 
+           _concat_outputs. Masked time steps are selected sample by sample. Replicated targets
+           are weighted per time step with the weights cached per sequence length.
+        """
+        if mask is None:
+            # Only the last time step is predicted
+            return output.squeeze(), label.squeeze(), None, None
+
+        if mask.dim() == 3:
+            mask = mask.squeeze(-1)
+        replication_weights, last_steps = None, None
+        if replicated:
+            replication_weights = [
+                self._replication_weights(length, output.shape[2]) for length in lengths.tolist()
+            ]
+            replication_weights = torch.cat(replication_weights, axis=0).squeeze()
+            last_steps = lengths.to(self._device).cumsum(0) - 1
+            label = self._replicate_label(label, output.shape[1])
+        return output[mask].squeeze(), label[mask].squeeze(), replication_weights, last_steps
+
+    @staticmethod
+    def _replicate_label(label: torch.Tensor, length: int) -> torch.Tensor:
+        """Returns the label replicated along the first length time steps, (B, length, N).
+        """
+        if label.dim() == 2:
+            label = label.unsqueeze(1)
+        return label[:, :length].expand(-1, length, -1)
+
+    @staticmethod
+    def _select_steps(outputs: torch.Tensor, labels: torch.Tensor, last_steps: torch.Tensor = None):
+        """Selects the last time step of each sample from the flattened outputs and labels, so that
+           metrics with target replication score a single prediction per sample.
+        """
+        if last_steps is None or not outputs.dim():
+            return outputs, labels
+        return outputs[last_steps], labels[last_steps]
+
+    def _forward_mask(self, input: torch.Tensor, mask: torch.Tensor = None) -> torch.Tensor:
+        """Returns the mask passed to forward for a single sample. With target replication, all
+           time steps are selected, so that the replicated targets are predicted at each of them,
+           like for padded batches.
+        """
+        if mask is None and self._target_repl_coef:
+            return torch.ones(input.shape[:2], dtype=torch.bool, device=input.device)
+        return mask
+
+    def _replication_weights(self, length: int, dim: int) -> torch.Tensor:
+        """Returns the (length, dim) target replication weights of a sequence, which are reused
+           for all sequences of the same length.
+        """
+        if (length, dim) not in self._replication_cache:
+            weights = torch.full((length, dim), float(self._target_repl_coef))
+            weights[-1] = 1
+            self._replication_cache[(length, dim)] = weights.to(self._device)
+        return self._replication_cache[(length, dim)]
+
+    @staticmethod
+    def _length_mask(lengths: torch.Tensor, total_length: int) -> torch.Tensor:
+        """Returns the (B, T) mask of the time steps within the sequence lengths.
+        """
+        return torch.arange(total_length, device=lengths.device)[None, :] < lengths[:, None]
+
     def _prefixed_metrics(self, metrics: List[Tuple[str, float]],
                           prefix: str) -> List[Tuple[str, float]]:
         """Returns the list of (metric, value) pair as list, with the name prefixed.
@@ -1102,24 +1166,16 @@ class AbstractTorchNetwork(nn.Module):
 
         with torch.no_grad():
             for idx, (input, label) in enumerate(generator):
-                if masking_flag == None:
-                    # Most efficient way to set this I could think of
-                    masking_flag = isinstance(input, (list, tuple))
-
-                if masking_flag:
-                    input, mask = input
-                    input = input.to(self._device)
-                    # Set labels to zero when masking since forward does the same
-                    mask = mask.to(self._device).bool()
-                else:
-                    input = input.to(self._device)
-                    mask = None
+                input, mask, lengths = self._unpack_input(input, select_masked=False)
+                masking_flag = mask is not None
 
                 label = label.to(self._device).T
-                output = self.forward(input, masks=mask)
+                output = self.forward(input, masks=mask, lengths=lengths)
 
                 # Accumulate outputs and labels either flat or with dim of multilabel
-                if masking_flag:
+                if masking_flag and lengths is not None:
+                    output = output.masked_fill(~mask.reshape(*mask.shape[:2], 1), -1)
+                elif masking_flag:
                     placeholder = -torch.ones(*mask.shape[:2], output.shape[2])
                     placeholder[:, mask.cpu().squeeze()] = output.cpu()
                     output = placeholder
@@ -1179,6 +1235,28 @@ class AbstractTorchNetwork(nn.Module):
 
         return np.concatenate(aggr_outputs)
 
+    def _unpack_input(self, input, select_masked: bool = True):
+        """Splits the input yielded by a generator into the samples, the deep supervision mask
+           and the sequence lengths of padded batches, each None if not provided. With
+           select_masked, only the masked time steps of single samples are kept.
+        """
+        mask, lengths = None, None
+        if isinstance(input, (list, tuple)) and len(input) == 3:
+            # Padded deep supervision batch, the time steps are selected after the forward pass
+            input, mask, lengths = input
+            mask = mask.to(self._device).bool()
+        elif isinstance(input, (list, tuple)):
+            input, extra = input
+            if extra.dim() == 1:
+                lengths = extra
+            else:
+                mask = extra
+                if select_masked:
+                    input = input[:, mask.squeeze()]
+                # Set labels to zero when masking since forward does the same
+                mask = mask.to(self._device).bool()
+        return input.to(self._device), mask, lengths
+
     def _remove_end_padding(self, input) -> torch.Tensor:
         # tensor shape: (B, T, N)
         mask = (input != 0).int().sum(2) > 0
@@ -1276,7 +1354,7 @@ class AbstractTorchNetwork(nn.Module):
                 mask = None
 
             # Create predictions
-            output = self.forward(input, masks=mask)
+            output = self.forward(input, masks=self._forward_mask(input, mask))
 
             if masking_flag:
                 # Apply mask to T (B, T, N)
@@ -1310,7 +1388,10 @@ class AbstractTorchNetwork(nn.Module):
 
         # Train mode
         self.train()
-        masking_flag = None
+
+        # Generators yielding padded batches are optimized once per yielded batch
+        if getattr(generator, "yields_lengths", False):
+            batch_size = 1
 
         # Tracking variables
         generator_size = len(generator)
@@ -1327,25 +1408,27 @@ class AbstractTorchNetwork(nn.Module):
             input: torch.Tensor
             label: torch.Tensor
 
-            if masking_flag == None:
-                # Most efficient way to set this I could think of
-                masking_flag = isinstance(input, (list, tuple))
-
-            if masking_flag:
-                input, mask = input
-                input = input[:, mask.squeeze()]
-                input = input.to(self._device)
-                # Set labels to zero when masking since forward does the same
-                mask = mask.to(self._device).bool()
-            else:
-                input = input.to(self._device)
-                mask = None
+            input, mask, lengths = self._unpack_input(input)
+            masking_flag = mask is not None
 
             # On device label
             label = label.to(self._device)
 
+            if lengths is not None:
+                # Padded batches are optimized in a single vectorized step
+                replicated = bool(self._target_repl_coef) and not masking_flag
+                if replicated:
+                    # Replicated targets are predicted at every time step within the lengths
+                    mask = self._length_mask(lengths, input.shape[1]).to(self._device)
+                output = self.forward(input, masks=mask, lengths=lengths)
+                self._optimize_step(*self._batch_outputs(output, label, mask, lengths, replicated),
+                                    finalize=not has_val and iter_len == sample_idx)
+                if sample_idx == iter_len:
+                    break
+                continue
+
             # Prediction
-            output = self.forward(input, masks=mask)
+            output = self.forward(input, masks=self._forward_mask(input, mask))
 
             if masking_flag:
                 # Apply mask to T (B, T, N)
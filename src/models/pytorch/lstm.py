@@ -1,6 +1,7 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 from pathlib import Path
 from typing import Union, List, Dict
 from utils.IO import *
@@ -81,17 +82,25 @@ class LSTMNetwork(AbstractTorchNetwork):
                 elif 'bias_hh' in name:
                     p.data.fill_(0)
 
-    def forward(self, x, masks=None) -> torch.Tensor:
+    def forward(self, x, masks=None, lengths=None) -> torch.Tensor:
         masking_falg = masks is not None
         if masking_falg:
             masks = masks.to(self._device)
         x = x.to(self._device)
 
+        # Padded batches are packed, so that the LSTMs skip the padding of shorter sequences
+        if lengths is not None:
+            total_length = x.shape[1]
+            x = pack_padded_sequence(x, lengths.cpu(), batch_first=True, enforce_sorted=False)
+
         # Masking is not natively supported in PyTorch LSTM, assume x is already preprocessed if necessary
         for lstm in self.lstm_layers:
             x, _ = lstm(x)
         x, _ = self._lstm_final(x)
 
+        if lengths is not None:
+            x, _ = pad_packed_sequence(x, batch_first=True, total_length=total_length)
+
         # Case 1: deep supervision
         if masking_falg:
             # Apply the linear layer to each LSTM output at each timestep (ts)
@@ -103,7 +112,10 @@ class LSTMNetwork(AbstractTorchNetwork):
         # Case 2: standard LSTM or target replication
         else:
             # Apply linear layer only to the last output of the LSTM
-            x = x[:, -1, :]
+            if lengths is None:
+                x = x[:, -1, :]
+            else:
+                x = x[torch.arange(x.shape[0], device=x.device), lengths.to(x.device) - 1]
             x = x.reshape(x.shape[0], 1, x.shape[1])
             x = self._output_layer(x)
 
@@ -4,7 +4,9 @@ import copy
 import functools
 import pickle
 import warnings
-from typing import Dict
+import pandas as pd
+from typing import Dict, List, Union
+from pathos.multiprocessing import Pool
 from river.metrics.base import Metric
 from river import base
 from river import linear_model
@@ -58,7 +60,8 @@ class AbstractRiverModel(ABC):
             return_metrics[metric_name] = metric
         return return_metrics
 
-    def _update_metrics(self, metrics: Dict[str, Metric], x, y_true, y_pred):
+    def _update_metrics(self, metrics: Dict[str, Metric], y_true, y_pred):
+        # Label metrics are updated from the label of the same prediction
         y_label = None
 
         for _, metric in metrics.items():
@@ -66,9 +69,68 @@ class AbstractRiverModel(ABC):
                 metric.update(y_true, y_pred)
             else:
                 if y_label is None:
-                    y_label = self.predict_one(x)
+                    y_label = self._to_label(y_pred)
                 metric.update(y_true, y_label)
 
+    def _update_metrics_many(self, metrics: Dict[str, Metric], y_true: list, y_pred: list):
+        for y_true_sample, y_pred_sample in zip(y_true, y_pred):
+            self._update_metrics(metrics=metrics, y_true=y_true_sample, y_pred=y_pred_sample)
+
+    def _to_label(self, y_pred):
+        """
+        Derives the predicted label from a probability dictionary the way predict_one of river
+        classifiers does, so that the model is not traversed a second time. Predictions that are
+        not probabilities, e.g. of regressors, are labels already.
+        """
+        if isinstance(self, AbstractMultioutputClassifier) and isinstance(y_pred, dict):
+            # One probability dictionary per label, empty as long as no label was learned
+            return {label: self._proba_to_label(y_proba) for label, y_proba in y_pred.items()}
+        return self._proba_to_label(y_pred)
+
+    @staticmethod
+    def _proba_to_label(y_proba):
+        if not isinstance(y_proba, dict):
+            return y_proba
+        if not y_proba:
+            return None
+        return max(y_proba, key=y_proba.get)
+
+    def _predict_proba_one(self, x: dict):
+        """
+        Predicts the probabilities of a sample, if supported, or its label.
+        """
+        if hasattr(self, "predict_proba_one"):
+            return self.predict_proba_one(x)
+        return self.predict_one(x)
+
+    @staticmethod
+    def _rows(y: Union[pd.DataFrame, pd.Series]) -> list:
+        # Frames are split into the per sample layout of the generator
+        if isinstance(y, pd.DataFrame):
+            return y.to_dict(orient="records")
+        return y.tolist()
+
+    def _learn_many(self, X: pd.DataFrame, y: Union[pd.Series, pd.DataFrame]):
+        """
+        Learns a batch with the mini-batch API of the model, if supported, or sample by sample.
+        """
+        if hasattr(self, "learn_many"):
+            self.learn_many(X, y)
+            return
+        for x_sample, y_sample in zip(self._rows(X), self._rows(y)):
+            self.learn_one(x_sample, y_sample)
+
+    def _predict_many(self, X: pd.DataFrame) -> List:
+        """
+        Predicts a batch with the mini-batch API of the model, if supported, or sample by sample.
+        Returns the probabilities, if supported, or the labels, one per sample.
+        """
+        if hasattr(self, "predict_proba_many"):
+            return self._rows(self.predict_proba_many(X))
+        if not hasattr(self, "predict_proba_one") and hasattr(self, "predict_many"):
+            return self._rows(self.predict_many(X))
+        return [self._predict_proba_one(x_sample) for x_sample in self._rows(X)]
+
     def _update_history(self, history_dict: dict, metrics: Dict[str, Metric]):
         for name, metric in metrics.items():
             try:
@@ -82,29 +144,52 @@ class AbstractRiverModel(ABC):
     def fit(self,
             train_generator: RiverGenerator,
             val_generator: RiverGenerator = None,
-            model_path: Path = None):
+            model_path: Path = None,
+            progressive_validation: bool = False):
         if model_path is not None:
             self._model_path = model_path
             self._history = self._init_history(path=model_path)
         self.load()
-        self.train(generator=train_generator, has_val=val_generator is not None)
+        self.train(generator=train_generator,
+                   has_val=val_generator is not None,
+                   progressive_validation=progressive_validation)
         if val_generator is not None:
             self.evaluate(generator=val_generator, is_val=True)
 
         self.save()
         return self._history.to_json()
 
-    def train(self, generator: RiverGenerator, has_val: bool = False):
+    def train(self,
+              generator: RiverGenerator,
+              has_val: bool = False,
+              progressive_validation: bool = False):
+        """
+        Trains the model on one pass over the generator. The training metrics are updated from a
+        single prediction per sample, made after learning the sample or, with progressive
+        validation, before learning it, so that the metrics reflect unseen samples.
+        """
         generator_size = len(generator)
         self._train_progbar = Progbar(generator_size)
 
+        yields_frames = getattr(generator, "yields_frames", False)
+
         for batch_idx, (x, y) in enumerate(generator):
-            self.learn_one(x, y)
-            if hasattr(self, "predict_proba_one"):
-                y_pred = self.predict_proba_one(x)
+            if yields_frames:
+                if progressive_validation:
+                    y_pred = self._predict_many(x)
+                self._learn_many(x, y)
+                if not progressive_validation:
+                    y_pred = self._predict_many(x)
+                self._update_metrics_many(metrics=self._train_metrics,
+                                          y_true=self._rows(y),
+                                          y_pred=y_pred)
             else:
-                y_pred = self.predict_one(x)
-            self._update_metrics(metrics=self._train_metrics, x=x, y_true=y, y_pred=y_pred)
+                if progressive_validation:
+                    y_pred = self._predict_proba_one(x)
+                self.learn_one(x, y)
+                if not progressive_validation:
+                    y_pred = self._predict_proba_one(x)
+                self._update_metrics(metrics=self._train_metrics, y_true=y, y_pred=y_pred)
             self._train_progbar.update(batch_idx + 1,
                                        values=self._get_metrics(self._train_metrics),
                                        finalize=(batch_idx == generator_size and not has_val))
@@ -122,12 +207,21 @@ class AbstractRiverModel(ABC):
     def predict(self):
         pass
 
-    def test(self, generator: RiverGenerator):
-        metrics = self.evaluate(generator=generator, is_test=True)
+    def test(self, generator: RiverGenerator, num_workers: int = 0):
+        metrics = self.evaluate(generator=generator, is_test=True, num_workers=num_workers)
         self._history.to_json()
         return metrics
 
-    def evaluate(self, generator: RiverGenerator, is_val: bool = False, is_test: bool = False):
+    def evaluate(self,
+                 generator: RiverGenerator,
+                 is_val: bool = False,
+                 is_test: bool = False,
+                 num_workers: int = 0):
+        """
+        Evaluates the model on one pass over the generator. With several workers, the subjects of
+        the generator are sharded across processes, each predicting its shard with a snapshot of
+        the model, and the metrics are updated from the merged predictions.
+        """
         if is_val:
             eval_metric = self._val_metrics
         elif is_test:
@@ -135,9 +229,20 @@ class AbstractRiverModel(ABC):
         else:
             eval_metric = deepcopy(self._metrics)
 
-        for _, (x, y) in enumerate(generator):
-            y_pred = self.predict_one(x)
-            self._update_metrics(metrics=eval_metric, x=x, y_true=y, y_pred=y_pred)
+        yields_frames = getattr(generator, "yields_frames", False)
+
+        if num_workers > 1:
+            for y_true, y_pred in self._predict_sharded(generator, num_workers):
+                self._update_metrics_many(metrics=eval_metric, y_true=y_true, y_pred=y_pred)
+        else:
+            for _, (x, y) in enumerate(generator):
+                if yields_frames:
+                    self._update_metrics_many(metrics=eval_metric,
+                                              y_true=self._rows(y),
+                                              y_pred=self._predict_many(x))
+                    continue
+                y_pred = self._predict_proba_one(x)
+                self._update_metrics(metrics=eval_metric, y_true=y, y_pred=y_pred)
 
         if is_val:
             self._train_progbar.update(self._train_progbar.target,
@@ -152,6 +257,18 @@ class AbstractRiverModel(ABC):
 
         return eval_metric
 
+    def _predict_sharded(self, generator: RiverGenerator, num_workers: int):
+        """
+        Yields the targets and predictions of each shard of the generator, predicted in parallel.
+        """
+        # Storables can't be pickled
+        snapshot = copy.copy(self)
+        for key in ["_history", "_train_progbar"]:
+            snapshot.__dict__.pop(key, None)
+        shards = generator.shard(num_workers)
+        with Pool(min(num_workers, len(shards))) as pool:
+            yield from pool.imap(_predict_shard, [(snapshot, shard) for shard in shards])
+
     def save(self, model_path=None):
         """_summary_
         """
@@ -192,6 +309,21 @@ class AbstractRiverModel(ABC):
         return 0
 
 
+def _predict_shard(args):
+    # Runs in a worker process, the model is a frozen snapshot
+    model, shard = args
+    generator = RiverGenerator.from_shard(**shard)
+    y_true, y_pred = list(), list()
+    for x, y in generator:
+        if generator.yields_frames:
+            y_true.extend(model._rows(y))
+            y_pred.extend(model._predict_many(x))
+        else:
+            y_true.append(y)
+            y_pred.append(model._predict_proba_one(x))
+    return y_true, y_pred
+
+
 class AbstractMultioutputClassifier(base.Wrapper, base.Classifier):
 
     def __init__(self, classifier):
@@ -95,7 +95,7 @@ if __name__ == "__main__":
     from pathlib import Path
     from tests.tsettings import *
     from preprocessing.scalers import MinMaxScaler
-    from generators.tf2 import TFGenerator
+    from generators.tf2 import make_dataset
     from tensorflow.keras.optimizers import Adam
 
     reader = datasets.load_data(chunksize=75836,
@@ -111,11 +111,11 @@ if __name__ == "__main__":
     # reader = datasets.train_test_split(reader, test_size=0.2, val_size=0.1)
 
     scaler = MinMaxScaler().fit_reader(reader)
-    train_generator = TFGenerator(reader=reader,
-                                  scaler=scaler,
-                                  batch_size=8,
-                                  shuffle=True,
-                                  deep_supervision=True)
+    train_dataset = make_dataset(reader=reader,
+                                 scaler=scaler,
+                                 batch_size=8,
+                                 shuffle=True,
+                                 deep_supervision=True)
 
     # val_generator = TFGenerator(reader=reader.val, scaler=scaler, batch_size=8, shuffle=True)
 
@@ -128,4 +128,4 @@ if __name__ == "__main__":
                         depth=3,
                         final_activation='sigmoid')
     model.compile(optimizer=Adam(learning_rate=0.000001, clipvalue=1.0), loss="binary_crossentropy")
-    history = model.fit(train_generator, epochs=1000)
+    history = model.fit(train_dataset, epochs=1000)
@@ -9,6 +9,7 @@ from sklearn.impute import SimpleImputer
 from utils.IO import *
 from utils.arrays import is_allnan
 from preprocessing import AbstractScikitProcessor as AbstractImputer
+from preprocessing.sketches import QuantileSketch
 
 
 class PartialImputer(SimpleImputer, AbstractImputer):
@@ -21,7 +22,8 @@ class PartialImputer(SimpleImputer, AbstractImputer):
                  fill_value=0,
                  add_indicator=False,
                  keep_empty_features=True,
-                 storage_path=None):
+                 storage_path=None,
+                 sketch_size=200):
         """
         An imputer for handling missing values in a dataset with the capability of partial fitting.
 
@@ -34,7 +36,8 @@ class PartialImputer(SimpleImputer, AbstractImputer):
             The placeholder for the missing values. All occurrences of `missing_values` will be
             imputed. Default is np.nan.
         strategy : str, optional
-            The imputation strategy. Default is 'mean'.
+            The imputation strategy. Default is 'mean'. When partially fitting with 'median', the
+            medians are estimated from a bounded size quantile sketch.
         verbose : int, optional
             The verbosity level. Default is 1.
         copy : bool, optional
@@ -51,8 +54,13 @@ class PartialImputer(SimpleImputer, AbstractImputer):
             Default is True.
         storage_path : Path or str, optional
             The path where the imputer's state will be stored. Default is None.
+        sketch_size : int, optional
+            Accuracy parameter of the quantile sketch used for the median strategy. Default is 200.
         """
         self._verbose = verbose
+        self._sketch_size = sketch_size
+        self._sketch = None
+        self._stale_statistics = False
         self.statistics_ = None
         self.n_features_in_ = 0
         self.n_samples_in_ = 0
@@ -92,6 +100,10 @@ class PartialImputer(SimpleImputer, AbstractImputer):
         n = len(X)
         if is_allnan(X):
             return self
+        if self.strategy == "median":
+            self._partial_fit_median(X)
+            warnings.filterwarnings("default")
+            return self
         avg = np.nanmean(X, axis=0)
 
         if self.statistics_ is None:
@@ -104,6 +116,35 @@ class PartialImputer(SimpleImputer, AbstractImputer):
         warnings.filterwarnings("default")
         return self
 
+    def _partial_fit_median(self, X):
+        """
+        Update the quantile sketch. The medians are only computed from it once they are accessed.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if self.statistics_ is None:
+            # Sets up the remaining sklearn attributes
+            self.fit(X)
+        if self._sketch is None:
+            self._sketch = QuantileSketch(X.shape[1], k=self._sketch_size)
+        self._sketch.update(X)
+        self._stale_statistics = True
+        self.n_samples_in_ += len(X)
+
+    @property
+    def statistics_(self) -> np.ndarray:
+        if getattr(self, "_stale_statistics", False):
+            # Querying the sketch sorts it, so this is deferred until the medians are used
+            self._stale_statistics = False
+            statistics = self._sketch.quantile(0.5)
+            if self.keep_empty_features:
+                statistics = np.where(np.isnan(statistics), 0., statistics)
+            self._statistics = statistics
+        return self._statistics
+
+    @statistics_.setter
+    def statistics_(self, value: np.ndarray):
+        self._statistics = value
+
     @classmethod
     def _get_param_names(cls):
         """Necessary for parent class.
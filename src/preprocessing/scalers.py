@@ -8,6 +8,7 @@ from sklearn.preprocessing import MaxAbsScaler as _MaxAbsScaler
 from utils.IO import *
 from pathlib import Path
 from preprocessing import AbstractScikitProcessor
+from preprocessing.sketches import QuantileSketch
 
 __all__ = ["AbstractScaler", "StandardScaler", "MinMaxScaler", "MaxAbsScaler", "RobustScaler"]
 
@@ -391,6 +392,8 @@ class RobustScaler(_RobustScaler, AbstractScaler):
         If True, a copy of X will be created, by default True.
     verbose : bool, optional
         If True, print verbose logs during processing, by default True.
+    sketch_size : int, optional
+        Accuracy parameter of the quantile sketch used by `partial_fit`, by default 200.
     """
 
     def __init__(self,
@@ -400,14 +403,19 @@ class RobustScaler(_RobustScaler, AbstractScaler):
                  with_scaling=True,
                  quantile_range=(25.0, 75.0),
                  copy=True,
-                 verbose=True):
+                 verbose=True,
+                 sketch_size=200):
         self._name = "robust scaler"
         self._storage_name = "robust_scaler.pkl"
+        self._sketch_size = sketch_size
+        self._sketch = None
+        self._stale_statistics = False
         AbstractScaler.__init__(self, storage_path=storage_path, imputer=imputer, verbose=verbose)
-        _RobustScaler().__init__(with_centering=with_centering,
-                                 with_scaling=with_scaling,
-                                 quantile_range=quantile_range,
-                                 copy=copy)
+        _RobustScaler.__init__(self,
+                               with_centering=with_centering,
+                               with_scaling=with_scaling,
+                               quantile_range=quantile_range,
+                               copy=copy)
 
     @classmethod
     def _get_param_names(cls):
@@ -459,6 +467,94 @@ class RobustScaler(_RobustScaler, AbstractScaler):
             return self._imputer.transform(X)
         return super().fit(X, y, **fit_params)
 
+    def partial_fit(self, X: Union[np.ndarray, pd.DataFrame], y=None):
+        """
+        Incrementally compute the median and quantiles to be used for later scaling.
+
+        The statistics are estimated from a per feature quantile sketch of bounded size, so that
+        the scaler can be fitted out-of-core, e.g. by `fit_reader`. The sketch is stored along with
+        the scaler and can be merged with sketches fitted in other processes. The median and
+        quantiles are only computed from the sketch once they are accessed.
+
+        Parameters
+        ----------
+        X : array-like of shape (n_samples, n_features)
+            The data batch to update the median and quantiles with.
+        y : None
+            Ignored.
+
+        Returns
+        -------
+        self : object
+            Fitted scaler.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if self._sketch is None:
+            self._sketch = QuantileSketch(X.shape[1], k=self._sketch_size)
+        self._sketch.update(X)
+        self.n_features_in_ = X.shape[1]
+        self._stale_statistics = True
+        return self
+
+    def merge(self, other: "RobustScaler"):
+        """
+        Merge the quantile sketch of a scaler partially fitted on another part of the data.
+
+        Parameters
+        ----------
+        other : RobustScaler
+            The partially fitted scaler to merge.
+
+        Returns
+        -------
+        self : object
+            Fitted scaler.
+        """
+        if other._sketch is None:
+            return self
+        if self._sketch is None:
+            self._sketch = QuantileSketch(other._sketch.n_features, k=self._sketch_size)
+        self._sketch.merge(other._sketch)
+        self.n_features_in_ = self._sketch.n_features
+        self._stale_statistics = True
+        return self
+
+    @property
+    def center_(self) -> np.ndarray:
+        if getattr(self, "_stale_statistics", False):
+            self._update_statistics()
+        return self._center
+
+    @center_.setter
+    def center_(self, value: np.ndarray):
+        self._center = value
+
+    @property
+    def scale_(self) -> np.ndarray:
+        if getattr(self, "_stale_statistics", False):
+            self._update_statistics()
+        return self._scale
+
+    @scale_.setter
+    def scale_(self, value: np.ndarray):
+        self._scale = value
+
+    def _update_statistics(self):
+        # Querying the sketch sorts it, so this is deferred until the statistics are used
+        self._stale_statistics = False
+        q_min, q_max = self.quantile_range
+        if not 0 <= q_min <= q_max <= 100:
+            raise ValueError(f"Invalid quantile range: {self.quantile_range}")
+        quantiles = self._sketch.quantile([0.5, q_min / 100., q_max / 100.])
+        # Features without observations are left untouched, like in sklearn
+        quantiles = np.where(np.isnan(quantiles), 0., quantiles)
+        self.center_ = quantiles[0] if self.with_centering else None
+        if self.with_scaling:
+            scale = quantiles[2] - quantiles[1]
+            self.scale_ = np.where(scale == 0., 1., scale)
+        else:
+            self.scale_ = None
+
     def fit_transform(self,
                       X: Union[np.ndarray, pd.DataFrame],
                       y: Union[np.ndarray, pd.DataFrame] = None,
@@ -0,0 +1,181 @@
+import numpy as np
+from typing import List, Union
+
+__all__ = ["QuantileSketch"]
+
+
+class _KLLCompactor(object):
+    """
+    Single stream KLL sketch.
+
+    Items are kept in a hierarchy of levels, where an item on level h stands in for 2**h
+    observations. Whenever a level exceeds its capacity, it is sorted and every other item is
+    promoted to the next level, so that the memory footprint stays in O(k log(n / k)).
+
+    Parameters
+    ----------
+    k : int
+        Capacity of the top level. Larger values give more accurate quantiles.
+    rng : np.random.Generator
+        Random generator used to choose the compaction offset.
+    """
+
+    _c = 2. / 3.
+
+    def __init__(self, k: int, rng: np.random.Generator):
+        self._k = k
+        self._rng = rng
+        self._levels: List[np.ndarray] = [np.empty(0, dtype=np.float64)]
+        self.n = 0
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._levels) - level - 1
+        return max(2, int(np.ceil(self._k * self._c**depth)))
+
+    def _compress(self):
+        while True:
+            for level, items in enumerate(self._levels):
+                if len(items) > self._capacity(level):
+                    break
+            else:
+                return
+            if level + 1 == len(self._levels):
+                self._levels.append(np.empty(0, dtype=np.float64))
+            items = np.sort(items)
+            # Keep the leftover item on the current level for odd sized buffers
+            n_even = len(items) - len(items) % 2
+            offset = self._rng.integers(2)
+            self._levels[level + 1] = np.concatenate(
+                [self._levels[level + 1], items[offset:n_even:2]])
+            self._levels[level] = items[n_even:]
+
+    def update(self, values: np.ndarray):
+        if not len(values):
+            return
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self.n += len(values)
+        self._compress()
+
+    def merge(self, other: "_KLLCompactor"):
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other._levels):
+            self._levels[level] = np.concatenate([self._levels[level], items])
+        self.n += other.n
+        self._compress()
+
+    def quantile(self, q: np.ndarray) -> np.ndarray:
+        if not self.n:
+            return np.full(len(q), np.nan)
+        items = np.concatenate(self._levels)
+        weights = np.concatenate(
+            [np.full(len(items), 2**level) for level, items in enumerate(self._levels)])
+        order = np.argsort(items, kind="stable")
+        items, weights = items[order], weights[order]
+        cum_weights = np.cumsum(weights)
+        ranks = np.searchsorted(cum_weights, q * cum_weights[-1], side="left")
+        return items[np.minimum(ranks, len(items) - 1)]
+
+
+class QuantileSketch(object):
+    """
+    Per feature streaming quantile sketch with bounded memory.
+
+    Implements a KLL sketch for each column of the data, ignoring NaN values. Sketches can be
+    updated batch by batch, merged with sketches computed in other processes and pickled
+    together with the processor holding them.
+
+    Parameters
+    ----------
+    n_features : int
+        Number of features (columns) to sketch.
+    k : int, optional
+        Accuracy parameter of the sketch. The rank error is roughly 1.7 / k, by default 200.
+    random_state : int, optional
+        Seed for the compaction offsets, by default None.
+    """
+
+    def __init__(self, n_features: int, k: int = 200, random_state: int = None):
+        if k < 8:
+            raise ValueError(f"Sketch accuracy parameter k must be at least 8, got {k}.")
+        self._n_features = n_features
+        self._k = k
+        self._rng = np.random.default_rng(random_state)
+        self._compactors = [_KLLCompactor(k, self._rng) for _ in range(n_features)]
+
+    @property
+    def n_features(self) -> int:
+        return self._n_features
+
+    @property
+    def n_samples_seen(self) -> np.ndarray:
+        """Number of non-NaN values seen per feature.
+        """
+        return np.array([compactor.n for compactor in self._compactors])
+
+    def update(self, X: np.ndarray):
+        """
+        Add a batch of samples to the sketch.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Samples of shape (n_samples, n_features). NaN values are ignored.
+
+        Returns
+        -------
+        self : QuantileSketch
+            The updated sketch.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(-1, 1)
+        if X.shape[1] != self._n_features:
+            raise ValueError(f"Sketch expects {self._n_features} features, got {X.shape[1]}.")
+        for column, compactor in zip(X.T, self._compactors):
+            compactor.update(column[~np.isnan(column)])
+        return self
+
+    def merge(self, other: "QuantileSketch"):
+        """
+        Merge another sketch into this one, e.g. one computed in a different process.
+
+        Parameters
+        ----------
+        other : QuantileSketch
+            The sketch to merge. It is left unchanged.
+
+        Returns
+        -------
+        self : QuantileSketch
+            The merged sketch.
+        """
+        if other.n_features != self._n_features:
+            raise ValueError(f"Cannot merge sketch with {other.n_features} features "
+                             f"into sketch with {self._n_features} features.")
+        for compactor, other_compactor in zip(self._compactors, other._compactors):
+            compactor.merge(other_compactor)
+        return self
+
+    def quantile(self, q: Union[float, List[float], np.ndarray]) -> np.ndarray:
+        """
+        Estimate quantiles for each feature.
+
+        Parameters
+        ----------
+        q : float or array-like
+            Quantile or sequence of quantiles in [0, 1].
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (n_features,) for scalar q, else (len(q), n_features). Features without
+            any observation yield NaN.
+        """
+        q_array = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if ((q_array < 0) | (q_array > 1)).any():
+            raise ValueError(f"Quantiles must be in [0, 1], got {q}.")
+        result = np.stack([compactor.quantile(q_array) for compactor in self._compactors], axis=1)
+        if np.ndim(q) == 0:
+            return result[0]
+        return result
@@ -1,13 +1,103 @@
 """Provides a storable dataclass with some custom dictionary operations for trackers.
-Attempted thread safety but didn't work out too well. Use an external lock. 
-Designed to work multiple processes.
+Designed to work multiple processes. Accesses to the storage are serialized by a file lock, so
+that trackers can be updated from several processes without an external lock. Use the
+transaction context for read-modify-write sequences spanning several accesses.
+
+The state is persisted as a shelve snapshot and an append-only log of deltas next to it. List
+appends and dictionary item assignments only log the modified entries, so that the cost of a write
+does not grow with the size of the tracked state. Writes can be batched with the save_frequency
+keyword and are folded back into the snapshot on close, or once the log grows beyond the
+max_log_size keyword in bytes. A record torn by a crashed writer is dropped from the log.
 """
+import os
+import pickle
 import shelve
-import multiprocess as mp
+import threading
+from contextlib import contextmanager
 from copy import deepcopy
 from pathlib import Path
 from typing import Any
 
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    import msvcrt
+    fcntl = None
+
+
+def _copy(value: Any) -> Any:
+    """
+    Deep copy of the plain progress values, considerably faster than copy.deepcopy.
+    """
+    return pickle.loads(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _log_header() -> bytes:
+    """
+    First record of a new log. Random, so that instances tell a compacted log from the one they
+    read even if the file system reuses its inode.
+    """
+    return pickle.dumps((("header", os.urandom(16)), []))
+
+
+_LOG_HEADER_SIZE = len(_log_header())
+
+
+def _lock_file(handle):
+    """
+    Block until the exclusive lock on the open file is acquired.
+    """
+    if fcntl is not None:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        return
+    # Locks the first byte, which may lie beyond the end of the file
+    handle.seek(0)
+    while True:
+        try:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK gives up after ten seconds
+            continue
+
+
+def _unlock_file(handle):
+    """
+    Release the exclusive lock on the open file.
+    """
+    if fcntl is not None:
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        return
+    handle.seek(0)
+    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _apply_record(progress: dict, name: str, operation: str, payload: Any):
+    """
+    Apply a single logged delta to the progress dictionary.
+    """
+    if operation == "set":
+        progress[name] = payload
+    elif operation == "extend":
+        if progress.get(name) is None:
+            progress[name] = list()
+        progress[name].extend(payload)
+    elif operation == "update":
+        if progress.get(name) is None:
+            progress[name] = dict()
+        progress[name].update(payload)
+    elif operation == "add":
+        if progress.get(name) is None:
+            progress[name] = dict()
+        for key, value in payload.items():
+            progress[name][key] = progress[name].get(key, 0) + value
+    elif operation == "delete":
+        if progress.get(name) is not None:
+            progress[name].pop(payload, None)
+    else:
+        raise ValueError(f"Unknown storable log operation '{operation}'.")
+
 
 class SimpleProperty(object):
     """
@@ -87,22 +177,38 @@ class ProxyDictionary(dict):
         super().__init__(*args, **kwargs)
         self._name = name
         self._store_total = store_total
-        self._on_modified = write_callback
-        if store_total:
-            if "total" not in default:
-                # If the dict is created from scratch, total is created in the first update
-                # After that it is assumed that total is correctly updated
-                self._is_initial = False
-                self["total"] = 0
-            else:
-                self._is_initial = True
-
-            if not self._is_initial:
-                self._on_modified(self._name, self, *args, **kwargs)
-        self.update(default)
+        # Populating from the stored value is not a modification
+        self._on_modified = None
+        self._is_initial = store_total and "total" in default
+        if store_total and not self._is_initial:
+            # If the dict is created from scratch, total is created in the first update
+            # After that it is assumed that total is correctly updated
+            self["total"] = 0
+            self.update(default)
+        else:
+            super().update(default)
         self._is_initial = False
+        self._on_modified = write_callback
+        if store_total and "total" not in default and self._on_modified:
+            self._on_modified(self._name, self)
+        self._logged_total = self.get("total", 0)
         return
 
+    def _changed(self, *keys) -> list:
+        """
+        Deltas of the modified keys. The total is logged as an increment, so that concurrent
+        modifications of other keys from different processes add up.
+        """
+        updated = {key: self[key] for key in keys if key in self}
+        deltas = [("update", updated)] if updated else []
+        if self._store_total and "total" in self:
+            if "total" in keys:
+                self._logged_total = self["total"]
+            elif self["total"] != self._logged_total:
+                deltas.append(("add", {"total": self["total"] - self._logged_total}))
+                self._logged_total = self["total"]
+        return deltas
+
     def _update_total(self, key, value):
         if self._store_total:
             if isinstance(value, dict):
@@ -135,10 +241,20 @@ class ProxyDictionary(dict):
             )
         for key, value in other.items():
             self._update_total(key, value)
+        # Logged as a single modification below
+        on_modified, self._on_modified = self._on_modified, None
         for key in other.keys():
             self[key] += other[key]
+        self._on_modified = on_modified
         if self._on_modified:
-            self._on_modified(self._name, self, *args, **kwargs)
+            numeric_keys = [key for key in other if isinstance(other[key], (int, float))]
+            deltas = self._changed(*[key for key in other if key not in numeric_keys])
+            if numeric_keys:
+                # Increments commute with the ones of other processes
+                deltas.append(("add", {key: other[key] for key in numeric_keys}))
+                if "total" in numeric_keys:
+                    self._logged_total = self["total"]
+            self._on_modified(self._name, self, deltas)
         return self
 
     def __setitem__(self, key, value):
@@ -148,13 +264,13 @@ class ProxyDictionary(dict):
         else:
             super().__setitem__(key, value)
         if self._on_modified:
-            self._on_modified(self._name, self)
+            self._on_modified(self._name, self, self._changed(key))
         return
 
     def __delitem__(self, key):
         super().__delitem__(key)
         if self._on_modified:
-            self._on_modified(self._name, self)
+            self._on_modified(self._name, self, [("delete", key)])
 
     def update(self, other, *args, **kwargs):
         """
@@ -164,15 +280,18 @@ class ProxyDictionary(dict):
             *args: Variable length argument list.
             **kwargs: Arbitrary keyword arguments.
         """
+        # Logged as a single modification below
+        on_modified, self._on_modified = self._on_modified, None
         for key, value in other.items():
             if key in self and isinstance(self[key], dict) and isinstance(value, dict):
                 self._update_total(key, value)
                 self._recursive_update(self[key], value)
             else:
                 self[key] = value
+        self._on_modified = on_modified
 
         if self._on_modified:
-            self._on_modified(self._name, self)
+            self._on_modified(self._name, self, self._changed(*other.keys()))
         return
 
     def _recursive_update(self, dictionary, update):
@@ -197,22 +316,24 @@ class ProxyList(list):
     """
 
     def __init__(self, name, initial=None, write_callback=None, *args, **kwargs):
-        self._on_modified = write_callback
         super().__init__(*args, **kwargs)
         self._name = name
         if initial is None:
             initial = []
-        self.extend(initial)
+        # Populating from the stored value is not a modification
+        super().extend(initial)
+        self._on_modified = write_callback
 
     def append(self, item):
         super().append(item)
         if self._on_modified:
-            self._on_modified(self._name, self)
+            self._on_modified(self._name, self, [("extend", [item])])
 
     def extend(self, items):
+        items = list(items)
         super().extend(items)
         if self._on_modified:
-            self._on_modified(self._name, self)
+            self._on_modified(self._name, self, [("extend", items)])
 
     def insert(self, index, item):
         super().insert(index, item)
@@ -262,10 +383,17 @@ class ListProperty:
                 instance._progress[self._name] = instance._read(self._name)
                 return ProxyList(name=self._name,
                                  initial=instance._progress.get(self._name, self._default),
-                                 write_callback=lambda n, x: self.__set__(instance, x))
+                                 write_callback=lambda n, x, deltas=None: self._store(
+                                     instance, x, deltas))
         else:
             return deepcopy(owner._originals.get(self._name, self._default))
 
+    def _store(self, instance, value, deltas: list = None):
+        if deltas is None:
+            self.__set__(instance, value)
+        else:
+            instance._write_deltas(self._name, deltas)
+
     def __set__(self, instance, value):
         if isinstance(value, ProxyList):
             value = list(value)
@@ -295,20 +423,28 @@ class DictionaryProperty(object):
             instance._progress[self._name] = instance._read(self._name)
             return ProxyDictionary(self._name,
                                    instance._progress.get(self._name, self._default),
-                                   write_callback=lambda n, x: self.__set__(instance, x),
+                                   write_callback=lambda n, x, deltas=None: self._store(
+                                       instance, x, deltas),
                                    store_total=self._store_total)
         elif owner is not None:
             return deepcopy(owner._originals.get(self._name, self._default))
 
+    def _store(self, instance, value: dict, deltas: list = None):
+        if deltas is None:
+            self.__set__(instance, value)
+        else:
+            instance._write_deltas(self._name, deltas)
+
     def __set__(self, instance, value: dict):
+        if isinstance(value, ProxyDictionary) and value._name == self._name \
+           and value._on_modified is not None:
+            # Augmented assignment, the modification has already been logged
+            return
         if isinstance(value, ProxyDictionary):
             value = dict(value)
         elif self._store_total:
-            value = dict(
-                ProxyDictionary(self._name,
-                                value,
-                                store_total=True,
-                                write_callback=self._write_callback))
+            # Only computes the totals, the value is written below
+            value = dict(ProxyDictionary(self._name, value, store_total=True))
         instance._progress[self._name] = value
         instance._write({self._name: value})
 
@@ -341,7 +477,6 @@ def storable(cls):
             *args: Variable length argument list.
             **kwargs: Arbitrary keyword arguments.
         """
-        self._lock = mp.Lock()
         self._progress = {}
         for name, original_value in cls._originals.items():
             setattr(cls, name, deepcopy(original_value))
@@ -357,20 +492,80 @@ def storable(cls):
             )
 
         self._path.parent.mkdir(exist_ok=True, parents=True)
+        self._log_path = Path(self._path.parent, f"{self._path.name}.log")
+        self._lock_path = Path(self._path.parent, f"{self._path.name}.lock")
+        self._lock_handle = None
+        self._lock_depth = 0
+        self._thread_lock = threading.RLock()
 
         self._save_frequency = kwargs.pop('save_frequency', 1)
+        self._max_log_size = kwargs.pop('max_log_size', 2**24)
         self._access_count = 0
+        self._pending = list()
+        self._log_offset = 0
+        self._log_header = None
 
         # Load or initialize progress
-        if Path(self._path.parent, f"{self._path.name}.dat").is_file():
-            self._progress = self._read()
-            self._wrap_attributes()
-        else:
-            self._wrap_attributes()
-            self._write(self._progress)
+        with self._file_lock():
+            if Path(self._path.parent, f"{self._path.name}.dat").is_file():
+                self._progress = self._read()
+                self._wrap_attributes()
+            else:
+                self._reset_log()
+                self._wrap_attributes()
+                # Anything logged while wrapping is part of the initial snapshot
+                self._pending = list()
+                self._access_count = 0
+                self._write_snapshot(self._progress)
+                self._reset_log()
+            self._on_reload()
 
         original_init(self, *args, **kwargs)
 
+    @contextmanager
+    def _file_lock(self):
+        """
+        Exclusive lock on the storage, shared by all processes, instances and threads. Reentrant.
+        """
+        # The thread lock guards the depth and handle, which are shared by the threads
+        with self._thread_lock:
+            if not self._lock_depth:
+                self._lock_handle = open(self._lock_path, "a+")
+                try:
+                    _lock_file(self._lock_handle)
+                except BaseException:
+                    self._lock_handle.close()
+                    self._lock_handle = None
+                    raise
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if not self._lock_depth:
+                    _unlock_file(self._lock_handle)
+                    self._lock_handle.close()
+                    self._lock_handle = None
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run several reads and modifications atomically with respect to other processes.
+
+        The progress is brought up to date on entry and the modifications are flushed on exit.
+
+        Examples:
+            >>> with tracker.transaction():
+            ...     if subject_id not in tracker.subjects:
+            ...         tracker.subjects.update({subject_id: stays})
+        """
+        with self._file_lock():
+            self._sync()
+            try:
+                yield self
+            finally:
+                self.flush()
+
     def _write(self, items: dict):
         """
         Write the current state of the progress to the file.
@@ -378,10 +573,80 @@ def storable(cls):
         Args:
             items (dict): The dictionary containing the progress items.
         """
-        if self._lock is not None:
-            self._lock.acquire()
+        for key, value in items.items():
+            # Make sure no Property types are written back
+            if isinstance(value, ProxyDictionary):
+                value = dict(value)
+            elif isinstance(value, ProxyList):
+                value = list(value)
+            self._pending.append(("set", key, _copy(value)))
+            self._on_record(key, "set", value)
+        self._maybe_flush()
+
+    def _write_deltas(self, name: str, deltas: list):
+        """
+        Log partial modifications of an attribute and apply them to the in memory progress.
+
+        Args:
+            name (str): The attribute name.
+            deltas (list): Pairs of operation and payload. Operations are extend (lists),
+                update, add or delete (dictionaries).
+        """
+        for operation, payload in deltas:
+            payload = _copy(payload)
+            _apply_record(self._progress, name, operation, payload)
+            self._on_record(name, operation, payload)
+            self._pending.append((operation, name, payload))
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        # Counts modifications rather than log records
         self._access_count += 1
+        if self._access_count >= self._save_frequency:
+            self.flush()
+
+    def flush(self):
+        """
+        Append the pending modifications to the log.
+        """
+        if not self._pending:
+            return
+        with self._file_lock():
+            # Entries of other processes precede the ones appended now
+            self._sync()
+            with open(self._log_path, "ab") as file:
+                file.write(pickle.dumps((self._log_token(), self._pending)))
+                self._log_offset = file.tell()
+            self._pending = list()
+            self._access_count = 0
+            # Bounds the replay cost of new instances in long runs
+            if self._log_offset > self._max_log_size:
+                self._compact()
+
+    def close(self):
+        """
+        Flush the pending modifications and compact the log into the snapshot.
+        """
+        with self._file_lock():
+            self.flush()
+            self._compact()
+
+    def _compact(self):
+        """
+        Fold the log into the snapshot. Requires the lock.
+        """
+        self._sync()
+        self._write_snapshot(self._progress)
+        self._on_compact()
+        self._reset_log()
+
+    def _log_token(self) -> tuple:
+        return (os.getpid(), id(self))
+
+    def _write_snapshot(self, items: dict):
         with shelve.open(str(self._path)) as db:
+            for key in set(db.keys()) - set(items.keys()):
+                del db[key]
             for key, value in items.items():
                 # Make sure no Property types are written back
                 if isinstance(value, ProxyDictionary):
@@ -390,19 +655,8 @@ def storable(cls):
                     db[key] = list(value)
                 else:
                     db[key] = value
-        if self._lock is not None:
-            self._lock.release()
-
-    def _read(self, key=None):
-        """
-        Read the progress from the file.
-
-        Returns:
-            dict: The progress dictionary.
-        """
-        if self._lock is not None:
-            self._lock.acquire()
 
+    def _read_snapshot(self) -> dict:
         with shelve.open(str(self._path)) as db:
 
             def _read_value(key):
@@ -416,25 +670,127 @@ def storable(cls):
                 else:
                     return value
 
-            if key is None:
-                ret = dict()
-                for key in db.keys():
-                    ret[key] = _read_value(key)
-            else:
-                ret = _read_value(key)
+            return {key: _read_value(key) for key in db.keys()}
+
+    def _reset_log(self):
+        # Replacing the file lets other instances notice the compaction by the inode
+        temporary_path = Path(self._log_path.parent, f"{self._log_path.name}.{os.getpid()}")
+        log_header = _log_header()
+        temporary_path.write_bytes(log_header)
+        os.replace(temporary_path, self._log_path)
+        self._log_header = log_header
+        self._log_offset = len(log_header)
+
+    def _sync(self):
+        """
+        Apply the log entries written by other instances since the last sync. Requires the lock.
+        """
+        try:
+            log_stat = os.stat(self._log_path)
+            with open(self._log_path, "rb") as file:
+                log_header = file.read(_LOG_HEADER_SIZE)
+        except FileNotFoundError:
+            log_stat = log_header = None
+        if log_stat is None or log_header != self._log_header \
+           or log_stat.st_size < self._log_offset:
+            # Log was compacted or never read, rebuild from the snapshot
+            self._progress = self._read_snapshot()
+            self._log_offset = 0
+            self._log_header = log_header
+            self._on_reload()
+            replay_own = True
+        else:
+            replay_own = False
+        if log_stat is None or log_stat.st_size == self._log_offset:
+            return
+
+        own_token = self._log_token()
+        with open(self._log_path, "rb") as file:
+            file.seek(self._log_offset)
+            while file.tell() < log_stat.st_size:
+                try:
+                    token, records = pickle.load(file)
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    # Torn tail of a writer that crashed while appending, records are only
+                    # appended under the lock so nothing follows it
+                    break
+                self._log_offset = file.tell()
+                if token == own_token and not replay_own:
+                    continue
+                for operation, name, payload in records:
+                    _apply_record(self._progress, name, operation, payload)
+                    self._on_record(name, operation, payload)
+        if self._log_offset < log_stat.st_size:
+            os.truncate(self._log_path, self._log_offset)
+        if replay_own:
+            for operation, name, payload in self._pending:
+                _apply_record(self._progress, name, operation, payload)
+                self._on_record(name, operation, payload)
 
-        if self._lock is not None:
-            self._lock.release()
+    def _read(self, key=None):
+        """
+        Read the progress from the file.
 
-        return ret
+        Returns:
+            dict: The progress dictionary.
+        """
+        with self._file_lock():
+            self._sync()
+            if key is None:
+                return _copy(self._progress)
+            return _copy(self._progress[key])
+
+    def __getstate__(self):
+        # Pending modifications would otherwise be written twice
+        self.flush()
+        state = self.__dict__.copy()
+        state["_lock_handle"] = None
+        state["_lock_depth"] = 0
+        state.pop("_thread_lock", None)
+        return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
+        self._thread_lock = threading.RLock()
         self._wrap_attributes()
 
+    # Hooks for classes deriving state from the progress, called with the file lock held
+    def _on_record(self, name: str, operation: str, payload: Any):
+        """
+        Called after a record has been applied to the in memory progress.
+        """
+
+    def _on_reload(self):
+        """
+        Called after the progress has been rebuilt from the snapshot.
+        """
+
+    def _on_compact(self):
+        """
+        Called after the progress has been written to the snapshot.
+        """
+
+    for name, hook in [("_on_record", _on_record), ("_on_reload", _on_reload),
+                       ("_on_compact", _on_compact)]:
+        if not hasattr(cls, name):
+            setattr(cls, name, hook)
+
+    cls.__getstate__ = __getstate__
     cls.__setstate__ = __setstate__
     cls.__init__ = __init__
+    cls._file_lock = _file_lock
+    cls.transaction = transaction
     cls._write = _write
+    cls._write_deltas = _write_deltas
+    cls._maybe_flush = _maybe_flush
+    cls.flush = flush
+    cls.close = close
+    cls._compact = _compact
+    cls._log_token = _log_token
+    cls._write_snapshot = _write_snapshot
+    cls._read_snapshot = _read_snapshot
+    cls._reset_log = _reset_log
+    cls._sync = _sync
     cls._read = _read
 
     # Attribute wrapping logic
@@ -448,7 +804,7 @@ def storable(cls):
                     attr is None) and not name.startswith("_"):
                 attr = self._progress.get(name, attr)
 
-                def _write_callback(name, value):
+                def _write_callback(name, value, deltas=None):
                     # Read before you _write like github
                     self._progress[name] = value
                     self._write({name: value})
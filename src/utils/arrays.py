@@ -46,13 +46,16 @@ def get_iterable_dtype(iterable: Iterable):
     return dtype
 
 
-def zeropad_samples(data: np.ndarray, length: int = None, axis: int = 0) -> np.ndarray:
+def zeropad_samples(data: np.ndarray,
+                    length: int = None,
+                    axis: int = 0,
+                    order: Iterable[int] = None) -> np.ndarray:
     """
     Pads each sample in a collection of arrays along a specified axis to a uniform length.
 
     If the arrays have varying lengths along the specified axis, this function pads them with
     zeros so that all arrays in the input `data` have the same length. The dtype of the input 
-    data is conserved.
+    data is conserved. The samples are written directly into a single preallocated array.
 
     Parameters
     ----------
@@ -63,6 +66,9 @@ def zeropad_samples(data: np.ndarray, length: int = None, axis: int = 0) -> np.n
         along the specified axis will be used as the target length.
     axis : int, optional
         The axis along which padding should be applied. Default is 0.
+    order : Iterable[int], optional
+        The order in which the samples are written into the output, e.g., a permutation to
+        shuffle the batch. Default is the order of `data`.
 
     Returns
     -------
@@ -76,19 +82,30 @@ def zeropad_samples(data: np.ndarray, length: int = None, axis: int = 0) -> np.n
     array([[[1., 2.]],
            [[3., 0.]]], dtype=float32)
     """
+    if order is None:
+        order = range(len(data))
     if length is None:
         length = max([x.shape[axis] for x in data])
     dtype = get_iterable_dtype(data)
-    ret = [np.concatenate([
-           x,
-           np.zeros(x.shape[:axis] + (length - x.shape[axis],) + x.shape[axis + 1:],\
-                dtype=dtype)
-           ],
-           axis=axis,
-           dtype=dtype) for x in data]
     if len(data[0].shape) == 3:
-        return np.concatenate(ret)
-    return np.atleast_3d(np.array(ret, dtype=dtype))
+        # Batches are padded and stacked along the sample axis
+        return np.concatenate([
+            np.concatenate([
+                data[index],
+                np.zeros(data[index].shape[:axis] + (length - data[index].shape[axis],) +
+                         data[index].shape[axis + 1:],
+                         dtype=dtype)
+            ],
+                           axis=axis,
+                           dtype=dtype) for index in order
+        ])
+
+    ret = np.zeros((len(data),) + data[0].shape[:axis] + (length,) + data[0].shape[axis + 1:],
+                   dtype=dtype)
+    for position, index in enumerate(order):
+        x = np.asarray(data[index])
+        ret[(position,) + tuple(slice(0, n) for n in x.shape)] = x
+    return np.atleast_3d(ret)
 
 
 def _transform_array(arr: np.ndarray, preserve_dtype=True):
@@ -1,15 +1,12 @@
 import numpy as np
 import pandas as pd
-import multiprocessing as mp
 from functools import lru_cache
-from copy import deepcopy
 from metrics import CustomBins, LogBins
 from utils.arrays import _transform_array
 from typing import List, Tuple, Union
 from datasets.trackers import PreprocessingTracker
-from pathos.multiprocessing import Pool, cpu_count
 
-__all__ = ["read_timeseries", "subjects_for_samples", "make_prediction_vector"]
+__all__ = ["read_timeseries", "prefix_ends", "subjects_for_samples", "make_prediction_vector"]
 
 def read_timeseries(
     X_df: pd.DataFrame,
@@ -33,6 +30,7 @@ def read_timeseries(
         The target dataframe or array containing the labels.
     row_only : bool, optional
         If True, return only the current sample row. If False, return the entire preceding data frame. Default is False.
+        For time sorted frames the preceding data is a view into the stay, not a copy.
     bining : str, optional
         The binning mode to apply to the labels. Options are 'none', 'custom', or 'log'. Default is 'none'.
     one_hot : bool, optional
@@ -57,25 +55,34 @@ def read_timeseries(
     >>> len(Xs), len(ys), len(ts)
     (10, 10, 10)
     """
-    if bining == "log":
-        y_df = y_df.apply(lambda x: LogBins.get_bin_log(x, one_hot=one_hot))
-        if not isinstance(y_df, pd.DataFrame):
-            y_df = y_df.to_frame()
-    elif bining == "custom":
-        y_df = y_df.apply(lambda x: CustomBins.get_bin_custom(x, one_hot=one_hot), axis=1)
-        if not isinstance(y_df, pd.DataFrame):
-            y_df = y_df.to_frame()
+    if bining in ["log", "custom"]:
+        # The labels of the stay are binned at once, one hot bins replace the label column
+        if bining == "log":
+            y = LogBins.get_bins_log(y_df.values, one_hot=one_hot)
+        else:
+            y = CustomBins.get_bins_custom(y_df.values, one_hot=one_hot)
+        if one_hot:
+            y = y.reshape(len(y_df), -1)
+        y_df = pd.DataFrame(y, index=y_df.index, columns=None if one_hot else y_df.columns)
 
     if row_only:
         Xs = [
             X_df.loc[timestamp].values if dtype in [np.ndarray, np.array] else X_df.loc[timestamp]
             for timestamp in y_df.index
         ]
-    else:
+    elif not X_df.index.is_monotonic_increasing:
         Xs = [
             X_df.loc[:timestamp].values if dtype in [np.ndarray, np.array] else X_df.loc[:timestamp]
             for timestamp in y_df.index
         ]
+    else:
+        # Prefixes are views into the stay, padding only happens once the batch is assembled
+        ends = prefix_ends(X_df.index.values, y_df.index.values)
+        if dtype in [np.ndarray, np.array]:
+            values = X_df.values
+            Xs = [values[:end] for end in ends]
+        else:
+            Xs = [X_df.iloc[:end] for end in ends]
 
     ys = _transform_array(y_df.values, preserve_dtype=preserve_dtype)
     ts = _transform_array(y_df.index.values, preserve_dtype=preserve_dtype)
@@ -84,11 +91,37 @@ def read_timeseries(
     return Xs, ys, ts
 
 
+def prefix_ends(timestamps: np.ndarray, label_timestamps: np.ndarray) -> np.ndarray:
+    """
+    Returns for each label time stamp the end index of the sample rows up to and including it, so
+    that the sample of a label is the view `values[:end]` of the stay array.
+
+    Parameters
+    ----------
+    timestamps : np.ndarray
+        The sorted time stamps of the sample rows.
+    label_timestamps : np.ndarray
+        The time stamps of the labels.
+
+    Returns
+    -------
+    np.ndarray
+        The exclusive end index of each label sample.
+
+    Examples
+    --------
+    >>> prefix_ends(np.array([0., 1., 2., 3.]), np.array([1., 3.]))
+    array([2, 4])
+    """
+    return np.searchsorted(timestamps, label_timestamps, side="right")
+
+
 @lru_cache(maxsize=2048)  # People will probably use similar sizes
 def subjects_for_samples(tracker: PreprocessingTracker,
                          target_size: int,
                          max_iter: int = 20,
-                         deep_supervision: bool = False) -> Tuple[List[float], int]:
+                         deep_supervision: bool = False,
+                         seed: int = 42) -> Tuple[List[float], int]:
     """
     Selects subjects to match the target number of samples using the sample per subject counts of the 
     provided tracker.
@@ -100,9 +133,11 @@ def subjects_for_samples(tracker: PreprocessingTracker,
     target_size : int
         The target number of samples to be matched.
     max_iter : int, optional
-        The maximum number of iterations to try in the multiprocessing pool. Default is 20.
+        The maximum number of random orders to try if the target is not hit exactly. Default is 20.
     deep_supervision : bool, optional
-        If True, groups subjects by both subject ID and stay ID for deeper supervision. Default is False.
+        If True, counts the stays of each subject instead of the samples. Default is False.
+    seed : int, optional
+        Seed of the random subject orders. Default is 42.
 
     Returns
     -------
@@ -113,7 +148,10 @@ def subjects_for_samples(tracker: PreprocessingTracker,
 
     Notes
     -----
-    - The function leverages multiprocessing to explore different random selections of subjects.
+    - Each try takes the longest prefix of a shuffled subject order that stays within the target
+      and fills the remaining gap exactly where possible with a small knapsack over subjects
+      outside the prefix. The selection never exceeds the target, unless every subject does, in
+      which case the smallest subject is returned.
 
     Examples
     --------
@@ -123,85 +161,69 @@ def subjects_for_samples(tracker: PreprocessingTracker,
     [1234, 2345, 3456, 4567], 1000
     """
     assert tracker.subject_ids
-    # Init tracking vars
-    best_diff = float('inf')
-    iteration = 0
-
-    # Init subject counts
     if deep_supervision:
-        index_tuples = [(outer_key, inner_key, value)
-                        for outer_key, inner_dict in deepcopy(dict(tracker.subjects)).items()
-                        if not outer_key == "total" for inner_key, value in inner_dict.items()]
-        index = pd.MultiIndex.from_tuples(index_tuples, names=['subject_id', 'stay_id', 'values'])
-        df = pd.DataFrame(index=index)
-        df['value'] = df.index.get_level_values(2)
-        df = df.droplevel(2).sort_index()
-        df = df.drop(df.index[df.index.get_level_values('stay_id') == 'total'])
-        # Now, group by the first index level and count entries
-        subject_df = df.groupby(level='subject_id').size()
+        # Each stay is a single sample with deep supervision
+        subject_ids, counts = tracker.subject_stays()
     else:
-        subject_df = pd.DataFrame(deepcopy(dict(tracker.subjects))).T["total"]
-        subject_df = subject_df.drop("total")
-
-    def compute_samples(random_state):
-        np.random.seed(random_state)
-        current_size = 0
-        remaining_subjects = subjects_df_pr
-        subjects = []
-
-        while current_size < target_size_pr and len(remaining_subjects):
-            remaining_subjects = remaining_subjects[remaining_subjects <= target_size_pr -
-                                                    current_size]
-            if remaining_subjects.empty:
-                break
-            next_subject = np.random.choice(remaining_subjects.index)
-            with lock_pr:
-                subject_samples = remaining_subjects.loc[next_subject]
-
-            current_size += subject_samples
-            subjects.append(next_subject)
-            remaining_subjects = remaining_subjects.drop(next_subject)
-
-        diff = abs(target_size_pr - current_size)
-        return diff, current_size, subjects
-
-    # MP global vares
-    def init(subject_df: pd.DataFrame, target_size: int, tracker: PreprocessingTracker,
-             lock: mp.Lock):
-        global subjects_df_pr, target_size_pr, tracker_pr, lock_pr
-        subjects_df_pr = subject_df
-        target_size_pr = target_size
-        tracker_pr = tracker
-        lock_pr = lock
-
-    # Mp lock
-    lock = mp.Lock()
-    # Mp count
-    n_cpus = cpu_count() - 1
-    # Mp Pool
-    with Pool(n_cpus, initializer=init, initargs=(subject_df, target_size, tracker, lock)) as pool:
-        # Try max_iter times and fetch best result
-        res = pool.imap_unordered(compute_samples,
-                                  range(max_iter),
-                                  chunksize=int(np.ceil(max_iter / n_cpus)))
-
-        for diff, current_size, subjects in res:
-            iteration += 1
-            # Fetch best result
-            if diff < best_diff:
-                best_subjects, best_size, best_diff = subjects, current_size, diff
-
-            # Break if no diff
-            if best_diff == 0 or iteration >= max_iter:
-                break
-        pool.close()
-        pool.join()
-
-    # Always get smallest best, so if no best found target size is too small
-    if not best_subjects:
-        return subject_df.min(), subject_df.argmin()
-
-    return best_subjects, best_size
+        subject_ids, counts = tracker.subject_counts()
+
+    if counts.sum() <= target_size:
+        return subject_ids.tolist(), int(counts.sum())
+    if counts.min() > target_size:
+        # Always get smallest best, so if no best found target size is too small
+        return [subject_ids[counts.argmin()].item()], int(counts.min())
+
+    generator = np.random.default_rng(seed)
+    best_selection, best_size = None, -1
+    for _ in range(max(max_iter, 1)):
+        order = generator.permutation(len(counts))
+        cumulative_counts = np.cumsum(counts[order])
+        n_prefix = np.searchsorted(cumulative_counts, target_size, side="right")
+        size = int(cumulative_counts[n_prefix - 1]) if n_prefix else 0
+        selection = order[:n_prefix]
+
+        residual = target_size - size
+        if residual:
+            remainder = order[n_prefix:]
+            remainder = remainder[counts[remainder] <= residual]
+            fill_up = _subset_sum(counts[remainder], residual)
+            selection = np.concatenate([selection, remainder[fill_up]])
+            size += int(counts[remainder[fill_up]].sum())
+
+        if size > best_size:
+            best_selection, best_size = selection, size
+        if best_size == target_size:
+            break
+
+    return subject_ids[best_selection].tolist(), best_size
+
+
+def _subset_sum(counts: np.ndarray, target: int, max_cells: int = 2**24) -> np.ndarray:
+    """
+    Indices of a subset of counts with the largest sum not exceeding the target.
+
+    Only the leading counts are considered, bounded by the size of the reachability table.
+    """
+    n_candidates = min(len(counts), max(max_cells // (target + 1), 1))
+    counts = counts[:n_candidates]
+    reachable = np.zeros((n_candidates + 1, target + 1), dtype=bool)
+    reachable[0, 0] = True
+    for index, count in enumerate(counts):
+        reachable[index + 1] = reachable[index]
+        if count:
+            reachable[index + 1, count:] |= reachable[index, :-count]
+        if reachable[index + 1, target]:
+            # Exact hit, ignore the remaining counts
+            reachable = reachable[:index + 2]
+            break
+
+    remaining = int(np.flatnonzero(reachable[-1])[-1])
+    selection = list()
+    for index in range(len(reachable) - 1, 0, -1):
+        if not reachable[index - 1, remaining]:
+            selection.append(index - 1)
+            remaining -= counts[index - 1]
+    return np.array(selection[::-1], dtype=np.int64)
 
 
 def make_prediction_vector(model, generator, batches=20, bin_averages=None):
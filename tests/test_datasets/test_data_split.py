@@ -10,12 +10,15 @@ import random
 import pandas as pd
 import numpy as np
 from typing import List, Dict
+from itertools import chain
 from pathlib import Path
 from utils.IO import *
 from tests.tsettings import *
 from datasets.readers import ProcessedSetReader, SplitSetReader
 from pathlib import Path
 from datasets.trackers import PreprocessingTracker
+from datasets.split.splitters import ReaderSplitter
+from datasets.split.demographics import SubjectInfoTable
 from tests.pytest_utils.decorators import retry
 from utils.jsons import dict_subset
 from utils.numeric import is_numerical
@@ -404,6 +407,105 @@ def test_train_size(task_name, reader_flavour, discretized_readers: Dict[str, Pr
         tests_io(f"All splits have invalid sets for {attribute}!")
 
 
+def test_ratio_engine():
+    tests_io("Test case ratio engine of the splitter", level=0)
+    generator = np.random.default_rng(42)
+    sample_counts = {
+        subject_id: {
+            "total": int(count)
+        } for subject_id, count in enumerate(generator.integers(1, 200, 20000))
+    }
+    subject_ids = list(sample_counts.keys())
+    total_samples = sum(counts["total"] for counts in sample_counts.values())
+    splitter = ReaderSplitter(tolerance=1e-3)
+
+    subjects, ratios = splitter._split_by_ratio(subject_ids, sample_counts, 0.2, 0.1)
+    assert not set(subjects["test"]) & set(subjects["val"])
+    assert not (set(subjects["test"]) | set(subjects["val"])) & set(subjects["train"])
+    assert set(chain.from_iterable(subjects.values())) == set(subject_ids)
+    split_samples = {
+        set_name: sum(sample_counts[subject_id]["total"] for subject_id in split_subjects)
+        for set_name, split_subjects in subjects.items()
+    }
+    check_split_sizes(split_samples, 0.2, 0.1, 1e-3)
+    assert abs(ratios["test"] - split_samples["test"] / total_samples) < 1e-9
+    tests_io("Succeeded testing ratio split.")
+
+    # Reproducible for the same seed
+    subjects_repeated, _ = ReaderSplitter(tolerance=1e-3)._split_by_ratio(
+        subject_ids, sample_counts, 0.2, 0.1)
+    assert subjects_repeated["test"] == subjects["test"]
+    subjects_other, _ = ReaderSplitter(tolerance=1e-3, seed=1)._split_by_ratio(
+        subject_ids, sample_counts, 0.2, 0.1)
+    assert subjects_other["test"] != subjects["test"]
+    tests_io("Succeeded testing seeded ratio split.")
+
+    class StratifiedSplitter(ReaderSplitter):
+
+        def _get_strata(self, subject_ids):
+            return {subject_id: subject_id % 3 for subject_id in subject_ids}
+
+    subjects, _ = StratifiedSplitter(tolerance=1e-3)._split_by_ratio(subject_ids, sample_counts,
+                                                                     0.2)
+    for stratum in range(3):
+        stratum_samples = {
+            set_name: sum(sample_counts[subject_id]["total"]
+                          for subject_id in split_subjects
+                          if subject_id % 3 == stratum)
+            for set_name, split_subjects in subjects.items()
+        }
+        stratum_total = sum(stratum_samples.values())
+        assert abs(stratum_samples["test"] / stratum_total - 0.2) < 1e-2
+    tests_io("Succeeded testing stratified ratio split.")
+
+
+def test_subject_info_table():
+    tests_io("Test case subject info table", level=0)
+    generator = np.random.default_rng(42)
+    n_rows = 2000
+    subject_info_df = pd.DataFrame({
+        "SUBJECT_ID": generator.integers(10000, 10800, n_rows),
+        "ICUSTAY_ID": np.arange(n_rows),
+        "AGE": np.where(generator.random(n_rows) < 0.05, np.nan, generator.uniform(16, 90,
+                                                                                 n_rows)),
+        "INSURANCE": generator.choice(["Medicare", "Private", "Medicaid", None], n_rows),
+    })
+    TEMP_DIR.mkdir(parents=True, exist_ok=True)
+    subject_info_df.to_csv(Path(TEMP_DIR, "subject_info.csv"), index=False)
+    subject_info_df = pd.read_csv(Path(TEMP_DIR, "subject_info.csv"))
+    table = SubjectInfoTable.from_root(TEMP_DIR)
+    assert SubjectInfoTable.from_root(TEMP_DIR) is table
+
+    def reference_subjects(condition: pd.Series):
+        return set(subject_info_df[condition]["SUBJECT_ID"])
+
+    rows = table.rows_in_range("AGE", geq=30, less=60)
+    assert set(table.to_ids(table.subjects_for(rows))) == reference_subjects(
+        (subject_info_df["AGE"] >= 30) & (subject_info_df["AGE"] < 60))
+    rows = table.rows_in_choice("INSURANCE", ["Private", np.nan])
+    assert set(table.to_ids(table.subjects_for(rows))) == reference_subjects(
+        subject_info_df["INSURANCE"].isin(["Private", np.nan]))
+    tests_io("Succeeded testing row predicates.")
+
+    # Demographic filter only keeps subjects where all stays fulfill the settings
+    subject_ids = subject_info_df["SUBJECT_ID"].unique().tolist()[:500]
+    settings = {"AGE": {"geq": 40, "less": 70}, "INSURANCE": {"choice": ["Medicare", "Private"]}}
+    filtered = ReaderSplitter()._get_demographics(None, TEMP_DIR, subject_ids, settings)
+    restricted_df = subject_info_df[subject_info_df["SUBJECT_ID"].isin(subject_ids)]
+    fulfilled = (restricted_df["AGE"].isna() | ((restricted_df["AGE"] >= 40) &
+                                                (restricted_df["AGE"] < 70))) & \
+                restricted_df["INSURANCE"].isin(["Medicare", "Private"])
+    expected = set(restricted_df["SUBJECT_ID"]) - set(restricted_df[~fulfilled]["SUBJECT_ID"])
+    assert set(filtered) == expected
+    tests_io("Succeeded testing demographic filter.")
+
+    # Modified files are parsed again
+    subject_info_df.iloc[:10].to_csv(Path(TEMP_DIR, "subject_info.csv"), index=False)
+    assert len(SubjectInfoTable.from_root(TEMP_DIR).subject_ids) == \
+           subject_info_df.iloc[:10]["SUBJECT_ID"].nunique()
+    tests_io("Succeeded testing subject info table.")
+
+
 def sample_categorical_filter(attribute: str, attribute_sr: pd.Series, val_set: bool = False):
     # Randomly choose half of the possible categories
     categories = attribute_sr.unique()
@@ -654,6 +756,10 @@ if __name__ == "__main__":
     if TEMP_DIR.is_dir():
         shutil.rmtree(TEMP_DIR)
     # Ratio reduction only works well when there are enough samples in the set
+    test_ratio_engine()
+    test_subject_info_table()
+    if TEMP_DIR.is_dir():
+        shutil.rmtree(TEMP_DIR)
     for task_name in ["DECOMP"]:
         reader = datasets.load_data(chunksize=75836,
                                     source_path=TEST_DATA_DEMO,
@@ -8,7 +8,9 @@ from pathlib import Path
 from datasets.readers import ProcessedSetReader
 from tests.pytest_utils.general import assert_file_creation
 from tests.pytest_utils.discretization import assert_strategy_equals, prepare_processed_data
-from datasets.processors.discretizers import MIMICDiscretizer
+from datasets.processors import AbstractProcessor
+from datasets.processors.discretizers import MIMICDiscretizer, MIMICMultiDiscretizer
+from pathos.multiprocessing import Pool
 from utils.IO import *
 from tests.pytest_utils import copy_dataset
 from tests.tsettings import *
@@ -220,6 +222,73 @@ def test_discretizer_state_persistence():
     tests_io("Succeeded in testing state persistent")
 
 
+def test_multi_discretizer():
+    tests_io("Testing multi variant discretizer", level=0)
+    task_name = "IHM"
+    copy_dataset("extracted")
+    copy_dataset(Path("processed", task_name))
+    proc_reader = ProcessedSetReader(root_path=Path(TEMP_DIR, "processed", task_name))
+    variants = [(1.0, "previous"), (1.0, "zero"), (2.0, "next")]
+
+    multi_discretizer = MIMICMultiDiscretizer(task=task_name,
+                                              variants=variants,
+                                              storage_path=Path(TEMP_DIR, "discretized",
+                                                                task_name),
+                                              verbose=True)
+    readers = multi_discretizer.transform_reader(reader=proc_reader)
+    assert set(readers) == set(variants)
+
+    for (time_step_size, impute_strategy), reader in readers.items():
+        tests_io(f"Comparing variant time_step_size={time_step_size}, "
+                 f"impute_strategy={impute_strategy}")
+        assert reader.root_path == MIMICMultiDiscretizer.variant_path(
+            Path(TEMP_DIR, "discretized", task_name), time_step_size, impute_strategy)
+        discretizer = MIMICDiscretizer(task=task_name,
+                                       storage_path=Path(TEMP_DIR, "single",
+                                                         f"{impute_strategy}_{time_step_size}"),
+                                       time_step_size=time_step_size,
+                                       impute_strategy=impute_strategy)
+        single_reader = discretizer.transform_reader(reader=proc_reader)
+        X_multi = reader.read_samples(read_ids=True)["X"]
+        X_single = single_reader.read_samples(read_ids=True)["X"]
+        assert set(X_multi) == set(X_single)
+        for subject_id in X_single:
+            for stay_id in X_single[subject_id]:
+                assert X_multi[subject_id][stay_id].equals(X_single[subject_id][stay_id])
+
+    # All variants are tracked as finished
+    multi_discretizer = MIMICMultiDiscretizer(task=task_name,
+                                              variants=variants,
+                                              storage_path=Path(TEMP_DIR, "discretized",
+                                                                task_name))
+    assert all(discretizer.tracker.is_finished
+               for discretizer in multi_discretizer.discretizers.values())
+    tests_io("Succeeded in testing multi variant discretizer")
+
+
+def test_imap_subjects():
+    tests_io("Testing subject replacement of the processor pool", level=0)
+
+    def process_subject(subject_id: int):
+        # Odd subjects can't be transformed
+        return subject_id, (dict() if subject_id % 2 else {subject_id: 1})
+
+    with Pool(2) as pool:
+        # Failed subjects are replaced while replacements are left
+        replacements = [11, 12]
+        results = dict(
+            AbstractProcessor._imap_subjects(pool,
+                                             process_subject, [1, 2, 3, 4],
+                                             replacements=replacements))
+        # The replacement 11 fails as well and is yielded, since none are left
+        assert set(results) == {2, 4, 11, 12}
+        assert not results[11] and not replacements
+        # Without replacements every subject is yielded
+        results = dict(AbstractProcessor._imap_subjects(pool, process_subject, [1, 2, 3]))
+        assert set(results) == {1, 2, 3}
+    tests_io("Succeeded in testing subject replacement")
+
+
 if __name__ == "__main__":
     from tests.pytest_utils.discretization import prepare_discretizer_listfiles
     listfiles = prepare_discretizer_listfiles(list(set(TASK_NAMES) - set(["MULTI"])))
@@ -248,6 +317,8 @@ if __name__ == "__main__":
 
         if task_name == "DECOMP":
             test_discretizer_state_persistence()
+        if task_name == "IHM":
+            test_multi_discretizer()
 
         readers[task_name] = reader
         for start_strategy in ["zero", "relative"]:
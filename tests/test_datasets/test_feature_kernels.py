@@ -0,0 +1,142 @@
+import pytest
+import os
+import json
+import numpy as np
+from scipy.stats import skew
+from datasets.processors.feature_kernels import engineer_features, range_statistics, HAS_NUMBA, \
+    _prefix_statistics
+from tests.tsettings import *
+from utils.IO import *
+from pathlib import Path
+
+USE_NUMBA = [False, True] if HAS_NUMBA else [False]
+
+
+def naive_statistics(data: np.ndarray):
+    # Reference implementation equivalent to the original per window feature engineering
+    if not len(data):
+        return np.full(6, np.nan)
+    return np.array([
+        data.min(),
+        data.max(),
+        data.mean(),
+        data.std(),
+        skew(data) if len(data) > 1 and not (data == data[0]).all() else np.nan,
+        len(data)
+    ])
+
+
+def naive_features(values: np.ndarray, timestamps: np.ndarray, cut_points: np.ndarray,
+                   sampler_combinations: list):
+    features = list()
+    for cut_point in cut_points:
+        sample = list()
+        for channel in values[timestamps < cut_point + 1e-6].T:
+            channel_times = timestamps[:len(channel)][~np.isnan(channel)]
+            channel = channel[~np.isnan(channel)]
+            for sampler_function, percentage in sampler_combinations:
+                if not len(channel):
+                    sample.append(np.full(6, np.nan))
+                    continue
+                start_t, end_t = channel_times[0], channel_times[-1]
+                if sampler_function == "first_percentage":
+                    end_t = start_t + (end_t - start_t) * percentage / 100.0
+                else:
+                    start_t = end_t - (end_t - start_t) * percentage / 100.0
+                mask = (channel_times < end_t + 1e-6) & (channel_times > start_t - 1e-6)
+                sample.append(naive_statistics(channel[mask]))
+        features.append(np.concatenate(sample))
+    return np.array(features, dtype=np.float32)
+
+
+@pytest.mark.parametrize("use_numba", USE_NUMBA)
+def test_range_statistics(use_numba: bool):
+    tests_io(f"Test case range statistics with numba={use_numba}", level=0)
+    generator = np.random.default_rng(42)
+    # Includes constant and symmetric windows, which are prone to cancellation
+    values = np.concatenate(
+        [generator.normal(100, 20, 200),
+         np.full(10, 7.),
+         np.tile([1., 3.], 10),
+         generator.integers(0, 3, 50).astype(float)])
+    lower = generator.integers(0, len(values), 500)
+    upper = np.minimum(lower + generator.integers(0, 60, 500), len(values))
+
+    statistics = range_statistics(values, lower, upper, use_numba=use_numba)
+    expected = np.stack([naive_statistics(values[start:end]) for start, end in zip(lower, upper)])
+    assert np.allclose(statistics.astype(np.float32), expected.astype(np.float32), equal_nan=True)
+    tests_io("Succeeded in testing range statistics")
+
+
+def test_prefix_statistics():
+    tests_io("Test case prefix statistics", level=0)
+    generator = np.random.default_rng(42)
+    for n_values in [1, 2, 7, 64, 100]:
+        values = generator.normal(100, 20, n_values)
+        power_sums, min_table, max_table = _prefix_statistics(values)
+
+        # Power sums of the mean shifted values, starting with an empty prefix
+        shifted_values = values - values.mean()
+        assert power_sums.shape == (4, n_values + 1)
+        assert np.all(power_sums[:, 0] == 0)
+        for power_index, powers in enumerate(
+            [shifted_values, shifted_values**2, shifted_values**3,
+             np.abs(shifted_values)**3]):
+            assert np.allclose(power_sums[power_index, 1:], np.cumsum(powers))
+
+        # Level k of the sparse tables holds the extrema of the 2**k values from each index
+        assert len(min_table) == len(max_table) == int(np.log2(n_values)) + 1
+        for level in range(len(min_table)):
+            width = 1 << level
+            for start in range(n_values - width + 1):
+                assert min_table[level, start] == values[start:start + width].min()
+                assert max_table[level, start] == values[start:start + width].max()
+    tests_io("Succeeded in testing prefix statistics")
+
+
+@pytest.mark.parametrize("use_numba", USE_NUMBA)
+def test_range_statistics_edge_cases(use_numba: bool):
+    tests_io(f"Test case range statistics edge cases with numba={use_numba}", level=0)
+    generator = np.random.default_rng(42)
+    # Large offsets with small spread, where the power sums cancel the most
+    values = np.concatenate([1e6 + generator.normal(0, 1e-2, 100), generator.normal(0, 1, 20)])
+    lower = np.array([0, 5, 10, 99, 100, 0, 50, 119, 30])
+    upper = np.array([0, 6, 100, 101, 120, 120, 50, 120, 90])
+
+    statistics = range_statistics(values, lower, upper, use_numba=use_numba)
+    expected = np.stack([naive_statistics(values[start:end]) for start, end in zip(lower, upper)])
+    assert np.allclose(statistics.astype(np.float32), expected.astype(np.float32), equal_nan=True)
+    # Empty ranges and channels have no statistics
+    assert np.all(np.isnan(statistics[[0, 6]]))
+    assert np.all(np.isnan(range_statistics(np.array([]), [0], [0], use_numba=use_numba)))
+    tests_io("Succeeded in testing range statistics edge cases")
+
+
+@pytest.mark.parametrize("use_numba", USE_NUMBA)
+def test_engineer_features(use_numba: bool):
+    tests_io(f"Test case engineer features with numba={use_numba}", level=0)
+    with open(Path(os.getenv("CONFIG"), "engineering_config.json")) as file:
+        sampler_combinations = json.load(file)["sampler_combinations"]
+    generator = np.random.default_rng(42)
+    timestamps = np.sort(generator.choice(np.arange(0, 100, 0.25), 80, replace=False))
+    values = np.round(generator.normal(50, 10, (80, 3)), 1)
+    values[generator.random(values.shape) < 0.5] = np.nan
+    cut_points = np.sort(generator.uniform(-2, 110, 30))
+
+    features = engineer_features(values,
+                                 timestamps,
+                                 cut_points,
+                                 sampler_combinations,
+                                 use_numba=use_numba)
+    expected = naive_features(values, timestamps, cut_points, sampler_combinations)
+    assert features.shape == (len(cut_points), 3 * len(sampler_combinations) * 6)
+    assert np.allclose(features, expected, equal_nan=True)
+    tests_io("Succeeded in testing engineer features")
+
+
+if __name__ == "__main__":
+    test_prefix_statistics()
+    for use_numba in USE_NUMBA:
+        test_range_statistics(use_numba)
+        test_range_statistics_edge_cases(use_numba)
+        test_engineer_features(use_numba)
@@ -9,7 +9,9 @@ from settings import *
 from typing import Dict
 from preprocessing.imputers import PartialImputer
 from preprocessing.scalers import MinMaxScaler
-from datasets.readers import ProcessedSetReader
+from pathlib import Path
+from datasets.readers import ProcessedSetReader, SampleStoreReader
+from datasets.writers import SampleStoreWriter
 from datasets.mimic_utils import upper_case_column_names
 
 LABEL_COLS = {
@@ -733,6 +735,76 @@ def check_numpy(X_sample: pd.DataFrame, Y_sample: pd.DataFrame, t_sample: pd.Dat
     assert Y_sample.shape[1] == len(LABEL_COLS[task_name])
 
 
+@pytest.mark.parametrize("task_name", set(TASK_NAMES) - set(["MULTI"]))
+def test_read_sample_store(task_name: str, engineered_readers: Dict[str, ProcessedSetReader]):
+    tests_io(f"Test case read sample store for task {task_name}", level=0)
+    reader = engineered_readers[task_name]
+    dataset = reader.read_sample_store()
+    assert isinstance(dataset["X"], np.memmap)
+    assert dataset["X"].dtype == np.float32
+    assert len(dataset["X"]) == len(dataset["y"]) == len(dataset["t"]) \
+           == len(dataset["subject_ids"]) == len(dataset["stay_ids"])
+    assert set(dataset["subject_ids"]) == set(reader.subject_ids)
+
+    # Compare against the per subject files
+    samples = reader.read_samples(read_ids=True)
+    n_samples = 0
+    for subject_id, stays in samples["X"].items():
+        for stay_id, X_stay in stays.items():
+            mask = (dataset["subject_ids"] == subject_id) & (dataset["stay_ids"] == stay_id)
+            assert np.allclose(np.asarray(X_stay, dtype=np.float32),
+                               dataset["X"][mask],
+                               equal_nan=True)
+            n_samples += len(X_stay)
+    assert n_samples == len(dataset["X"])
+    tests_io(f"Succeeded testing read sample store for task {task_name}")
+
+    subject_ids = reader.subject_ids[:2]
+    dataset = ProcessedSetReader(reader.root_path, subject_ids=subject_ids).read_sample_store()
+    assert set(dataset["subject_ids"]) == set(subject_ids)
+    tests_io(f"Succeeded testing read sample store with subject ids for task {task_name}")
+
+
+def test_sample_store_interrupted_append(tmp_path: Path):
+    tests_io("Test case sample store interrupted append", level=0)
+    store_path = Path(tmp_path, "sample_store")
+    generator = np.random.default_rng(42)
+
+    def subject_samples(subject_id: int, n_samples: int):
+        stay_id = subject_id * 10
+        X = {subject_id: {stay_id: generator.random((n_samples, 3))}}
+        y = {subject_id: {stay_id: generator.random((n_samples, 1))}}
+        t = {subject_id: {stay_id: np.arange(n_samples, dtype=float)}}
+        return X, y, t
+
+    writer = SampleStoreWriter(store_path)
+    X, y, t = subject_samples(1, 4)
+    assert writer.write(X, y, t) == 4
+
+    # Simulate a crash after the features of the next append reached the disk
+    with open(Path(store_path, "X.bin"), "ab") as file:
+        file.write(np.ones((5, 3), dtype=np.float32).tobytes())
+    assert SampleStoreReader(store_path).n_samples == 4
+
+    # A fresh writer overwrites the uncommitted rows and skips the stored subject
+    writer = SampleStoreWriter(store_path)
+    X_new, y_new, t_new = subject_samples(2, 2)
+    X.update(X_new)
+    y.update(y_new)
+    t.update(t_new)
+    assert writer.write(X, y, t) == 2
+    assert writer.write(X, y, t) == 0
+
+    dataset = SampleStoreReader(store_path).read()
+    assert len(dataset["X"]) == len(dataset["subject_ids"]) == 6
+    for subject_id in [1, 2]:
+        mask = dataset["subject_ids"] == subject_id
+        assert np.allclose(dataset["X"][mask], X[subject_id][subject_id * 10])
+        assert np.all(dataset["stay_ids"][mask] == subject_id * 10)
+    assert Path(store_path, "X.bin").stat().st_size == 6 * 3 * 4
+    tests_io("Succeeded testing sample store interrupted append")
+
+
 if __name__ == "__main__":
     import shutil
     # if SEMITEMP_DIR.is_dir():
@@ -1,7 +1,9 @@
 # TODO! subject ids may be string or numbers this might have some effect on the tracker
 import shutil
+import numpy as np
 from pathlib import Path
 from datasets.trackers import PreprocessingTracker
+from utils.timeseries import subjects_for_samples
 from utils.IO import *
 from tests.tsettings import *
 
@@ -428,6 +430,96 @@ def test_subject_ids_option():
     tests_io("Succeeded testing falsey subject_ids.")
 
 
+def test_sample_index():
+    tests_io("Test case sample index of PreprocessingTracker.", level=0)
+    tracker = PreprocessingTracker(storage_path=Path(TEMP_DIR, "progress"))
+    observer = PreprocessingTracker(storage_path=Path(TEMP_DIR, "progress"))
+    tracker.subjects.update({10: {100: 3, 101: 2}, 11: {110: 4}})
+    tracker.subjects.update({12: {120: 1, 121: 1, 122: 1}})
+
+    index = observer.sample_index
+    assert index["subject_ids"].tolist() == [10, 11, 12]
+    assert index["subject_samples"].tolist() == [5, 4, 3]
+    assert index["subject_stays"].tolist() == [2, 1, 3]
+    assert index["stay_ids"].tolist() == [100, 101, 110, 120, 121, 122]
+    assert index["stay_subject_ids"].tolist() == [10, 10, 11, 12, 12, 12]
+    assert observer.samples == tracker.subjects["total"] == 12
+    assert observer.stay_ids == [100, 101, 110, 120, 121, 122]
+    tests_io("Succeeded testing incremental index.")
+
+    subject_ids, counts = tracker.subject_counts([12, 10, 13])
+    assert subject_ids.tolist() == [10, 12]
+    assert counts.tolist() == [5, 3]
+    _, counts = tracker.subject_stays([12, 10])
+    assert counts.tolist() == [2, 3]
+    tests_io("Succeeded testing subject counts.")
+
+    # Overwriting a subject replaces its rows
+    sample_index = observer._sample_index
+    tracker.subjects.update({11: {110: 4, 111: 6}})
+    assert observer.subject_counts([11])[1].tolist() == [10]
+    assert observer.samples == 18
+    tracker.subjects.update({10: {100: 1, 101: 2}, 13: {130: 7}})
+    assert observer.subject_counts([10, 13])[1].tolist() == [3, 7]
+    # Records are applied to the index instead of rebuilding it
+    assert observer._sample_index is sample_index
+    del tracker.subjects[13]
+    index = observer.sample_index
+    assert index["subject_ids"].tolist() == [10, 11, 12]
+    assert index["stay_subject_ids"].tolist() == [10, 10, 11, 11, 12, 12, 12]
+    assert np.array_equal(index["stay_samples"], [1, 2, 4, 6, 1, 1, 1])
+    tracker.subjects.update({10: {100: 3, 101: 2}})
+    assert observer.samples == tracker.samples == 18
+    tests_io("Succeeded testing index updates.")
+
+    tracker.is_finished = True
+    assert Path(TEMP_DIR, "progress.index.npz").is_file()
+    del tracker, observer
+    tracker = PreprocessingTracker(storage_path=Path(TEMP_DIR, "progress"))
+    index = tracker.sample_index
+    assert index["subject_ids"].tolist() == [10, 11, 12]
+    assert np.array_equal(index["stay_samples"], [3, 2, 4, 6, 1, 1, 1])
+    assert tracker.samples == 18
+    tests_io("Succeeded testing index restoration.")
+
+
+def test_subjects_for_samples():
+    tests_io("Test case subjects for samples selection.", level=0)
+    tracker = PreprocessingTracker(storage_path=Path(TEMP_DIR, "progress"), save_frequency=100)
+    generator = np.random.default_rng(42)
+    subjects = {
+        subject_id: {
+            subject_id * 10 + stay: int(generator.integers(1, 40))
+            for stay in range(int(generator.integers(1, 4)))
+        } for subject_id in range(500)
+    }
+    tracker.subjects.update(subjects)
+    subject_ids, counts = tracker.subject_counts()
+    sample_counts = dict(zip(subject_ids.tolist(), counts.tolist()))
+
+    for target_size in [1, 37, 1000, 5000]:
+        selected, n_samples = subjects_for_samples(tracker, target_size=target_size)
+        assert n_samples == target_size
+        assert len(set(selected)) == len(selected)
+        assert sum(sample_counts[subject_id] for subject_id in selected) == n_samples
+    tests_io("Succeeded testing exact selection.")
+
+    # Seeded selection is reproducible
+    selection = subjects_for_samples.__wrapped__(tracker, target_size=1000, seed=1)
+    assert selection == subjects_for_samples.__wrapped__(tracker, target_size=1000, seed=1)
+    assert selection != subjects_for_samples.__wrapped__(tracker, target_size=1000, seed=2)
+
+    # Target larger than the dataset
+    selected, n_samples = subjects_for_samples(tracker, target_size=10**6)
+    assert n_samples == tracker.samples and len(selected) == 500
+
+    # Deep supervision counts stays
+    selected, n_samples = subjects_for_samples(tracker, target_size=100, deep_supervision=True)
+    assert n_samples == 100
+    assert sum(len(subjects[subject_id]) for subject_id in selected) == 100
+    tests_io("Succeeded testing subjects for samples.")
+
+
 if __name__ == "__main__":
     if TEMP_DIR.exists():
         shutil.rmtree(TEMP_DIR)
@@ -441,4 +533,10 @@ if __name__ == "__main__":
     if TEMP_DIR.exists():
         shutil.rmtree(TEMP_DIR)
     test_subject_ids_option()
+    if TEMP_DIR.exists():
+        shutil.rmtree(TEMP_DIR)
+    test_sample_index()
+    if TEMP_DIR.exists():
+        shutil.rmtree(TEMP_DIR)
+    test_subjects_for_samples()
     tests_io("Succeeded testing PreprocessingTracker.")
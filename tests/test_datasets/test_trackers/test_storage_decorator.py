@@ -1,5 +1,8 @@
 import pytest
+import pickle
 import shutil
+import threading
+from multiprocess import Pool
 from pathlib import Path
 from utils.IO import *
 from tests.tsettings import *
@@ -411,6 +414,152 @@ def test_list_append():
     tests_io("Succeeded testing restoration of append list assignment.")
 
 
+def test_log_batching():
+    tests_io("Test case batched log writes for storable decorator.", level=0)
+    test_instance = CountTestClass(Path(TEMP_DIR, "progress"), save_frequency=3)
+    observer = CountTestClass(Path(TEMP_DIR, "progress"))
+
+    test_instance.subject_ids.append("a")
+    test_instance.subjects.update({"a": {"a": 1, "b": 2}})
+    assert test_instance.subject_ids == ["a"]
+    # Not yet flushed
+    assert observer.subject_ids == []
+
+    test_instance.subject_ids.extend(["b", "c"])
+    assert observer.subject_ids == ["a", "b", "c"]
+    assert observer.subjects["a"] == {"a": 1, "b": 2, "total": 3}
+    tests_io("Succeeded testing batched writes.")
+
+    test_instance.subject_ids.append("d")
+    test_instance.flush()
+    assert observer.subject_ids == ["a", "b", "c", "d"]
+    tests_io("Succeeded testing explicit flush.")
+
+    # Modifications from both instances are kept
+    observer.subject_ids.append("e")
+    assert test_instance.subject_ids == ["a", "b", "c", "d", "e"]
+
+    test_instance.close()
+    # Only the header of the compacted log is left
+    with open(Path(TEMP_DIR, "progress.log"), "rb") as file:
+        _, records = pickle.load(file)
+        assert not records and not file.read()
+    assert observer.subject_ids == ["a", "b", "c", "d", "e"]
+    del test_instance, observer
+    test_instance = CountTestClass(Path(TEMP_DIR, "progress"))
+    assert test_instance.subject_ids == ["a", "b", "c", "d", "e"]
+    assert test_instance.subjects["total"] == 3
+    tests_io("Succeeded testing compaction on close.")
+
+
+def test_torn_log_record():
+    tests_io("Test case torn log record for storable decorator.", level=0)
+    test_instance = CountTestClass(Path(TEMP_DIR, "progress"))
+    test_instance.subject_ids.extend(["a", "b"])
+
+    # Simulate a writer crashing halfway through appending its record
+    record = pickle.dumps(((0, 0), [("extend", "subject_ids", ["c"])]))
+    with open(Path(TEMP_DIR, "progress.log"), "ab") as file:
+        file.write(record[:len(record) // 2])
+
+    observer = CountTestClass(Path(TEMP_DIR, "progress"))
+    assert observer.subject_ids == ["a", "b"]
+    # The torn record is cut from the log, so that it only holds complete records
+    log_path = Path(TEMP_DIR, "progress.log")
+    with open(log_path, "rb") as file:
+        while file.tell() < log_path.stat().st_size:
+            pickle.load(file)
+    tests_io("Succeeded testing recovery from a torn record.")
+
+    # Records appended after the recovery are read by all instances
+    observer.subject_ids.append("d")
+    assert test_instance.subject_ids == ["a", "b", "d"]
+    del test_instance, observer
+    assert CountTestClass(Path(TEMP_DIR, "progress")).subject_ids == ["a", "b", "d"]
+    tests_io("Succeeded testing writes after a torn record.")
+
+
+def test_log_compaction():
+    tests_io("Test case log compaction for storable decorator.", level=0)
+    test_instance = CountTestClass(Path(TEMP_DIR, "progress"), max_log_size=256)
+    observer = CountTestClass(Path(TEMP_DIR, "progress"))
+    for index in range(50):
+        test_instance.subject_ids.append(str(index))
+        # Compacted whenever the threshold is passed instead of only on close
+        assert Path(TEMP_DIR, "progress.log").stat().st_size <= 256
+    assert observer.subject_ids == [str(index) for index in range(50)]
+    del test_instance, observer
+    assert len(CountTestClass(Path(TEMP_DIR, "progress")).subject_ids) == 50
+    tests_io("Succeeded testing log compaction.")
+
+
+def _concurrent_worker(args):
+    worker_id, n_subjects = args
+    test_instance = CountTestClass(Path(TEMP_DIR, "progress"))
+    count_instance = TestClass(Path(TEMP_DIR, "counts"))
+    for index in range(n_subjects):
+        subject_id = f"{worker_id}_{index}"
+        test_instance.subject_ids.append(subject_id)
+        test_instance.subjects.update({subject_id: {"stay": 1}})
+        count_instance.subjects += {"a": 1}
+        with test_instance.transaction():
+            test_instance.num_samples += 1
+    return
+
+
+def test_concurrent_access():
+    tests_io("Test case concurrent access of storable decorator without lock.", level=0)
+    test_instance = CountTestClass(Path(TEMP_DIR, "progress"))
+    count_instance = TestClass(Path(TEMP_DIR, "counts"))
+    n_workers, n_subjects = 3, 20
+    with Pool(n_workers) as pool:
+        pool.map(_concurrent_worker, [(worker_id, n_subjects) for worker_id in range(n_workers)])
+
+    n_total = n_workers * n_subjects
+    assert len(test_instance.subject_ids) == n_total
+    assert test_instance.num_samples == n_total
+    assert test_instance.subjects["total"] == n_total
+    assert count_instance.subjects["a"] == n_total
+    tests_io("Succeeded testing concurrent modifications.")
+
+    test_instance.close()
+    del test_instance
+    test_instance = CountTestClass(Path(TEMP_DIR, "progress"))
+    assert len(set(test_instance.subject_ids)) == n_total
+    assert test_instance.subjects["total"] == n_total
+    tests_io("Succeeded testing restoration after concurrent modifications.")
+
+
+def test_concurrent_threads():
+    tests_io("Test case threads sharing one storable instance.", level=0)
+    test_instance = CountTestClass(Path(TEMP_DIR, "progress"))
+    n_threads, n_subjects = 4, 50
+
+    def worker(thread_id):
+        for index in range(n_subjects):
+            with test_instance.transaction():
+                test_instance.subject_ids.append(f"{thread_id}_{index}")
+                test_instance.num_samples += 1
+
+    threads = [threading.Thread(target=worker, args=(thread_id,)) for thread_id in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    n_total = n_threads * n_subjects
+    assert test_instance.num_samples == n_total
+    assert len(set(test_instance.subject_ids)) == n_total
+    assert test_instance._lock_depth == 0 and test_instance._lock_handle is None
+    tests_io("Succeeded testing concurrent threads.")
+
+    test_instance.close()
+    test_instance = CountTestClass(Path(TEMP_DIR, "progress"))
+    assert test_instance.num_samples == n_total
+    assert len(test_instance.subject_ids) == n_total
+    tests_io("Succeeded testing restoration after concurrent threads.")
+
+
 def check_dtypes(instance):
     assert isinstance(instance.num_samples, int)
     assert isinstance(instance.time_elapsed, float)
@@ -453,6 +602,21 @@ if __name__ == "__main__":
         shutil.rmtree(str(TEMP_DIR))
     TEMP_DIR.mkdir(exist_ok=True, parents=True)
     test_dictionary_update()
+    if TEMP_DIR.is_dir():
+        shutil.rmtree(str(TEMP_DIR))
+    test_log_batching()
+    if TEMP_DIR.is_dir():
+        shutil.rmtree(str(TEMP_DIR))
+    test_torn_log_record()
+    if TEMP_DIR.is_dir():
+        shutil.rmtree(str(TEMP_DIR))
+    test_log_compaction()
+    if TEMP_DIR.is_dir():
+        shutil.rmtree(str(TEMP_DIR))
+    test_concurrent_access()
+    if TEMP_DIR.is_dir():
+        shutil.rmtree(str(TEMP_DIR))
+    test_concurrent_threads()
     if TEMP_DIR.is_dir():
         shutil.rmtree(str(TEMP_DIR))
 
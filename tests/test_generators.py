@@ -1,11 +1,15 @@
 import datasets
 import pytest
 import time
+import random
 import ray
 import numpy as np
-from generators.tf2 import TFGenerator
+import pandas as pd
+from generators.tf2 import TFGenerator, make_dataset
+from generators import _BatchPrefetcher, _collate_samples, process_subject
 from generators.pytorch import TorchGenerator
 from generators.stream import RiverGenerator
+from utils.timeseries import read_timeseries
 from preprocessing.scalers import MinMaxScaler
 from utils.IO import *
 from datasets.readers import ProcessedSetReader
@@ -296,6 +300,222 @@ def test_river_generator(task_name: str, multiprocessed: bool,
         ray.shutdown()
 
 
+@pytest.mark.parametrize("task_name", ["IHM", "DECOMP"])
+def test_prefetched_generator(task_name: str, discretized_readers: Dict[str, ProcessedSetReader]):
+    tests_io(f"Test case prefetched generator for task: {task_name}", level=0)
+    reader = discretized_readers[task_name]
+    scaler = MinMaxScaler().fit_reader(reader)
+
+    batches = dict()
+    for prefetch in [0, 3]:
+        # Subjects are shuffled on creation regardless of the shuffle flag, so seed both runs
+        random.seed(42)
+        np.random.seed(42)
+        generator = TFGenerator(reader=reader,
+                                scaler=scaler,
+                                batch_size=8,
+                                shuffle=False,
+                                prefetch=prefetch)
+        batches[prefetch] = [generator[index] for index in range(len(generator))]
+        generator.close()
+
+    # The background thread must hand out the same batches in the same order
+    assert len(batches[0]) == len(batches[3])
+    for (X, y), (X_prefetched, y_prefetched) in zip(batches[0], batches[3]):
+        assert_batch_sanity(X=X_prefetched, y=y_prefetched, task_name=task_name, batch_size=8)
+        assert np.array_equal(X, X_prefetched)
+        assert np.array_equal(y, y_prefetched)
+    tests_io(f"Successfully tested {len(batches[3])} prefetched batches")
+
+
+def test_prefetcher_error():
+    tests_io("Test case prefetcher error", level=0)
+
+    class FailingGenerator():
+
+        def next_batch(self):
+            raise ValueError("Failed to read batch")
+
+    generator = FailingGenerator()
+    prefetcher = _BatchPrefetcher(generator.next_batch, 2)
+    # The error of the stopped producer is raised on every call instead of blocking
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            prefetcher.get()
+    prefetcher.close()
+    tests_io("Successfully tested prefetcher error")
+
+
+@pytest.mark.parametrize("task_name,mode", [("DECOMP", "deep_supervision"),
+                                            ("IHM", "target_replication"), ("IHM", "standard")])
+def test_tf_dataset(task_name: str, mode: str, discretized_readers: Dict[str, ProcessedSetReader]):
+    tests_io(f"Test case tf.data dataset for task: {task_name}", level=0)
+    reader = discretized_readers[task_name]
+    scaler = MinMaxScaler().fit_reader(reader)
+
+    for bucket_boundaries in [None, [12, 24, 48]]:
+        dataset = make_dataset(reader=reader,
+                               scaler=scaler,
+                               batch_size=8,
+                               shuffle=True,
+                               deep_supervision=(mode == "deep_supervision"),
+                               target_replication=(mode == "target_replication"),
+                               num_shards=2,
+                               bucket_boundaries=bucket_boundaries)
+        batches = list(dataset.as_numpy_iterator())
+        assert batches
+        for X, y in batches:
+            M = None
+            if mode == "deep_supervision":
+                X, M = X
+            # Only the trailing batches of the buckets may be smaller
+            assert_batch_sanity(X=X,
+                                y=y,
+                                M=M,
+                                task_name=task_name,
+                                batch_size=X.shape[0],
+                                target_repl=(mode == "target_replication"))
+            assert X.shape[0] <= 8
+        tests_io(f"Successfully tested {len(batches)} batches with bucket boundaries "
+                 f"{bucket_boundaries}")
+
+
+@pytest.mark.parametrize("task_name", ["IHM", "PHENO"])
+def test_river_generator_frames(task_name: str, engineered_readers: ProcessedSetReader):
+    tests_io(f"Test case river generator frames for task: {task_name}", level=0)
+    reader = engineered_readers[task_name]
+    imputer = PartialImputer().fit_reader(reader)
+    scaler = MinMaxScaler(imputer=imputer).fit_reader(reader)
+
+    generator = RiverGenerator(reader=reader, scaler=scaler, shuffle=True, batch_size=16)
+    assert generator.yields_frames
+    for batch, (X, y) in enumerate(generator):
+        assert isinstance(X, pd.DataFrame)
+        assert X.shape == (16, 714)
+        # Columns match the keys of the per sample dictionaries
+        assert X.columns.tolist() == [str(index) for index in range(714)]
+        for X_sample, y_sample in zip(X.to_numpy(), y.to_numpy()):
+            assert_sample_sanity(X_sample,
+                                 y_sample if task_name == "PHENO" else float(y_sample),
+                                 task_name)
+    tests_io(f"Successfully tested {batch + 1} batches")
+
+
+@pytest.mark.parametrize("multiprocessing_context", ["fork", "spawn"])
+@pytest.mark.parametrize("task_name", ["IHM", "PHENO"])
+def test_multi_worker_torch_generator(task_name: str, multiprocessing_context: str,
+                                      discretized_readers: Dict[str, ProcessedSetReader]):
+    tests_io(
+        f"Test case multi worker torch generator for task: {task_name} "
+        f"with {multiprocessing_context} workers",
+        level=0)
+    reader = discretized_readers[task_name]
+    scaler = MinMaxScaler().fit_reader(reader)
+
+    # Spawned workers receive a pickled copy of the dataset
+    generator = TorchGenerator(reader=reader,
+                               scaler=scaler,
+                               batch_size=8,
+                               shuffle=True,
+                               num_workers=2,
+                               persistent_workers=True,
+                               multiprocessing_context=multiprocessing_context)
+    assert len(generator)
+    for epoch in range(2):
+        batch = -1
+        for batch, ([X, lengths], y) in enumerate(generator):
+            assert_batch_sanity(X=X.numpy(), y=y.numpy(), task_name=task_name, batch_size=8)
+            assert lengths.shape == (8,)
+        # The shards of the workers add up to a full epoch
+        assert batch + 1 == len(generator)
+        tests_io(f"Successfully tested {batch + 1} batches in epoch {epoch + 1}")
+    generator.close()
+
+    # Each shard yields the batches of its own samples
+    shard_steps = list()
+    for worker_id in range(2):
+        shard = TorchGenerator(reader=reader, scaler=scaler, batch_size=8, num_workers=2).dataset
+        shard.shard(worker_id, 2)
+        assert len(list(shard)) == len(shard) == shard._count_batches(shard._random_ids)
+        shard_steps.append(len(shard))
+    assert sum(shard_steps) == len(generator.dataset)
+
+
+@pytest.mark.parametrize("task_name", ["DECOMP", "LOS"])
+def test_bucketed_generator(task_name: str, discretized_readers: Dict[str, ProcessedSetReader]):
+    tests_io(f"Test case bucketed generator for task: {task_name}", level=0)
+    reader = discretized_readers[task_name]
+    scaler = MinMaxScaler().fit_reader(reader)
+    bucket_boundaries = [12, 24, 48, 96, 192]
+
+    generator = TFGenerator(reader=reader,
+                            scaler=scaler,
+                            batch_size=16,
+                            shuffle=True,
+                            bucket_boundaries=bucket_boundaries)
+    for batch in range(len(generator)):
+        X, y = generator.__getitem__()
+        assert_batch_sanity(X=X, y=y, task_name=task_name, batch_size=16)
+    tests_io(f"Successfully tested {batch + 1} batches with bucket boundaries {bucket_boundaries}")
+
+    # The samples of a batch fall into a single bucket, except for the leftovers of the
+    # buckets, which are batched together at the end of a pass over the subjects
+    batches = list(
+        process_subject((list(reader.subject_ids), 16),
+                        reader=reader,
+                        scaler=scaler,
+                        row_only=False,
+                        bining="none",
+                        target_replication=False,
+                        one_hot=False,
+                        bucket_boundaries=bucket_boundaries))
+    n_leftover_batches = len(bucket_boundaries) + 1
+    for index, (X, _, _, lengths) in enumerate(batches):
+        buckets = np.unique(np.searchsorted(bucket_boundaries, lengths, side="right"))
+        assert len(buckets) == 1 or index >= len(batches) - n_leftover_batches
+        assert X.shape[1] == lengths.max()
+        if index < len(batches) - n_leftover_batches:
+            assert len(lengths) == 16
+    tests_io(f"Successfully tested bucketing of {len(batches)} batches")
+
+
+def test_sample_lengths():
+    tests_io("Test case sample lengths", level=0)
+    generator = np.random.default_rng(42)
+    X_batch = [generator.normal(size=(length, 3)) for length in [4, 7, 2]]
+    # A real all zero time step at the end must not be taken for padding
+    X_batch[1][-1] = 0
+    y_batch = [np.atleast_2d(value) for value in generator.random(3)]
+    t_batch = [4., 7., 2.]
+
+    X, _, t, lengths = _collate_samples(list(X_batch), list(y_batch), list(t_batch), False)
+    assert X.shape == (3, 7, 3)
+    assert lengths.dtype == np.int64
+    assert np.array_equal(lengths, t.astype(np.int64))
+    tests_io("Succeeded testing sample lengths")
+
+
+def test_read_timeseries_views():
+    tests_io("Test case read timeseries views", level=0)
+    generator = np.random.default_rng(42)
+    timestamps = np.sort(generator.choice(np.arange(0, 100, 0.5), 80, replace=False))
+    X_df = pd.DataFrame(generator.normal(size=(80, 5)), index=timestamps)
+    y_df = pd.DataFrame(generator.random(40), index=timestamps[10:50] + 0.25)
+
+    for dtype in [np.ndarray, pd.DataFrame]:
+        Xs, ys, ts = read_timeseries(X_df, y_df, dtype=dtype)
+        assert len(Xs) == len(ys) == len(ts) == len(y_df)
+        for X, timestamp in zip(Xs, y_df.index):
+            expected = X_df.loc[:timestamp]
+            if dtype == np.ndarray:
+                # Samples share the memory of the stay instead of copying the prefix
+                assert np.shares_memory(X, Xs[-1])
+                assert np.array_equal(X, expected.values)
+            else:
+                assert X.equals(expected)
+    tests_io("Succeeded in testing read timeseries views")
+
+
 def assert_batch_sanity(X: np.ndarray,
                         y: np.ndarray,
                         task_name: str,
@@ -379,6 +599,7 @@ if __name__ == "__main__":
         import shutil
         shutil.rmtree(SEMITEMP_DIR)
     """
+    test_read_timeseries_views()
     for task_name in TASK_NAMES:
 
         if not Path(SEMITEMP_DIR, "discretized", task_name).is_dir():
@@ -444,6 +665,14 @@ if __name__ == "__main__":
                                                multiprocessed=False,
                                                discretized_readers={task_name: st_reader})
 
+        if task_name in ["DECOMP", "LOS"]:
+            test_bucketed_generator(task_name=task_name,
+                                    discretized_readers={task_name: st_reader})
+
+        if task_name in ["IHM", "DECOMP"]:
+            test_prefetched_generator(task_name=task_name,
+                                      discretized_readers={task_name: st_reader})
+
         test_river_generator(task_name=task_name,
                              multiprocessed=False,
                              engineered_readers={task_name: reader})
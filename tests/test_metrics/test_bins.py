@@ -0,0 +1,54 @@
+import pytest
+import numpy as np
+from metrics import CustomBins, LogBins
+from utils.IO import *
+
+
+def naive_custom_bin(x: float) -> int:
+    # Reference implementation equivalent to the original per label bining
+    for index, (lower, upper) in enumerate(CustomBins.scaled_bins):
+        if lower <= x < upper:
+            return index
+    return CustomBins.nbins - 1
+
+
+def naive_log_bin(x: float, nbins: int = 10) -> int:
+    return int(np.clip(np.round(np.log(x + 1) / 8.0 * nbins), 0, nbins - 1))
+
+
+@pytest.mark.parametrize("bining", ["custom", "log"])
+def test_batched_bins(bining: str):
+    tests_io(f"Test case batched {bining} bins", level=0)
+    generator = np.random.default_rng(42)
+    # Includes the bin boundaries, which are prone to off by one errors
+    x = np.concatenate([generator.uniform(0, 1000, (200,)), np.arange(0, 24 * 16, 24.0)])
+    get_bins = CustomBins.get_bins_custom if bining == "custom" else LogBins.get_bins_log
+    naive_bin = naive_custom_bin if bining == "custom" else naive_log_bin
+
+    expected = np.array([naive_bin(value) for value in x])
+    bins = get_bins(x)
+    assert bins.dtype == np.int64
+    assert np.array_equal(bins, expected)
+    # Shape is preserved for stays of deep supervision labels
+    assert np.array_equal(get_bins(x.reshape(-1, 2)), expected.reshape(-1, 2))
+
+    # One hot encoding is written into the buffer of the caller
+    buffer = np.full((len(x), CustomBins.nbins), 7, dtype=np.int8)
+    one_hot = get_bins(x, one_hot=True, out=buffer)
+    assert one_hot is buffer
+    assert np.array_equal(one_hot.argmax(axis=1), expected)
+    assert np.all(one_hot.sum(axis=1) == 1)
+    with pytest.raises(ValueError):
+        get_bins(x, one_hot=True, out=buffer[1:])
+
+    # The per label interface is consistent with the batched one
+    get_bin = CustomBins.get_bin_custom if bining == "custom" else LogBins.get_bin_log
+    for value, bin_index in zip(x[:10], expected[:10]):
+        assert get_bin(value) == bin_index
+        assert np.array_equal(get_bin(value, one_hot=True), np.eye(CustomBins.nbins)[bin_index])
+    tests_io(f"Succeeded in testing batched {bining} bins")
+
+
+if __name__ == "__main__":
+    for bining in ["custom", "log"]:
+        test_batched_bins(bining)
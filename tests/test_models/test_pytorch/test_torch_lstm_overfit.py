@@ -1,5 +1,6 @@
 import datasets
 import pytest
+import torch
 import json
 import numpy as np
 from utils.IO import *
@@ -112,7 +113,7 @@ OVERFIT_SETTINGS_TR = {
 }
 
 
-@pytest.mark.parametrize("data_flavour", ["generator", "numpy"])
+@pytest.mark.parametrize("data_flavour", ["generator", "batched_generator", "numpy"])
 @pytest.mark.parametrize("task_name", ["IHM", "PHENO"])
 @retry(3)
 def test_torch_lstm_with_target_replication(
@@ -151,10 +152,11 @@ def test_torch_lstm_with_target_replication(
              f"optimizer: Adam, lr=0.001")
 
     # -- fit --
-    if data_flavour == "generator":
+    if data_flavour in ["generator", "batched_generator"]:
         # -- Create the generator --
         train_generator = TorchGenerator(reader=reader,
                                          scaler=scaler,
+                                         batch_size=8 if data_flavour == "batched_generator" else 1,
                                          shuffle=True,
                                          n_samples=OVERFIT_SETTINGS_TR[task_name]["num_samples"],
                                          **GENERATOR_OPTIONS[task_name])
@@ -192,7 +194,7 @@ def test_torch_lstm_with_target_replication(
     tests_io("Succeeded in asserting model sanity")
 
 
-@pytest.mark.parametrize("data_flavour", ["generator", "numpy"])
+@pytest.mark.parametrize("data_flavour", ["generator", "batched_generator", "numpy"])
 @pytest.mark.parametrize("task_name", ["DECOMP", "LOS"])
 @retry(3)  # Highly unstable
 def test_torch_lstm_with_deep_supervision(
@@ -231,10 +233,11 @@ def test_torch_lstm_with_deep_supervision(
              f"optimizer: Adam, lr=0.001")
 
     # -- fit --
-    if data_flavour == "generator":
+    if data_flavour in ["generator", "batched_generator"]:
         # -- Create the generator --
         train_generator = TorchGenerator(reader=reader,
                                          scaler=scaler,
+                                         batch_size=8 if data_flavour == "batched_generator" else 1,
                                          deep_supervision=True,
                                          shuffle=True,
                                          n_samples=OVERFIT_SETTINGS_DS[task_name]["num_samples"],
@@ -291,7 +294,50 @@ def test_torch_lstm_with_deep_supervision(
     tests_io("Succeeded in asserting model sanity")
 
 
-@pytest.mark.parametrize("data_flavour", ["generator", "numpy"])
+def test_target_replication_objective():
+    tests_io("Test case torch LSTM target replication objective", level=0)
+    torch.manual_seed(42)
+    model = LSTMNetwork(input_dim=5,
+                        output_dim=1,
+                        final_activation="sigmoid",
+                        layer_size=8,
+                        target_repl_coef=0.5)
+    model.compile(optimizer="adam", loss="binary_crossentropy", metrics=["roc_auc"])
+    model.eval()
+
+    lengths = torch.tensor([3, 5, 2])
+    X = torch.zeros((3, 5, 5))
+    for index, length in enumerate(lengths.tolist()):
+        X[index, :length] = torch.rand(length, 5)
+    y = torch.tensor([[[1.]], [[0.]], [[1.]]])
+
+    with torch.no_grad():
+        # Padded batch as yielded by a batched generator
+        mask = model._length_mask(lengths, X.shape[1])
+        batched = model._batch_outputs(model.forward(X, masks=mask, lengths=lengths), y, mask,
+                                       lengths, True)
+        # Single samples as yielded with batch size one
+        outputs = list()
+        for index, length in enumerate(lengths.tolist()):
+            input = X[index:index + 1, :length]
+            outputs.append(model.forward(input, masks=model._forward_mask(input)))
+        per_sample = model._concat_outputs(outputs, [y[index:index + 1] for index in range(3)])
+
+        # Both paths optimize the same objective
+        assert torch.allclose(model._compute_loss(*batched[:3]),
+                              model._compute_loss(*per_sample[:3]),
+                              atol=1e-6)
+        # Metrics score the prediction at the last valid time step of each sample
+        batched_outputs, batched_labels = model._select_steps(*batched[:2], batched[3])
+        outputs, labels = model._select_steps(*per_sample[:2], per_sample[3])
+        assert batched_outputs.shape == outputs.shape == (3,)
+        assert torch.allclose(batched_outputs, outputs, atol=1e-6)
+        assert torch.equal(batched_labels, y.squeeze())
+        assert torch.allclose(outputs, model.forward(X, lengths=lengths).squeeze(), atol=1e-6)
+    tests_io("Succeeded in comparing the batched and per sample target replication objective")
+
+
+@pytest.mark.parametrize("data_flavour", ["generator", "batched_generator", "numpy"])
 @pytest.mark.parametrize("task_name", ["IHM", "DECOMP", "LOS", "PHENO"])
 @retry(3)
 def test_torch_lstm(
@@ -330,10 +376,12 @@ def test_torch_lstm(
              f"optimizer: Adam, lr=0.001")
 
     # -- fit --
-    if data_flavour == "generator":
+    if data_flavour in ["generator", "batched_generator"]:
         # -- Create the generator --
+        # The batched generator yields padded batches of 8 with their lengths
         train_generator = TorchGenerator(reader=reader,
                                          scaler=scaler,
+                                         batch_size=8 if data_flavour == "batched_generator" else 1,
                                          n_samples=OVERFIT_SETTINGS[task_name]["num_samples"],
                                          shuffle=True,
                                          **GENERATOR_OPTIONS[task_name])
@@ -376,6 +424,9 @@ def test_torch_lstm(
 
 def unroll_generator(generator: TorchGenerator, deep_supervision: bool = False):
     X, y = list(zip(*[(X, y) for X, y in iter(generator)]))
+    if generator.yields_lengths:
+        # Drop the sequence lengths
+        X = [x[:-1] if deep_supervision else x[0] for x in X]
     if deep_supervision:
         X, M = list(zip(*X))
         M = [m.numpy() for m in M]
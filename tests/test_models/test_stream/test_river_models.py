@@ -0,0 +1,80 @@
+import pytest
+import numpy as np
+from typing import Dict
+from utils.IO import *
+from river.metrics import ROCAUC
+from datasets.readers import ProcessedSetReader
+from generators.stream import RiverGenerator
+from preprocessing.imputers import PartialImputer
+from preprocessing.scalers import MinMaxScaler
+from metrics.stream import MacroROCAUC, MicroROCAUC
+from models.stream.linear_model import LogisticRegression, MultiOutputLogisticRegression
+
+
+class SampleGenerator():
+    """
+    Yields the samples of a linearly separable task one by one, like a RiverGenerator.
+    """
+
+    def __init__(self, n_samples: int, multioutput: bool):
+        generator = np.random.default_rng(42)
+        self._X = generator.normal(size=(n_samples, 4))
+        self._multioutput = multioutput
+
+    def __len__(self):
+        return len(self._X)
+
+    def __iter__(self):
+        for X_sample in self._X:
+            x = {f"x{index}": value for index, value in enumerate(X_sample)}
+            if self._multioutput:
+                yield x, {"y0": bool(X_sample[0] > 0), "y1": bool(X_sample[1] > 0)}
+            else:
+                yield x, bool(X_sample[0] > 0)
+
+
+@pytest.mark.parametrize("multioutput", [False, True])
+@pytest.mark.parametrize("progressive_validation", [False, True])
+def test_progressive_validation(multioutput: bool, progressive_validation: bool):
+    tests_io(f"Test case train river model with multioutput {multioutput} and progressive "
+             f"validation {progressive_validation}", level=0)
+    # Metric classes, since the instances of the metric mapping are shared between models
+    if multioutput:
+        model = MultiOutputLogisticRegression(metrics=[MacroROCAUC, MicroROCAUC])
+        # Predicted for the first sample with progressive validation, before any label is learned
+        assert model._to_label(model._predict_proba_one({"x0": 0.0})) == {}
+    else:
+        model = LogisticRegression(metrics=["accuracy", ROCAUC])
+
+    metrics = model.train(SampleGenerator(200, multioutput),
+                          progressive_validation=progressive_validation)
+    for name, metric in metrics.items():
+        assert 0.5 < metric.get() <= 1, f"Metric {name} is {metric.get()}"
+    tests_io(f"Succeeded in training river model with metrics "
+             f"{ {name: round(metric.get(), 3) for name, metric in metrics.items()} }")
+
+
+def test_sharded_evaluation(engineered_readers: Dict[str, ProcessedSetReader]):
+    tests_io("Test case sharded evaluation of river model", level=0)
+    reader = engineered_readers["IHM"]
+    imputer = PartialImputer().fit_reader(reader)
+    scaler = MinMaxScaler(imputer=imputer).fit_reader(reader)
+    # Samples are streamed one by one, so that both evaluations see every sample once
+    generator = RiverGenerator(reader=reader, scaler=scaler)
+    model = LogisticRegression(metrics=["accuracy", ROCAUC])
+    model.train(generator)
+
+    sequential_metrics = model.evaluate(generator)
+    sharded_metrics = model.evaluate(generator, num_workers=2)
+    assert set(sharded_metrics) == set(sequential_metrics)
+    for name, metric in sequential_metrics.items():
+        assert np.isclose(sharded_metrics[name].get(), metric.get()), \
+            f"Metric {name} is {sharded_metrics[name].get()} sharded and {metric.get()} sequential"
+    tests_io(f"Succeeded in testing sharded evaluation with metrics "
+             f"{ {name: round(metric.get(), 3) for name, metric in sharded_metrics.items()} }")
+
+
+if __name__ == "__main__":
+    for multioutput in [False, True]:
+        for progressive_validation in [False, True]:
+            test_progressive_validation(multioutput, progressive_validation)
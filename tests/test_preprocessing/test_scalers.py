@@ -5,7 +5,8 @@ import shutil
 from typing import Dict
 from pathlib import Path
 from datasets.readers import ProcessedSetReader
-from preprocessing.scalers import MinMaxScaler
+from sklearn.preprocessing import RobustScaler as _RobustScaler
+from preprocessing.scalers import MinMaxScaler, RobustScaler
 from preprocessing.imputers import PartialImputer
 from tests.tsettings import *
 from tests.pytest_utils import copy_dataset
@@ -168,6 +169,55 @@ def test_save_load(task_name: str, engineered_readers: Dict[str, ProcessedSetRea
     tests_io(f"Succeeded in testing save and load with specified storage path")
 
 
+@pytest.mark.parametrize("task_name", ["DECOMP"])
+def test_robust_partial_fit(task_name: str, engineered_readers: Dict[str, ProcessedSetReader]):
+    tests_io("Test case partial fit for robust scaler", level=0)
+    reader = engineered_readers[task_name]
+    X = reader.read_samples()["X"]
+
+    imputer = PartialImputer(strategy='median', storage_path=Path(TEMP_DIR, "imputer", "0"))
+    imputer.fit_reader(reader)
+    imputed_data = [imputer.transform(frame) for frame in X]
+
+    # Compare the sketched statistics against the in memory fit
+    scaler = RobustScaler(storage_path=Path(TEMP_DIR, "scaler", "0"))
+    for frame in imputed_data:
+        scaler.partial_fit(frame)
+    assert scaler.center_ is not None, "Partial fit did not compute median values."
+    assert scaler.scale_ is not None, "Partial fit did not compute scale values."
+    concatenated_data = np.concatenate(imputed_data)
+    gt_scaler = _RobustScaler().fit(concatenated_data)
+    assert scaler.center_.shape == gt_scaler.center_.shape
+    assert check_median_rank(concatenated_data, scaler.center_), \
+        "Sketched medians deviate from the true medians."
+    tests_io(f"Succeeded in testing partial_fit")
+
+    # Test merging partially fitted scalers
+    scaler_0 = RobustScaler()
+    scaler_1 = RobustScaler()
+    half = len(imputed_data) // 2
+    [scaler_0.partial_fit(frame) for frame in imputed_data[:half]]
+    [scaler_1.partial_fit(frame) for frame in imputed_data[half:]]
+    scaler_0.merge(scaler_1)
+    assert check_median_rank(concatenated_data, scaler_0.center_), \
+        "Merged medians deviate from the true medians."
+    tests_io(f"Succeeded in testing merge")
+
+    # Test save and load of the sketch
+    scaler.save()
+    scaler_load_test = RobustScaler(storage_path=Path(TEMP_DIR, "scaler", "0"))
+    scaler_load_test.load()
+    assert np.allclose(scaler_load_test.center_, scaler.center_), "Scaler state was not loaded."
+    tests_io(f"Succeeded in testing save and load")
+
+
+def check_median_rank(data: np.ndarray, medians: np.ndarray, precision: float = 0.05):
+    # Rank based comparison, as ties make the value of the median ambiguous
+    lower_rank = (data < medians).mean(axis=0)
+    upper_rank = (data <= medians).mean(axis=0)
+    return (lower_rank <= 0.5 + precision).all() and (upper_rank >= 0.5 - precision).all()
+
+
 def check_reader(reader: ProcessedSetReader, ground_truth_reader: ProcessedSetReader):
     precision = 1e-6
     assert isinstance(reader, ProcessedSetReader)
@@ -219,3 +269,6 @@ if __name__ == "__main__":
     if Path(TEMP_DIR, "scaler").is_dir():
         shutil.rmtree(str(Path(TEMP_DIR, "scaler")))
     test_fit_transform_reader("DECOMP", {"DECOMP": eng_reader})
+    if Path(TEMP_DIR, "scaler").is_dir():
+        shutil.rmtree(str(Path(TEMP_DIR, "scaler")))
+    test_robust_partial_fit("DECOMP", {"DECOMP": eng_reader})